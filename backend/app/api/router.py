@@ -6,6 +6,7 @@ from .routers.users import user_router
 from .routers.misc import misc_router
 from .routers.chats import chat_router
 from .routers.recommendations import recommendation_router
+from .routers.matches import match_router
 
 api_router = APIRouter()
 
@@ -15,3 +16,4 @@ api_router.include_router(user_router)
 api_router.include_router(misc_router)
 api_router.include_router(chat_router)
 api_router.include_router(recommendation_router)
+api_router.include_router(match_router)
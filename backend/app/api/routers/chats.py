@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from ...core.presence import presence
+from ...core.unread_counters import unread_counters
 from ...dependencies.auth import get_current_user
 from ...data.models.user import User
 from ...schemas import chat_schemas
@@ -7,7 +11,16 @@ from ...services import chat_service, user_service
 chat_router = APIRouter(prefix="/chats", tags=["chats"])
 
 
-def transform_chat_to_schema(chat: User, current_user_id: str) -> chat_schemas.ChatListItem:
+def _participant_id(chat, current_user_id: str) -> str:
+    return chat.direct_b if chat.direct_a == current_user_id else chat.direct_a
+
+
+def transform_chat_to_schema(
+    chat: User,
+    current_user_id: str,
+    unread_count: int = 0,
+    presence_status: tuple[bool, datetime.datetime | None] | None = None,
+) -> chat_schemas.ChatListItem:
     participant_user = None
     if chat.direct_a == current_user_id:
         participant_user = chat.direct_b_user
@@ -18,35 +31,130 @@ def transform_chat_to_schema(chat: User, current_user_id: str) -> chat_schemas.C
         return None
 
     last_message = None
-    if chat.messages:
-        latest_msg = sorted(chat.messages, key=lambda m: m.created_at, reverse=True)[0]
-        last_message = chat_schemas.MessageResponse.from_orm(latest_msg)
+    if chat.last_message_id:
+        last_message = chat_schemas.MessageResponse(
+            id=chat.last_message_id,
+            text=chat.last_message_text,
+            author_id=chat.last_message_author_id,
+            created_at=chat.last_message_at,
+        )
     
+    if presence_status is None:
+        presence_status = presence.get_many([participant_user.id])[participant_user.id]
+    online, last_seen_at = presence_status
+
     participant_profile = participant_user.profile
     participant_schema = chat_schemas.ChatParticipant(
         id=participant_user.id,
         first_name=participant_profile.first_name if participant_profile else participant_user.email.split('@')[0],
         last_name=participant_profile.last_name if participant_profile else "",
-        avatar_url=participant_profile.avatar_url if participant_profile else None
+        avatar_url=participant_profile.avatar_url if participant_profile else None,
+        online=online,
+        last_seen_at=last_seen_at,
     )
 
     return chat_schemas.ChatListItem(
         id=chat.id,
         participant=participant_schema,
         last_message=last_message,
+        unread_count=unread_count,
     )
 
 
 @chat_router.get("", response_model=list[chat_schemas.ChatListItem])
-def get_my_chats(current_user: User = Depends(get_current_user)):
-    chats_from_db = chat_service.get_user_chats(user_id=current_user.id)
-    
-    response = []
+def get_my_chats(
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=100),
+    cursor: str | None = None,
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        chats_from_db, next_cursor = chat_service.get_user_chats(
+            user_id=current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+        )
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    unread = unread_counters.get(current_user.id)
+    statuses = presence.get_many(
+        [_participant_id(chat, current_user.id) for chat in chats_from_db]
+    )
+    result = []
     for chat in chats_from_db:
-        chat_item = transform_chat_to_schema(chat, current_user.id)
+        chat_item = transform_chat_to_schema(
+            chat,
+            current_user.id,
+            unread.get(chat.id, 0),
+            statuses[_participant_id(chat, current_user.id)],
+        )
         if chat_item:
-            response.append(chat_item)
-    return response
+            result.append(chat_item)
+    return result
+
+
+@chat_router.get("/sync", response_model=chat_schemas.SyncResponse)
+def sync_messages(
+    since: str | None = None,
+    limit: int = Query(200, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Лента изменений сообщений во всех чатах пользователя после курсора
+    since. Клиент сохраняет cursor из ответа и повторяет запрос, пока
+    has_more=true; изменения применяются по id.
+    """
+    try:
+        changes, cursor, has_more = chat_service.get_changes(
+            user_id=current_user.id, since=since, limit=limit
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+        )
+
+    items = []
+    for message in changes:
+        item = chat_schemas.MessageChange.model_validate(message)
+        if item.deleted_at is not None:
+            item.text = None
+        items.append(item)
+    return chat_schemas.SyncResponse(changes=items, cursor=cursor, has_more=has_more)
+
+
+@chat_router.get("/search", response_model=list[chat_schemas.MessageSearchResult])
+def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: str | None = None,
+    chat_id: str | None = None,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Полнотекстовый поиск по сообщениям в чатах пользователя, самые
+    релевантные первыми. Курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
+    try:
+        messages, next_cursor = chat_service.search_messages(
+            user_id=current_user.id,
+            q=q,
+            limit=limit,
+            cursor=cursor,
+            chat_id=chat_id,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+        )
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 
 @chat_router.get("/{user_id}", response_model=chat_schemas.ChatListItem)
@@ -59,26 +167,47 @@ def get_or_create_chat_with_user(
             status_code=status.HTTP_404_NOT_FOUND, detail="Собеседник не найден"
         )
 
-    chat = chat_service.get_or_create_direct_chat(
-        user_a_id=current_user.id, user_b_id=user_id
-    )
-    
-    chat_with_details = chat_service.get_user_chats(user_id=current_user.id)
-    found_chat = next((c for c in chat_with_details if c.id == chat.id), None)
-
-    if not found_chat:
-        raise HTTPException(status_code=404, detail="Chat not found after creation")
+    try:
+        chat = chat_service.get_or_create_direct_chat(
+            user_a_id=current_user.id, user_b_id=user_id
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Нельзя создать чат с самим собой",
+        )
 
-    return transform_chat_to_schema(found_chat, current_user.id)
+    return transform_chat_to_schema(
+        chat,
+        current_user.id,
+        unread_counters.get(current_user.id).get(chat.id, 0),
+    )
 
 
 @chat_router.get("/{chat_id}/messages", response_model=list[chat_schemas.MessageResponse])
-def get_messages(chat_id: str, current_user: User = Depends(get_current_user)):
+def get_messages(
+    chat_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = None,
+    after: str | None = None,
+    current_user: User = Depends(get_current_user),
+):
     chat = chat_service.get_chat_by_id(chat_id) # Assumes this function exists
     if not chat or (current_user.id not in [chat.direct_a, chat.direct_b]):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    messages = chat_service.get_chat_messages(chat_id=chat_id)
+    try:
+        messages, next_cursor = chat_service.get_chat_messages(
+            chat_id=chat_id, limit=limit, before=before, after=after
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+        )
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return messages
 
 
@@ -96,7 +225,74 @@ async def send_message(
     if not chat or (current_user.id not in [chat.direct_a, chat.direct_b]):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    new_message = await chat_service.create_message(
-        chat_id=chat_id, author_id=current_user.id, msg_data=message_data
-    )
+    try:
+        new_message = await chat_service.create_message(
+            chat_id=chat_id, author_id=current_user.id, msg_data=message_data
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="client_id уже использован в другом чате",
+        )
     return new_message
+
+
+@chat_router.patch(
+    "/{chat_id}/messages/{message_id}", response_model=chat_schemas.MessageResponse
+)
+async def edit_message(
+    chat_id: str,
+    message_id: str,
+    message_data: chat_schemas.MessageUpdate,
+    current_user: User = Depends(get_current_user),
+):
+    message = await chat_service.edit_message(
+        chat_id=chat_id,
+        message_id=message_id,
+        author_id=current_user.id,
+        msg_data=message_data,
+    )
+    if message is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Сообщение не найдено"
+        )
+    return message
+
+
+@chat_router.delete(
+    "/{chat_id}/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT
+)
+async def delete_message(
+    chat_id: str,
+    message_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    deleted = await chat_service.delete_message(
+        chat_id=chat_id, message_id=message_id, author_id=current_user.id
+    )
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Сообщение не найдено"
+        )
+
+
+@chat_router.post("/{chat_id}/read", response_model=chat_schemas.ReadReceipt | None)
+async def mark_chat_read(
+    chat_id: str,
+    read_data: chat_schemas.MarkReadRequest | None = None,
+    current_user: User = Depends(get_current_user),
+):
+    chat = chat_service.get_chat_by_id(chat_id)
+    if not chat or (current_user.id not in [chat.direct_a, chat.direct_b]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+
+    try:
+        return await chat_service.mark_read(
+            chat_id=chat_id,
+            user_id=current_user.id,
+            message_id=read_data.message_id if read_data else None,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Сообщение не найдено"
+        )
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from ...dependencies.auth import get_current_user
+from ...data.models.user import User
+from ...schemas.match_schemas import MatchResponse
+from ...schemas.user_schemas import UserResponse
+from ...services import match_service
+
+match_router = APIRouter(prefix="/matches", tags=["matches"])
+
+
+@match_router.get("", response_model=list[MatchResponse])
+def get_my_matches(current_user: User = Depends(get_current_user)):
+    return [
+        {
+            "id": match.id,
+            "user": partner,
+            "chat_id": match.chat_id,
+            "created_at": match.created_at,
+        }
+        for match, partner in match_service.get_matches(user_id=current_user.id)
+    ]
+
+
+@match_router.get("/likes", response_model=list[UserResponse])
+def get_likes_received(current_user: User = Depends(get_current_user)):
+    return match_service.get_likes_received(user_id=current_user.id)
@@ -1,4 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from ...core.message_writer import message_writer
+from ...core.websockets import manager
+from ...dependencies.auth import get_current_admin
 
 misc_router = APIRouter(tags=["misc"])
 
@@ -22,3 +26,24 @@ def get_cities():
     Возвращает список городов для использования в анкете.
     """
     return CITIES
+
+
+@misc_router.get("/metrics/websockets", dependencies=[Depends(get_current_admin)])
+def get_websocket_metrics():
+    """
+    Метрики рассылки по WebSocket: подключения, глубина очередей,
+    отброшенные сообщения, отключённые медленные клиенты и задержка отправки.
+    Доступны только администраторам.
+    """
+    return manager.stats()
+
+
+@misc_router.get(
+    "/metrics/message-writer", dependencies=[Depends(get_current_admin)]
+)
+def get_message_writer_metrics():
+    """
+    Метрики групповой записи сообщений: число и размер пачек,
+    время записи пачки. Доступны только администраторам.
+    """
+    return message_writer.stats()
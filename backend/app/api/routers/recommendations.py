@@ -1,17 +1,86 @@
-from fastapi import APIRouter, Depends, status
+from typing import Literal
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
 from ...dependencies.auth import get_current_user
+from ...core.view_buffer import view_buffer
 from ...data.models.user import User
+from ...schemas.match_schemas import LikeResponse
 from ...schemas.user_schemas import UserRecommendationResponse
-from ...services import recommendation_service
+from ...services import match_service, recommendation_service, user_service
 
 recommendation_router = APIRouter(prefix="/recommendations", tags=["recommendations"])
 
 
 @recommendation_router.get("", response_model=list[UserRecommendationResponse])
-def get_recommendations(current_user: User = Depends(get_current_user)):
-    return recommendation_service.get_recommendations(user_id=current_user.id)
+def get_recommendations(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    scope: Literal["all", "city"] = "all",
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        users, next_cursor = recommendation_service.get_recommendations(
+            user_id=current_user.id, limit=limit, cursor=cursor, scope=scope
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор"
+        )
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
+
+
+@recommendation_router.get("/similar", response_model=list[UserRecommendationResponse])
+def get_similar_users(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+):
+    return recommendation_service.get_similar_users(user_id=current_user.id, limit=limit)
+
+
+@recommendation_router.post("/views", status_code=status.HTTP_202_ACCEPTED)
+async def record_views(
+    target_ids: list[str] = Body(..., min_length=1, max_length=500),
+    current_user: User = Depends(get_current_user),
+):
+    view_buffer.record(user_id=current_user.id, target_user_ids=target_ids)
 
 
 @recommendation_router.post("/{target_id}/hide", status_code=status.HTTP_204_NO_CONTENT)
 def hide_user(target_id: str, current_user: User = Depends(get_current_user)):
+    if user_service.get_user_by_id(user_id=target_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
+        )
     recommendation_service.hide_user(user_id=current_user.id, target_user_id=target_id)
+
+
+@recommendation_router.post("/hide", status_code=status.HTTP_204_NO_CONTENT)
+def hide_users(
+    target_ids: list[str] = Body(..., min_length=1, max_length=500),
+    current_user: User = Depends(get_current_user),
+):
+    recommendation_service.hide_users(user_id=current_user.id, target_user_ids=target_ids)
+
+
+@recommendation_router.post("/{target_id}/like", response_model=LikeResponse)
+def like_user(target_id: str, current_user: User = Depends(get_current_user)):
+    if user_service.get_user_by_id(user_id=target_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
+        )
+
+    try:
+        match = match_service.like_user(user_id=current_user.id, target_user_id=target_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Нельзя поставить лайк самому себе",
+        )
+
+    if match is None:
+        return LikeResponse(matched=False)
+    return LikeResponse(matched=True, chat_id=match.chat_id)
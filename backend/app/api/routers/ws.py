@@ -0,0 +1,274 @@
+import json
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from ...core.config import settings
+from ...core.cursors import encode_cursor
+from ...core.websockets import ClientConnection, manager
+from ...dependencies.auth import get_current_user_from_websocket
+from ...data.models.user import User
+from ...schemas.chat_schemas import MessageCreate, MessageResponse
+from ...services import chat_service
+
+ws_router = APIRouter(tags=["websockets"])
+
+# Ограничение на число чатов в одном кадре subscribe.
+_MAX_CHAT_IDS = 500
+
+
+def _error(detail: str, client_id=None) -> str:
+    frame = {"type": "error", "detail": detail}
+    if client_id is not None:
+        frame["client_id"] = client_id
+    return json.dumps(frame)
+
+
+async def _send(connection: ClientConnection, frame: dict, chat_id: str):
+    """
+    Обрабатывает кадр {"type": "send", "chat_id", "client_id", "text"}.
+    Подписка на чат уже подтверждает участие в нём, поэтому сообщение
+    сохраняется без повторной проверки доступа. Отправитель получает
+    {"type": "ack", "client_id", "message"} - в том числе на повтор
+    с тем же client_id.
+    """
+    client_id = frame.get("client_id")
+    try:
+        msg_data = MessageCreate.model_validate(frame)
+    except ValidationError as e:
+        connection.enqueue(_error(e.errors()[0]["msg"], client_id))
+        return
+    if not isinstance(chat_id, str) or chat_id not in connection.chats:
+        connection.enqueue(_error("Нет подписки на этот чат.", client_id))
+        return
+
+    try:
+        message = await chat_service.create_message(
+            chat_id=chat_id, author_id=connection.user_id, msg_data=msg_data
+        )
+    except ValueError:
+        connection.enqueue(
+            _error("client_id уже использован в другом чате.", client_id)
+        )
+        return
+    connection.enqueue(
+        json.dumps(
+            {
+                "type": "ack",
+                "client_id": client_id,
+                "message": MessageResponse.model_validate(message).model_dump(
+                    mode="json"
+                ),
+            }
+        )
+    )
+
+
+async def _replay(connection: ClientConnection, chat_id: str, since: str) -> bool:
+    """
+    Отправляет сообщения чата новее since пачками по ix_messages_chat_created
+    и переводит подписку на живую рассылку. Живые сообщения, пришедшие
+    за это время, буферизуются в Replay, поэтому между историей и живыми
+    сообщениями нет ни пропусков, ни повторов. После догрузки клиент получает
+    {"type": "replayed", "chat_id", "count", "complete"}; complete=false
+    значит, что достигнут лимит и остаток нужно загрузить по HTTP.
+
+    Если историю не удалось отправить целиком, клиент отключается и должен
+    переподключиться с тем же since: живые сообщения после пропуска в истории
+    нарушили бы обещание. Возвращает False в этом случае.
+    """
+    count = 0
+    complete = True
+    cursor = encode_cursor(since)
+    try:
+        while cursor is not None:
+            if count >= settings.WS_REPLAY_LIMIT:
+                complete = False
+                break
+            messages, cursor = await run_in_threadpool(
+                chat_service.get_chat_messages,
+                chat_id,
+                min(settings.WS_REPLAY_BATCH, settings.WS_REPLAY_LIMIT - count),
+                None,
+                cursor,
+            )
+            for message in messages:
+                frame = MessageResponse.model_validate(message).model_dump(mode="json")
+                if not await connection.replay(chat_id, frame):
+                    manager.evict(connection, "replay timed out")
+                    return False
+            count += len(messages)
+    except Exception:
+        manager.evict(connection, "replay failed")
+        raise
+
+    connection.finish_replay(chat_id)
+    connection.enqueue(
+        json.dumps(
+            {
+                "type": "replayed",
+                "chat_id": chat_id,
+                "count": count,
+                "complete": complete,
+            }
+        )
+    )
+    return True
+
+
+@ws_router.websocket("/ws")
+async def user_websocket(
+    websocket: WebSocket,
+    user: User = Depends(get_current_user_from_websocket),
+):
+    """
+    Одно подключение на пользователя для всех его чатов.
+
+    Клиент управляет подписками кадрами
+        {"type": "subscribe" | "unsubscribe", "chat_ids": [...]}
+    и получает в ответ {"type": "subscribed" | "unsubscribed", "chat_ids": [...]}
+    со списком чатов, которые реально добавлены или убраны. В subscribe
+    можно передать "since": {chat_id: id последнего полученного сообщения},
+    тогда пропущенные сообщения придут до живых (см. _replay). События чатов
+    приходят кадрами с полями type и chat_id. Сообщения в чаты, на которые
+    есть подписка, отправляются кадрами type="send", набор текста - кадрами
+    {"type": "typing", "chat_id"}. На {"type": "ping"} от сервера клиент
+    отвечает {"type": "pong"}.
+    """
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    connection = await manager.connect(user.id, websocket)
+    try:
+        while True:
+            try:
+                text = await websocket.receive_text()
+                connection.touch()
+                frame = json.loads(text)
+                frame_type = frame["type"]
+            except (ValueError, TypeError, KeyError):
+                connection.enqueue(_error("Некорректный кадр."))
+                continue
+
+            if frame_type == "pong":
+                continue
+            if frame_type == "send":
+                await _send(connection, frame, frame.get("chat_id"))
+                continue
+            if frame_type == "typing":
+                chat_id = frame.get("chat_id")
+                if isinstance(chat_id, str) and chat_id in connection.chats:
+                    await manager.typing(connection, chat_id)
+                continue
+
+            chat_ids = frame.get("chat_ids")
+            if not isinstance(chat_ids, list) or not all(
+                isinstance(chat_id, str) for chat_id in chat_ids
+            ):
+                connection.enqueue(_error("chat_ids должен быть списком строк."))
+                continue
+            if len(chat_ids) > _MAX_CHAT_IDS:
+                connection.enqueue(
+                    _error(f"Не больше {_MAX_CHAT_IDS} чатов в одном кадре.")
+                )
+                continue
+
+            if frame_type == "subscribe":
+                since = frame.get("since") or {}
+                if not isinstance(since, dict):
+                    connection.enqueue(_error("since должен быть объектом."))
+                    continue
+                allowed = await run_in_threadpool(
+                    chat_service.get_member_chats, user.id, chat_ids
+                )
+                replays = {}
+                for chat_id in allowed:
+                    message_id = since.get(chat_id)
+                    if message_id is None:
+                        continue
+                    if isinstance(message_id, str) and await run_in_threadpool(
+                        chat_service.get_chat_message, chat_id, message_id
+                    ):
+                        replays[chat_id] = message_id
+                    else:
+                        connection.enqueue(
+                            _error(f"Сообщение since для чата {chat_id} не найдено.")
+                        )
+
+                for chat_id in replays:
+                    connection.begin_replay(chat_id)
+                connection.chats.update(allowed)
+                connection.enqueue(
+                    json.dumps({"type": "subscribed", "chat_ids": sorted(allowed)})
+                )
+                for chat_id, message_id in replays.items():
+                    if not await _replay(connection, chat_id, message_id):
+                        break
+            elif frame_type == "unsubscribe":
+                removed = connection.chats.keys() & set(chat_ids)
+                for chat_id in removed:
+                    del connection.chats[chat_id]
+                connection.enqueue(
+                    json.dumps({"type": "unsubscribed", "chat_ids": sorted(removed)})
+                )
+            else:
+                connection.enqueue(_error(f"Неизвестный тип кадра: {frame_type}."))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(connection)
+
+
+@ws_router.websocket("/ws/chats/{chat_id}")
+async def chat_websocket(
+    websocket: WebSocket,
+    chat_id: str,
+    since: str | None = None,
+    user: User = Depends(get_current_user_from_websocket),
+):
+    """
+    Подключение к одному чату (прежний протокол): входящие сообщения
+    приходят без обёртки. Кадры {"type": "send", "client_id", "text"}
+    отправляют сообщение в этот чат, {"type": "typing"} - сообщают о наборе
+    текста. С ?since=<id сообщения> сначала приходят пропущенные сообщения.
+    """
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    chat = chat_service.get_chat_by_id(chat_id)
+    if not chat or (user.id not in [chat.direct_a, chat.direct_b]):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if since is not None and not chat_service.get_chat_message(chat_id, since):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    connection = await manager.connect(
+        user.id,
+        websocket,
+        {chat_id: [chat.direct_a, chat.direct_b]},
+        legacy=True,
+        replay=since is not None,
+    )
+    try:
+        if since is not None and not await _replay(connection, chat_id, since):
+            return
+        while True:
+            try:
+                text = await websocket.receive_text()
+                connection.touch()
+                frame = json.loads(text)
+                frame_type = frame["type"]
+            except (ValueError, TypeError, KeyError):
+                continue
+            if frame_type == "send":
+                await _send(connection, frame, chat_id)
+            elif frame_type == "typing":
+                await manager.typing(connection, chat_id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(connection)
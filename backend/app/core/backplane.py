@@ -0,0 +1,197 @@
+"""
+Транспорт рассылки событий чатов между воркерами.
+
+create_message публикует событие один раз, а каждый воркер получает его
+из backplane и доставляет только своим локальным сокетам.
+
+    local    - в пределах процесса (один воркер, разработка)
+    postgres - через LISTEN/NOTIFY в основной БД
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import text
+
+from ..data.db import db_conn
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, str], Awaitable[None]]
+
+CHANNEL = "chat_events"
+# Payload NOTIFY ограничен 8000 байтами, символ UTF-8 занимает до 4 байт.
+_CHUNK_CHARS = 1750
+# Недособранные события старше этого срока отбрасываются.
+_PARTIAL_TTL = 30.0
+
+
+class InProcessBackplane:
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, chat_id: str, message: str):
+        await self.deliver(chat_id, message)
+
+
+def encode_notifications(chat_id: str, message: str) -> list[str]:
+    """
+    Делит событие на payload'ы NOTIFY вида
+    "<event_id> <part> <parts> <chat_id>\\n<chunk>".
+    """
+    event_id = uuid.uuid4().hex
+    chunks = [
+        message[start : start + _CHUNK_CHARS]
+        for start in range(0, len(message), _CHUNK_CHARS)
+    ] or [""]
+    return [
+        f"{event_id} {part} {len(chunks)} {chat_id}\n{chunk}"
+        for part, chunk in enumerate(chunks)
+    ]
+
+
+def notify(db, chat_id: str, message: str, channel: str = CHANNEL):
+    """
+    Публикует событие через NOTIFY в транзакции db: воркеры получат его
+    после коммита.
+    """
+    for payload in encode_notifications(chat_id, message):
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": payload},
+        )
+
+
+class NotificationAssembler:
+    """
+    Собирает события из payload'ов encode_notifications. NOTIFY одной
+    транзакции приходят подряд и по порядку, но события разных воркеров
+    могут перемежаться.
+    """
+
+    def __init__(self):
+        # {event_id: (first seen at, chat_id, [chunk])}
+        self._partial: dict[str, tuple[float, str, list[str | None]]] = {}
+
+    def feed(self, payload: str) -> tuple[str, str] | None:
+        header, _, chunk = payload.partition("\n")
+        event_id, part, parts, chat_id = header.split(" ", 3)
+        part, parts = int(part), int(parts)
+        if parts == 1:
+            return chat_id, chunk
+
+        now = time.monotonic()
+        self._partial = {
+            key: value
+            for key, value in self._partial.items()
+            if now - value[0] < _PARTIAL_TTL
+        }
+        _, _, chunks = self._partial.setdefault(event_id, (now, chat_id, [None] * parts))
+        chunks[part] = chunk
+        if any(c is None for c in chunks):
+            return None
+        del self._partial[event_id]
+        return chat_id, "".join(chunks)
+
+
+class PostgresBackplane:
+    """
+    Рассылка через LISTEN/NOTIFY. Для прослушивания держится отдельное
+    соединение psycopg2, его сокет опрашивается циклом событий через
+    add_reader. Публикация идёт через обычный пул: все части события
+    отправляются одной транзакцией.
+    """
+
+    def __init__(self, dsn: str, deliver: Deliver, channel: str = CHANNEL):
+        self.dsn = dsn
+        self.deliver = deliver
+        self.channel = channel
+        self._assembler = NotificationAssembler()
+        self._connection = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._reconnect_task: asyncio.Task | None = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self._listen()
+
+    async def _listen(self):
+        import psycopg2
+
+        connection = await asyncio.to_thread(psycopg2.connect, self.dsn)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        self._connection = connection
+        self._loop.add_reader(connection.fileno(), self._on_readable)
+        logger.info(f"Listening for chat events on channel {self.channel}.")
+
+    def _on_readable(self):
+        try:
+            self._connection.poll()
+        except Exception as e:
+            logger.error(f"Chat event listener connection lost: {e}")
+            self._close_connection()
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+            return
+
+        while self._connection.notifies:
+            notify = self._connection.notifies.pop(0)
+            try:
+                event = self._assembler.feed(notify.payload)
+            except ValueError:
+                logger.error(f"Malformed chat event: {notify.payload[:100]!r}")
+                continue
+            if event is not None:
+                asyncio.create_task(self.deliver(*event))
+
+    async def _reconnect(self):
+        delay = 1.0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._listen()
+                return
+            except Exception as e:
+                logger.error(f"Failed to reconnect chat event listener: {e}")
+                delay = min(delay * 2, 30.0)
+
+    def _close_connection(self):
+        if self._connection is None:
+            return
+        try:
+            self._loop.remove_reader(self._connection.fileno())
+        except Exception:
+            pass
+        self._connection.close()
+        self._connection = None
+
+    async def stop(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._close_connection()
+
+    async def publish(self, chat_id: str, message: str):
+        await asyncio.to_thread(self._notify, chat_id, message)
+
+    def _notify(self, chat_id: str, message: str):
+        with db_conn() as db:
+            notify(db, chat_id, message, self.channel)
+
+
+def create_backplane(kind: str, dsn: str, deliver: Deliver):
+    if kind == "postgres":
+        return PostgresBackplane(dsn, deliver)
+    if kind == "local":
+        return InProcessBackplane(deliver)
+    raise ValueError(f"Unknown chat backplane: {kind}")
@@ -0,0 +1,2 @@
+def jaccard_percent(intersection: int, union: int) -> int:
+    return int((intersection / union) * 100) if union > 0 else 0
@@ -15,6 +15,49 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
 
+    RECOMMENDATION_CACHE_SIZE: int = 10000
+    RECOMMENDATION_TOP_K: int = 100
+    # "index" - in-memory bitmask index, "sql" - scoring in the database
+    RECOMMENDATION_ENGINE: str = "index"
+    HIDDEN_INDEX_SIZE: int = 10000
+    RECOMMENDATION_MIN_CITY_POOL: int = 50
+    # Directory with the shared interest matrix (app.jobs.build_interest_matrix).
+    # When unset, every worker builds its own in-memory index.
+    INTEREST_MATRIX_DIR: str | None = None
+
+    VIEW_BUFFER_SIZE: int = 50000
+    VIEW_FLUSH_SIZE: int = 1000
+    VIEW_FLUSH_INTERVAL: float = 2.0
+    VIEW_DEDUP_WINDOW: float = 300.0
+    # Pairs remembered for deduplication; the oldest are forgotten first.
+    VIEW_DEDUP_SIZE: int = 200000
+
+    UNREAD_CACHE_SIZE: int = 10000
+    UNREAD_RECONCILE_INTERVAL: float = 60.0
+
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT: float = 5.0
+    # A client whose send queue stays full this long is disconnected.
+    WS_SLOW_CONSUMER_TIMEOUT: float = 10.0
+    # The server pings every socket this often; a socket that has sent
+    # nothing (including pongs) for WS_IDLE_TIMEOUT is disconnected.
+    WS_PING_INTERVAL: float = 20.0
+    WS_IDLE_TIMEOUT: float = 60.0
+    # At most one typing frame per user and chat per interval.
+    WS_TYPING_INTERVAL: float = 0.5
+    # Catch-up on subscribe with "since": messages are read in batches of
+    # WS_REPLAY_BATCH, at most WS_REPLAY_LIMIT per chat.
+    WS_REPLAY_BATCH: int = 100
+    WS_REPLAY_LIMIT: int = 1000
+    # "local" - delivery within the process, "postgres" - LISTEN/NOTIFY
+    # between all workers sharing the database.
+    CHAT_BACKPLANE: str = "local"
+    # Group commit: concurrent messages are inserted in one transaction,
+    # flushed after MAX_BATCH messages or INTERVAL seconds.
+    CHAT_GROUP_COMMIT: bool = False
+    CHAT_GROUP_COMMIT_MAX_BATCH: int = 100
+    CHAT_GROUP_COMMIT_INTERVAL: float = 0.005
+
     model_config = SettingsConfigDict(env_file=".env")
 
 
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+from .config import settings
+from ..data.db import db_conn
+from ..data.models.user_interaction import UserInteraction, InteractionActionEnum
+
+
+class HiddenIndex:
+    """
+    Множества скрытых (pass) пользователей для каждого пользователя.
+
+    Множество читается из user_interactions при первом обращении и дальше
+    обновляется на месте в hide_users. Число закэшированных пользователей
+    ограничено, вытесняются давно не использованные.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        # {user_id: {target_user_id}}
+        self._sets: OrderedDict[str, set[str]] = OrderedDict()
+        # Users whose set is being read from the database: {user_id: event
+        # set when the load finishes}. Ids hidden meanwhile are collected in
+        # _pending and merged into the loaded set.
+        self._loading: dict[str, threading.Event] = {}
+        self._pending: dict[str, set[str]] = {}
+
+    def get(self, user_id: str) -> set[str]:
+        """
+        Множество скрытых пользователей. Промах читается из БД вне общей
+        блокировки, чтобы не задерживать запросы остальных пользователей;
+        одновременные промахи по одному пользователю ждут одну загрузку.
+        """
+        while True:
+            with self._lock:
+                hidden = self._sets.get(user_id)
+                if hidden is not None:
+                    self._sets.move_to_end(user_id)
+                    return hidden
+
+                loading = self._loading.get(user_id)
+                if loading is None:
+                    loading = self._loading[user_id] = threading.Event()
+                    self._pending[user_id] = set()
+                    break
+            loading.wait()
+
+        hidden = None
+        try:
+            with db_conn() as db:
+                hidden = {
+                    row.target_user_id
+                    for row in db.query(UserInteraction.target_user_id).filter(
+                        UserInteraction.user_id == user_id,
+                        UserInteraction.action == InteractionActionEnum.pass_,
+                    )
+                }
+        finally:
+            with self._lock:
+                pending = self._pending.pop(user_id)
+                del self._loading[user_id]
+                if hidden is not None:
+                    hidden |= pending
+                    self._sets[user_id] = hidden
+                    while len(self._sets) > self.max_users:
+                        self._sets.popitem(last=False)
+            loading.set()
+        return hidden
+
+    def add(self, user_id: str, target_user_ids: list[str]):
+        with self._lock:
+            hidden = self._sets.get(user_id)
+            if hidden is None:
+                hidden = self._pending.get(user_id)
+            if hidden is not None:
+                hidden.update(target_user_ids)
+
+
+hidden_index = HiddenIndex(max_users=settings.HIDDEN_INDEX_SIZE)
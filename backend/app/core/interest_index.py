@@ -0,0 +1,235 @@
+import logging
+import threading
+
+from .compatibility import jaccard_percent
+from .config import settings
+from ..data.db import db_conn
+from ..data.models.profile import Profile, VisibilityEnum
+from ..data.models.user import User
+from ..data.models.user_interest import UserInterest
+
+logger = logging.getLogger(__name__)
+
+
+class InterestIndex:
+    """
+    Bitmask-индекс интересов пользователей.
+
+    Каждому интересу из каталога назначается номер бита, интересы пользователя
+    хранятся одним целым числом. Совместимость считается как
+    popcount(a & b) / popcount(a | b) сразу по всем кандидатам, без загрузки
+    ORM-объектов. Строки дополнительно разбиты на пулы по Profile.city,
+    чтобы поиск в пределах города не просматривал остальных. Рядом с маской
+    хранится Profile.visibility: скрытые пользователи отсекаются до расчёта
+    совместимости.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        # {interest_id: bit}
+        self._bits: dict[str, int] = {}
+        # {user_id: row}
+        self._rows: dict[str, int] = {}
+        self._user_ids: list[str] = []
+        self._masks: list[int] = []
+        self._cities: list[str | None] = []
+        self._visibility: list[VisibilityEnum] = []
+        # {city: {row}}
+        self._city_rows: dict[str, set[int]] = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with db_conn() as db:
+                users = (
+                    db.query(User.id, Profile.city, Profile.visibility)
+                    .outerjoin(Profile, Profile.user_id == User.id)
+                    .order_by(User.id)
+                    .all()
+                )
+                pairs = db.query(UserInterest.user_id, UserInterest.interest_id).all()
+
+            for user_id, city, visibility in users:
+                self._append_row(user_id, city, visibility or VisibilityEnum.all)
+            for user_id, interest_id in pairs:
+                row = self._rows.get(user_id)
+                if row is not None:
+                    self._masks[row] |= 1 << self._bit_for(interest_id)
+
+            self._loaded = True
+            logger.info(
+                f"Interest index loaded: {len(self._user_ids)} users, "
+                f"{len(self._bits)} interests."
+            )
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        user_ids: list[str],
+        masks: list[int],
+        visibility: list[VisibilityEnum],
+    ) -> "InterestIndex":
+        # Only for scoring: the interest -> bit mapping is not restored.
+        index = cls()
+        index._user_ids = list(user_ids)
+        index._masks = list(masks)
+        index._visibility = list(visibility)
+        index._rows = {user_id: row for row, user_id in enumerate(user_ids)}
+        index._cities = [None] * len(user_ids)
+        index._loaded = True
+        return index
+
+    def snapshot(self) -> tuple[list[str], list[int], list[VisibilityEnum]]:
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._user_ids), list(self._masks), list(self._visibility)
+
+    def _bit_for(self, interest_id: str) -> int:
+        bit = self._bits.get(interest_id)
+        if bit is None:
+            bit = len(self._bits)
+            self._bits[interest_id] = bit
+        return bit
+
+    def _append_row(
+        self,
+        user_id: str,
+        city: str | None = None,
+        visibility: VisibilityEnum = VisibilityEnum.all,
+    ) -> int:
+        row = len(self._user_ids)
+        self._rows[user_id] = row
+        self._user_ids.append(user_id)
+        self._masks.append(0)
+        self._visibility.append(visibility)
+        self._cities.append(None)
+        self._set_city(row, city)
+        return row
+
+    def _set_city(self, row: int, city: str | None):
+        old_city = self._cities[row]
+        if old_city is not None:
+            self._city_rows[old_city].discard(row)
+            if not self._city_rows[old_city]:
+                del self._city_rows[old_city]
+        self._cities[row] = city
+        if city is not None:
+            self._city_rows.setdefault(city, set()).add(row)
+
+    def encode(self, interest_ids) -> int:
+        mask = 0
+        with self._lock:
+            for interest_id in interest_ids:
+                mask |= 1 << self._bit_for(interest_id)
+        return mask
+
+    def add_user(self, user_id: str):
+        with self._lock:
+            if self._loaded and user_id not in self._rows:
+                self._append_row(user_id)
+
+    def set_user_interests(self, user_id: str, interest_ids: list[str]):
+        with self._lock:
+            if not self._loaded:
+                return
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._append_row(user_id)
+            self._masks[row] = self.encode(interest_ids)
+
+    def set_user_city(self, user_id: str, city: str | None):
+        with self._lock:
+            if not self._loaded:
+                return
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._append_row(user_id)
+            self._set_city(row, city)
+
+    def set_user_visibility(self, user_id: str, visibility: VisibilityEnum):
+        with self._lock:
+            if not self._loaded:
+                return
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._append_row(user_id)
+            self._visibility[row] = visibility
+
+    def city_of(self, user_id: str) -> str | None:
+        self._ensure_loaded()
+        row = self._rows.get(user_id)
+        return self._cities[row] if row is not None else None
+
+    def city_pool_size(self, city: str) -> int:
+        self._ensure_loaded()
+        return len(self._city_rows.get(city, ()))
+
+    def mask_of(self, user_id: str) -> int:
+        self._ensure_loaded()
+        row = self._rows.get(user_id)
+        return self._masks[row] if row is not None else 0
+
+    def score(
+        self,
+        user_id: str,
+        exclude: set[str] | frozenset[str] = frozenset(),
+        city: str | None = None,
+        partners: set[str] | frozenset[str] = frozenset(),
+    ) -> list[tuple[int, str]]:
+        """
+        Возвращает пары (совместимость, user_id) для всех кандидатов
+        с ненулевой совместимостью. Сам пользователь и exclude пропускаются.
+        Если указан city, просматривается только пул этого города.
+        Кандидаты с visibility=matched видны только из partners.
+        """
+        self._ensure_loaded()
+        row = self._rows.get(user_id)
+        if row is None:
+            return []
+
+        mine = self._masks[row]
+        if not mine:
+            return []
+
+        if city is not None:
+            candidates = (
+                (
+                    self._user_ids[city_row],
+                    self._masks[city_row],
+                    self._visibility[city_row],
+                )
+                for city_row in list(self._city_rows.get(city, ()))
+            )
+        else:
+            candidates = zip(self._user_ids, self._masks, self._visibility)
+
+        scored = []
+        for candidate_id, mask, visibility in candidates:
+            common = mine & mask
+            if not common or candidate_id == user_id or candidate_id in exclude:
+                continue
+            if visibility is not VisibilityEnum.all and (
+                visibility is VisibilityEnum.none or candidate_id not in partners
+            ):
+                continue
+            compatibility = jaccard_percent(
+                common.bit_count(), (mine | mask).bit_count()
+            )
+            if compatibility > 0:
+                scored.append((compatibility, candidate_id))
+        return scored
+
+
+def _create_index():
+    if settings.INTEREST_MATRIX_DIR:
+        from .interest_matrix import SharedInterestIndex
+
+        return SharedInterestIndex(settings.INTEREST_MATRIX_DIR)
+    return InterestIndex()
+
+
+interest_index = _create_index()
@@ -0,0 +1,480 @@
+"""
+Матрица интересов в memory-mapped файле, общая для всех воркеров.
+
+Файл пишет один процесс-сборщик (app.jobs.build_interest_matrix), воркеры
+API отображают его в память только на чтение. Каждое поколение пишется
+в отдельный файл, а указатель CURRENT атомарно переключается на новое,
+поэтому воркеры подхватывают его без блокировок.
+
+Формат (little-endian):
+    заголовок _HEADER
+    n_users * 36 байт     - id пользователей, отсортированы
+    n_interests * 36 байт - id интересов в порядке битов
+    cities_size байт      - JSON-список городов
+    выравнивание до 8 байт
+    n_users * words * 8 байт - маски, words слов uint64 на пользователя
+    n_users * 4 байта        - номер города пользователя + 1 (0 - не указан)
+    (n_cities + 1) * 4 байта - начало пула каждого города в city_rows
+    n_city_rows * 4 байта    - строки пользователей, сгруппированные по городам
+    n_users байт             - Profile.visibility, номер в VISIBILITY
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from .compatibility import jaccard_percent
+from .recommendation_cache import recommendation_cache
+from ..data.db import db_conn
+from ..data.models.profile import Profile, VisibilityEnum
+from ..data.models.user import User
+from ..data.models.user_interest import UserInterest
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TINTMTX1"
+FORMAT_VERSION = 3
+CURRENT_FILE = "CURRENT"
+FILE_PREFIX = "interest-matrix-"
+
+# magic, version, generation, built_at, n_users, n_interests, words,
+# n_cities, cities_size
+_HEADER = struct.Struct("<8sIQdIIIII")
+_ID_SIZE = 36
+
+VISIBILITY = tuple(VisibilityEnum)
+_VISIBLE_TO_ALL = VISIBILITY.index(VisibilityEnum.all)
+_VISIBLE_TO_NONE = VISIBILITY.index(VisibilityEnum.none)
+
+
+def _align8(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _u32_array(values) -> array:
+    result = array("I", values)
+    if sys.byteorder != "little":
+        result.byteswap()
+    return result
+
+
+class MappedInterestMatrix:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            self.generation,
+            self.built_at,
+            self.n_users,
+            self.n_interests,
+            self.words,
+            n_cities,
+            cities_size,
+        ) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported interest matrix file: {path}")
+
+        self._users_offset = _HEADER.size
+        self._interests_offset = self._users_offset + self.n_users * _ID_SIZE
+        cities_offset = self._interests_offset + self.n_interests * _ID_SIZE
+        self.cities: list[str] = json.loads(
+            self._mm[cities_offset : cities_offset + cities_size]
+        )
+        self._city_numbers = {city: number for number, city in enumerate(self.cities)}
+
+        view = memoryview(self._mm)
+        offset = _align8(cities_offset + cities_size)
+        size = self.n_users * self.words * 8
+        self._masks = view[offset : offset + size].cast("Q")
+        offset += size
+        self._user_cities = view[offset : offset + self.n_users * 4].cast("I")
+        offset += self.n_users * 4
+        self._city_offsets = view[offset : offset + (n_cities + 1) * 4].cast("I")
+        offset += (n_cities + 1) * 4
+        self._city_rows = view[offset : offset + self._city_offsets[-1] * 4].cast("I")
+        offset += self._city_offsets[-1] * 4
+        self._visibility = view[offset : offset + self.n_users]
+
+    def _id_at(self, offset: int) -> bytes:
+        return self._mm[offset : offset + _ID_SIZE].rstrip(b"\0")
+
+    def user_id(self, row: int) -> str:
+        return self._id_at(self._users_offset + row * _ID_SIZE).decode()
+
+    def interest_ids(self) -> list[str]:
+        return [
+            self._id_at(self._interests_offset + bit * _ID_SIZE).decode()
+            for bit in range(self.n_interests)
+        ]
+
+    def row_of(self, user_id: str) -> int | None:
+        target = user_id.encode()
+        lo, hi = 0, self.n_users
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_at(self._users_offset + mid * _ID_SIZE) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_users and self._id_at(self._users_offset + lo * _ID_SIZE) == target:
+            return lo
+        return None
+
+    def mask(self, row: int) -> int:
+        if self.words == 1:
+            return self._masks[row]
+        start = row * self.words
+        return int.from_bytes(self._masks[start : start + self.words].tobytes(), "little")
+
+    def iter_masks(self):
+        if self.words == 1:
+            return iter(self._masks)
+        return (self.mask(row) for row in range(self.n_users))
+
+    def city(self, row: int) -> str | None:
+        number = self._user_cities[row]
+        return self.cities[number - 1] if number else None
+
+    def visibility_code(self, row: int) -> int:
+        return self._visibility[row]
+
+    def visibility(self, row: int) -> VisibilityEnum:
+        return VISIBILITY[self._visibility[row]]
+
+    def city_rows(self, city: str):
+        number = self._city_numbers.get(city)
+        if number is None:
+            return ()
+        return self._city_rows[self._city_offsets[number] : self._city_offsets[number + 1]]
+
+
+class SharedInterestIndex:
+    """
+    Тот же интерфейс, что у InterestIndex, но данные читаются из общего
+    memory-mapped файла.
+
+    Изменения, сделанные в этом процессе после сборки текущего поколения,
+    держатся в небольшом локальном overlay и отбрасываются, когда сборщик
+    публикует поколение, которое их уже содержит.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._matrix: MappedInterestMatrix | None = None
+        self._pointer_stat: tuple[int, int] | None = None
+        self._checked_at = 0.0
+        # {interest_id: bit}
+        self._bits: dict[str, int] = {}
+        # {user_id: {"interest_ids", "mask", "city", "visibility", "changed_at"}}
+        self._overlay: dict[str, dict] = {}
+
+    def _refresh(self) -> MappedInterestMatrix:
+        now = time.monotonic()
+        if self._matrix is not None and now - self._checked_at < self.check_interval:
+            return self._matrix
+
+        with self._lock:
+            self._checked_at = now
+            pointer = os.path.join(self.directory, CURRENT_FILE)
+            try:
+                stat = os.stat(pointer)
+            except FileNotFoundError:
+                if self._matrix is None:
+                    raise RuntimeError(
+                        f"Interest matrix snapshot not found in {self.directory}"
+                    )
+                return self._matrix
+
+            if (stat.st_ino, stat.st_mtime_ns) != self._pointer_stat:
+                with open(pointer) as f:
+                    name = f.read().strip()
+                matrix = MappedInterestMatrix(os.path.join(self.directory, name))
+
+                bits = {
+                    interest_id: bit
+                    for bit, interest_id in enumerate(matrix.interest_ids())
+                }
+                for interest_id in self._bits:
+                    bits.setdefault(interest_id, len(bits))
+                self._bits = bits
+
+                overlay = {}
+                for user_id, entry in self._overlay.items():
+                    if entry["changed_at"] >= matrix.built_at:
+                        overlay[user_id] = {
+                            **entry,
+                            "mask": self.encode(entry["interest_ids"]),
+                        }
+                self._overlay = overlay
+                self._matrix = matrix
+                self._pointer_stat = (stat.st_ino, stat.st_mtime_ns)
+                # Cached lists were scored against the previous generation:
+                # other workers' changes and the bit layout may differ.
+                recommendation_cache.clear()
+                logger.info(
+                    f"Mapped interest matrix generation {matrix.generation}: "
+                    f"{matrix.n_users} users, {matrix.n_interests} interests."
+                )
+            return self._matrix
+
+    def encode(self, interest_ids) -> int:
+        mask = 0
+        with self._lock:
+            for interest_id in interest_ids:
+                bit = self._bits.get(interest_id)
+                if bit is None:
+                    bit = self._bits[interest_id] = len(self._bits)
+                mask |= 1 << bit
+        return mask
+
+    def _overlay_entry(self, user_id: str) -> dict:
+        entry = self._overlay.get(user_id)
+        if entry is not None:
+            return entry
+
+        matrix = self._matrix
+        row = matrix.row_of(user_id)
+        mask = matrix.mask(row) if row is not None else 0
+        entry = {
+            "interest_ids": tuple(
+                interest_id for interest_id, bit in self._bits.items() if mask >> bit & 1
+            ),
+            "mask": mask,
+            "city": matrix.city(row) if row is not None else None,
+            "visibility": (
+                matrix.visibility(row) if row is not None else VisibilityEnum.all
+            ),
+            "changed_at": 0.0,
+        }
+        self._overlay[user_id] = entry
+        return entry
+
+    def add_user(self, user_id: str):
+        # Пока у пользователя нет интересов, его маска нулевая.
+        pass
+
+    def set_user_interests(self, user_id: str, interest_ids: list[str]):
+        self._refresh()
+        with self._lock:
+            entry = self._overlay_entry(user_id)
+            entry["interest_ids"] = tuple(interest_ids)
+            entry["mask"] = self.encode(interest_ids)
+            entry["changed_at"] = time.time()
+
+    def set_user_city(self, user_id: str, city: str | None):
+        self._refresh()
+        with self._lock:
+            entry = self._overlay_entry(user_id)
+            entry["city"] = city
+            entry["changed_at"] = time.time()
+
+    def set_user_visibility(self, user_id: str, visibility: VisibilityEnum):
+        self._refresh()
+        with self._lock:
+            entry = self._overlay_entry(user_id)
+            entry["visibility"] = visibility
+            entry["changed_at"] = time.time()
+
+    def city_of(self, user_id: str) -> str | None:
+        matrix = self._refresh()
+        entry = self._overlay.get(user_id)
+        if entry is not None:
+            return entry["city"]
+        row = matrix.row_of(user_id)
+        return matrix.city(row) if row is not None else None
+
+    def city_pool_size(self, city: str) -> int:
+        matrix = self._refresh()
+        return len(matrix.city_rows(city)) + sum(
+            1 for entry in self._overlay.values() if entry["city"] == city
+        )
+
+    def mask_of(self, user_id: str) -> int:
+        matrix = self._refresh()
+        entry = self._overlay.get(user_id)
+        if entry is not None:
+            return entry["mask"]
+        row = matrix.row_of(user_id)
+        return matrix.mask(row) if row is not None else 0
+
+    def score(
+        self,
+        user_id: str,
+        exclude: set[str] | frozenset[str] = frozenset(),
+        city: str | None = None,
+        partners: set[str] | frozenset[str] = frozenset(),
+    ) -> list[tuple[int, str]]:
+        matrix = self._refresh()
+        overlay = self._overlay
+        mine = self.mask_of(user_id)
+        if not mine:
+            return []
+
+        if city is not None:
+            rows = ((row, matrix.mask(row)) for row in matrix.city_rows(city))
+        else:
+            rows = enumerate(matrix.iter_masks())
+
+        scored = []
+        for row, mask in rows:
+            common = mine & mask
+            if not common:
+                continue
+            visibility = matrix.visibility_code(row)
+            if visibility == _VISIBLE_TO_NONE:
+                continue
+            candidate_id = matrix.user_id(row)
+            if candidate_id == user_id or candidate_id in exclude or candidate_id in overlay:
+                continue
+            if visibility != _VISIBLE_TO_ALL and candidate_id not in partners:
+                continue
+            compatibility = jaccard_percent(common.bit_count(), (mine | mask).bit_count())
+            if compatibility > 0:
+                scored.append((compatibility, candidate_id))
+
+        for candidate_id, entry in list(overlay.items()):
+            if city is not None and entry["city"] != city:
+                continue
+            common = mine & entry["mask"]
+            if not common or candidate_id == user_id or candidate_id in exclude:
+                continue
+            visibility = entry["visibility"]
+            if visibility is not VisibilityEnum.all and (
+                visibility is VisibilityEnum.none or candidate_id not in partners
+            ):
+                continue
+            compatibility = jaccard_percent(
+                common.bit_count(), (mine | entry["mask"]).bit_count()
+            )
+            if compatibility > 0:
+                scored.append((compatibility, candidate_id))
+        return scored
+
+
+def _read_current(directory: str) -> tuple[int, MappedInterestMatrix | None]:
+    pointer = os.path.join(directory, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return 0, None
+    with open(pointer) as f:
+        name = f.read().strip()
+    generation = int(name[len(FILE_PREFIX) : -len(".bin")])
+    try:
+        return generation, MappedInterestMatrix(os.path.join(directory, name))
+    except ValueError:
+        # Поколение старого формата: порядок битов начнётся заново.
+        return generation, None
+
+
+def _replace_atomically(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(directory: str) -> int:
+    """
+    Собирает новое поколение матрицы из БД и публикует его. Порядок битов
+    предыдущего поколения сохраняется, новые интересы дописываются в конец.
+    Возвращает номер поколения.
+    """
+    os.makedirs(directory, exist_ok=True)
+    built_at = time.time()
+
+    with db_conn() as db:
+        users = (
+            db.query(User.id, Profile.city, Profile.visibility)
+            .outerjoin(Profile, Profile.user_id == User.id)
+            .order_by(User.id)
+            .all()
+        )
+        pairs = db.query(UserInterest.user_id, UserInterest.interest_id).all()
+
+    previous_generation, previous = _read_current(directory)
+    generation = previous_generation + 1
+    interest_ids = previous.interest_ids() if previous else []
+    bits = {interest_id: bit for bit, interest_id in enumerate(interest_ids)}
+    for _, interest_id in pairs:
+        if interest_id not in bits:
+            bits[interest_id] = len(interest_ids)
+            interest_ids.append(interest_id)
+
+    user_ids = [user_id for user_id, _, _ in users]
+    words = max(1, -(-len(interest_ids) // 64))
+    rows = {user_id: row for row, user_id in enumerate(user_ids)}
+    masks = array("Q", bytes(8 * words * len(user_ids)))
+    for user_id, interest_id in pairs:
+        row = rows.get(user_id)
+        if row is not None:
+            bit = bits[interest_id]
+            masks[row * words + bit // 64] |= 1 << (bit % 64)
+    if sys.byteorder != "little":
+        masks.byteswap()
+
+    cities = sorted({city for _, city, _ in users if city})
+    city_numbers = {city: number for number, city in enumerate(cities)}
+    pools: list[list[int]] = [[] for _ in cities]
+    for row, (_, city, _) in enumerate(users):
+        if city:
+            pools[city_numbers[city]].append(row)
+    city_offsets = [0]
+    for pool in pools:
+        city_offsets.append(city_offsets[-1] + len(pool))
+
+    cities_blob = json.dumps(cities, ensure_ascii=False).encode()
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        generation,
+        built_at,
+        len(user_ids),
+        len(interest_ids),
+        words,
+        len(cities),
+        len(cities_blob),
+    )
+    ids = b"".join(
+        value.encode().ljust(_ID_SIZE, b"\0") for value in user_ids + interest_ids
+    )
+    body = header + ids + cities_blob
+    body += b"\0" * (_align8(len(body)) - len(body))
+    body += masks.tobytes()
+    body += _u32_array(
+        city_numbers[city] + 1 if city else 0 for _, city, _ in users
+    ).tobytes()
+    body += _u32_array(city_offsets).tobytes()
+    body += _u32_array(row for pool in pools for row in pool).tobytes()
+    body += bytes(
+        VISIBILITY.index(visibility or VisibilityEnum.all) for _, _, visibility in users
+    )
+
+    name = f"{FILE_PREFIX}{generation:08d}.bin"
+    _replace_atomically(os.path.join(directory, name), body)
+    _replace_atomically(os.path.join(directory, CURRENT_FILE), name.encode())
+
+    # Предыдущее поколение ещё может быть отображено воркерами.
+    for old in os.listdir(directory):
+        if old.startswith(FILE_PREFIX) and old.endswith(".bin"):
+            old_generation = int(old[len(FILE_PREFIX) : -len(".bin")])
+            if old_generation < generation - 1:
+                os.remove(os.path.join(directory, old))
+
+    logger.info(
+        f"Built interest matrix generation {generation}: "
+        f"{len(user_ids)} users, {len(interest_ids)} interests, "
+        f"{len(cities)} cities."
+    )
+    return generation
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+
+from sqlalchemy import (
+    BigInteger,
+    Text,
+    cast,
+    func,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
+
+from .config import settings
+from ..data.db import db_conn, dialect_insert
+from ..data.models.chat import Chat
+from ..data.models.message import Message, MessageVersion
+from ..schemas.chat_schemas import MessageCreate
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, author_id, msg_data)
+Draft = tuple[str, str, MessageCreate]
+# (message, [participant_id], created) - created=False для повтора по client_id
+Written = tuple[Message, list[str], bool]
+
+
+def _created_at(dialect: str):
+    # now() в PostgreSQL - время начала транзакции, и все сообщения пачки
+    # получили бы одинаковое время. clock_timestamp() сохраняет их порядок.
+    if dialect == "postgresql":
+        return func.clock_timestamp()
+    return func.now()
+
+
+# Message.version в PostgreSQL - id транзакции, записавшей изменение.
+_TRANSACTION_ID = cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+
+# Снимок транзакций: (xmax, xip). Транзакция с id v видна в снимке, если
+# v < xmax и v не входит в xip (в момент снимка она ещё не закоммичена).
+Snapshot = tuple[int, list[int]]
+
+
+def allocate_versions(db, count: int = 1) -> list:
+    """
+    Версии для count изменений сообщений в текущей транзакции.
+
+    В PostgreSQL это id самой транзакции: общих блокировок нет, а изменения,
+    закоммиченные между двумя снимками (version_snapshot), лента
+    синхронизации находит по их спискам незавершённых транзакций.
+    SQLite и так пишет по одной транзакции за раз, поэтому там версии -
+    следующие номера счётчика MessageVersion, а снимок - его значение.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return [_TRANSACTION_ID] * count
+    last = db.execute(
+        update(MessageVersion)
+        .where(MessageVersion.id == 1)
+        .values(value=MessageVersion.value + count)
+        .returning(MessageVersion.value)
+    ).scalar_one()
+    return list(range(last - count + 1, last + 1))
+
+
+def version_snapshot(db) -> Snapshot:
+    """
+    Снимок транзакций, которым читает сессия. В PostgreSQL сессия должна
+    работать в REPEATABLE READ, чтобы остальные запросы видели то же самое.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        xmax, xip = db.execute(
+            text(
+                "SELECT pg_snapshot_xmax(s)::text::bigint, "
+                "ARRAY(SELECT pg_snapshot_xip(s)::text::bigint) "
+                "FROM pg_current_snapshot() AS s"
+            )
+        ).one()
+        return xmax, sorted(xip)
+    value = db.scalar(select(MessageVersion.value).where(MessageVersion.id == 1))
+    return value + 1, []
+
+
+def write_messages(drafts: list[Draft]) -> list[Written | ValueError]:
+    """
+    Сохраняет сообщения одной транзакцией: один multi-row INSERT
+    с ON CONFLICT DO NOTHING по (author_id, client_id), id, created_at
+    и version возвращаются через RETURNING. Обновляет последнее сообщение чатов.
+
+    Результаты идут в порядке drafts. Для повтора по client_id возвращается
+    уже сохранённое сообщение, а если этот client_id использован в другом
+    чате - ValueError.
+    """
+    with db_conn() as db:
+        created_at = _created_at(db.get_bind().dialect.name)
+        return _write(db, drafts, created_at)
+
+
+def _write(db, drafts: list[Draft], created_at) -> list[Written | ValueError]:
+    # Versions of duplicates by client_id stay unused.
+    versions = allocate_versions(db, len(drafts))
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "chat_id": chat_id,
+            "author_id": author_id,
+            "text": msg_data.text,
+            "client_id": msg_data.client_id,
+            "created_at": created_at,
+            "version": version,
+        }
+        for version, (chat_id, author_id, msg_data) in zip(versions, drafts)
+    ]
+
+    inserted = {
+        message_id: (created_at, version)
+        for message_id, created_at, version in db.execute(
+            dialect_insert(Message)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["author_id", "client_id"])
+            .returning(Message.id, Message.created_at, Message.version)
+        )
+    }
+
+    duplicates = [
+        (row["author_id"], row["client_id"])
+        for row in rows
+        if row["id"] not in inserted
+    ]
+    existing = {}
+    if duplicates:
+        existing = {
+            (message.author_id, message.client_id): message
+            for message in db.query(Message).filter(
+                tuple_(Message.author_id, Message.client_id).in_(duplicates)
+            )
+        }
+
+    participants = {
+        chat_id: [direct_a, direct_b]
+        for chat_id, direct_a, direct_b in db.query(
+            Chat.id, Chat.direct_a, Chat.direct_b
+        ).filter(Chat.id.in_({row["chat_id"] for row in rows}))
+    }
+
+    results: list[Written | ValueError] = []
+    latest: dict[str, Message] = {}
+    for row in rows:
+        if row["id"] in inserted:
+            created_at, version = inserted[row["id"]]
+            message = Message(**row | {"created_at": created_at, "version": version})
+            results.append((message, participants[row["chat_id"]], True))
+            current = latest.get(row["chat_id"])
+            if current is None or current.created_at <= message.created_at:
+                latest[row["chat_id"]] = message
+            continue
+
+        message = existing[(row["author_id"], row["client_id"])]
+        if message.chat_id != row["chat_id"]:
+            results.append(ValueError("client_id is already used in another chat."))
+        else:
+            results.append((message, participants[row["chat_id"]], False))
+
+    for chat_id, message in latest.items():
+        # Старое сообщение, закоммиченное позже нового, не перетирает его.
+        db.query(Chat).filter(
+            Chat.id == chat_id,
+            or_(
+                Chat.last_message_at.is_(None),
+                Chat.last_message_at <= message.created_at,
+            ),
+        ).update(
+            {
+                Chat.last_message_id: message.id,
+                Chat.last_message_text: message.text,
+                Chat.last_message_author_id: message.author_id,
+                Chat.last_message_at: message.created_at,
+                Chat.last_activity_at: message.created_at,
+            },
+            synchronize_session=False,
+        )
+
+    return results
+
+
+class MessageWriter:
+    """
+    Групповая запись сообщений чатов.
+
+    create_message передаёт сообщение в submit и ждёт, пока его пачка
+    не будет закоммичена. Пачка пишется через write_messages, когда
+    набралось max_batch сообщений или прошло interval секунд с прихода
+    первого из них. Пока пачка пишется, следующая продолжает набираться.
+    """
+
+    def __init__(self, enabled: bool, max_batch: int, interval: float):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.interval = interval
+        self._pending: list[tuple[Draft, asyncio.Future]] = []
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._flushing: asyncio.Task | None = None
+
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self._batch_sizes: deque[int] = deque(maxlen=1000)
+        self._batch_latencies: deque[float] = deque(maxlen=1000)
+
+    async def submit(
+        self, chat_id: str, author_id: str, msg_data: MessageCreate
+    ) -> Written:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((chat_id, author_id, msg_data), future))
+        self._arrived.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Пачку, которая уже пишется, нельзя бросить: её ждут вызывающие.
+        if self._flushing is not None:
+            await self._flushing
+        while self._pending:
+            await self._flush_next()
+        logger.info(f"Message writer stopped: {self.stats()}")
+
+    async def _run(self):
+        while True:
+            await self._arrived.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except TimeoutError:
+                pass
+            self._flushing = asyncio.create_task(self._flush_next())
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush_next(self):
+        batch = self._pending[: self.max_batch]
+        self._pending = self._pending[self.max_batch :]
+        if not self._pending:
+            self._arrived.clear()
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        if not batch:
+            return
+
+        started = time.monotonic()
+        try:
+            results = await asyncio.to_thread(
+                write_messages, [draft for draft, _ in batch]
+            )
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write a batch of {len(batch)} messages: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.written += len(batch)
+        self._batch_sizes.append(len(batch))
+        self._batch_latencies.append(time.monotonic() - started)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        sizes = sorted(self._batch_sizes)
+        latencies = sorted(self._batch_latencies)
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+            "batch_size_avg": round(sum(sizes) / len(sizes), 1) if sizes else None,
+            "batch_size_max": sizes[-1] if sizes else None,
+            "batch_latency_p50_ms": (
+                round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None
+            ),
+            "batch_latency_p99_ms": (
+                round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+                if latencies
+                else None
+            ),
+        }
+
+
+message_writer = MessageWriter(
+    enabled=settings.CHAT_GROUP_COMMIT,
+    max_batch=settings.CHAT_GROUP_COMMIT_MAX_BATCH,
+    interval=settings.CHAT_GROUP_COMMIT_INTERVAL,
+)
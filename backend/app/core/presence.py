@@ -0,0 +1,74 @@
+import time
+from datetime import datetime, timezone
+
+from .config import settings
+
+
+class Presence:
+    """
+    Присутствие пользователей в сети по данным всех воркеров.
+
+    Каждый воркер объявляет через backplane, какие пользователи подключены
+    к нему, и периодически повторяет объявление. Пользователь в сети, пока
+    хотя бы у одного воркера не истёк срок его объявления, поэтому
+    пользователи упавшего воркера уходят из сети через ttl секунд.
+    Запросы обслуживаются из памяти, без обращения к БД.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # {user_id: {worker_id: (online, announced at)}}, wall-clock seconds.
+        # Offline entries are kept until they expire so that a stale
+        # "online" delivered out of order does not override them.
+        self._workers: dict[str, dict[str, tuple[bool, float]]] = {}
+        # {user_id: wall-clock seconds}
+        self._last_seen: dict[str, float] = {}
+
+    def apply(self, worker: str, online: list[str], offline: list[str], at: float):
+        for user_ids, is_online in ((online, True), (offline, False)):
+            for user_id in user_ids:
+                workers = self._workers.setdefault(user_id, {})
+                current = workers.get(worker)
+                if current is not None and current[1] > at:
+                    continue
+                workers[worker] = (is_online, at)
+                self._last_seen[user_id] = max(self._last_seen.get(user_id, at), at)
+
+    def expire(self):
+        deadline = time.time() - self.ttl
+        for user_id in list(self._workers):
+            workers = self._workers[user_id]
+            for worker, (_, at) in list(workers.items()):
+                if at <= deadline:
+                    del workers[worker]
+            if not workers:
+                del self._workers[user_id]
+
+    def is_online(self, user_id: str) -> bool:
+        deadline = time.time() - self.ttl
+        return any(
+            is_online and at > deadline
+            for is_online, at in self._workers.get(user_id, {}).values()
+        )
+
+    def get_many(
+        self, user_ids: list[str]
+    ) -> dict[str, tuple[bool, datetime | None]]:
+        """Возвращает {user_id: (online, last_seen_at)}."""
+        result = {}
+        for user_id in user_ids:
+            last_seen = self._last_seen.get(user_id)
+            result[user_id] = (
+                self.is_online(user_id),
+                datetime.fromtimestamp(last_seen, timezone.utc)
+                if last_seen is not None
+                else None,
+            )
+        return result
+
+    def online_count(self) -> int:
+        return sum(1 for user_id in self._workers if self.is_online(user_id))
+
+
+# Воркеры повторяют объявление на каждом проходе sweeper'а.
+presence = Presence(ttl=settings.WS_PING_INTERVAL * 3)
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+
+from .config import settings
+from .compatibility import jaccard_percent
+
+
+class RecommendationCache:
+    """
+    LRU-кэш топ-K рекомендаций на пользователя.
+
+    Ключ - (owner_id, city): city задан для рекомендаций в пределах города.
+
+    Вместе со списком хранится маска интересов владельца на момент расчёта,
+    поэтому при изменении чужих интересов можно без обращения к БД понять,
+    попадёт ли изменившийся пользователь в закэшированный топ.
+    """
+
+    def __init__(self, max_entries: int, top_k: int):
+        self.max_entries = max_entries
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        # {(owner_id, city): (owner_mask, [(compatibility, user_id), ...])}
+        self._entries: OrderedDict[
+            tuple[str, str | None], tuple[int, list[tuple[int, str]]]
+        ] = OrderedDict()
+        # {owner_id: {key}}
+        self._owner_keys: dict[str, set[tuple[str, str | None]]] = {}
+        # {user_id: {key}}
+        self._appears_in: dict[str, set[tuple[str, str | None]]] = {}
+        self._epoch = 0
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(self, key: tuple[str, str | None]) -> list[tuple[int, str]] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(
+        self,
+        key: tuple[str, str | None],
+        owner_mask: int,
+        top: list[tuple[int, str]],
+        epoch: int,
+    ):
+        """
+        Сохраняет топ, посчитанный при указанной эпохе. Если с тех пор была
+        инвалидация, результат мог устареть и не кэшируется.
+        """
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._drop(key)
+            top = top[: self.top_k]
+            self._entries[key] = (owner_mask, top)
+            self._owner_keys.setdefault(key[0], set()).add(key)
+            for _, user_id in top:
+                self._appears_in.setdefault(user_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, owner_id: str):
+        with self._lock:
+            self._epoch += 1
+            for key in list(self._owner_keys.get(owner_id, ())):
+                self._drop(key)
+
+    def invalidate_user(self, user_id: str, new_mask: int):
+        """
+        Помечает устаревшими собственный список пользователя, списки, в которых
+        он уже есть, и списки, в которые он попадёт с маской new_mask.
+        """
+        with self._lock:
+            self._epoch += 1
+            stale = self._owner_keys.get(user_id, set()) | self._appears_in.get(
+                user_id, set()
+            )
+
+            if new_mask:
+                for key, (owner_mask, top) in self._entries.items():
+                    if key in stale:
+                        continue
+                    compatibility = jaccard_percent(
+                        (owner_mask & new_mask).bit_count(),
+                        (owner_mask | new_mask).bit_count(),
+                    )
+                    if compatibility > 0 and (
+                        len(top) < self.top_k or compatibility >= top[-1][0]
+                    ):
+                        stale.add(key)
+
+            for key in stale:
+                self._drop(key)
+
+    def clear(self):
+        """
+        Сбрасывает весь кэш, например при новом поколении общей матрицы
+        интересов: списки посчитаны по старому, и в нём могла быть другая
+        раскладка битов масок.
+        """
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._owner_keys.clear()
+            self._appears_in.clear()
+
+    def _drop(self, key: tuple[str, str | None]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        owner_keys = self._owner_keys.get(key[0])
+        if owner_keys is not None:
+            owner_keys.discard(key)
+            if not owner_keys:
+                del self._owner_keys[key[0]]
+        for _, user_id in entry[1]:
+            keys = self._appears_in.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._appears_in[user_id]
+
+
+recommendation_cache = RecommendationCache(
+    max_entries=settings.RECOMMENDATION_CACHE_SIZE,
+    top_k=settings.RECOMMENDATION_TOP_K,
+)
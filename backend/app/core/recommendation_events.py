@@ -0,0 +1,83 @@
+"""
+Изменения, от которых зависят рекомендации, для всех воркеров.
+
+Каждый воркер держит свой interest_index (или overlay SharedInterestIndex),
+hidden_index и recommendation_cache. Сервисы передают изменение в emit:
+оно применяется к структурам этого воркера и при backplane postgres
+рассылается через NOTIFY, а остальные воркеры применяют его в handle.
+С backplane local воркер один, и рассылать некому.
+
+Событие - словарь с полями kind и user_id:
+    user       - зарегистрирован пользователь
+    interests  - интересы пользователя, interest_ids
+    profile    - город и/или видимость (city, visibility), interest_ids
+    hide       - пользователь скрыл target_user_ids
+    match      - мэтч с partner_id
+"""
+
+import json
+import logging
+
+from .backplane import notify
+from .config import settings
+from .hidden_index import hidden_index
+from .interest_index import interest_index
+from .recommendation_cache import recommendation_cache
+from .websockets import manager
+from ..data.db import db_conn
+from ..data.models.profile import VisibilityEnum
+
+logger = logging.getLogger(__name__)
+
+# Ключ маршрутизации событий в backplane.
+KEY = "recommendations"
+
+
+def apply(event: dict):
+    kind, user_id = event["kind"], event["user_id"]
+    if kind == "user":
+        interest_index.add_user(user_id)
+        recommendation_cache.invalidate_user(user_id, 0)
+    elif kind == "interests":
+        interest_index.set_user_interests(user_id, event["interest_ids"])
+        recommendation_cache.invalidate_user(
+            user_id, interest_index.encode(event["interest_ids"])
+        )
+    elif kind == "profile":
+        if "city" in event:
+            interest_index.set_user_city(user_id, event["city"])
+        if "visibility" in event:
+            interest_index.set_user_visibility(
+                user_id, VisibilityEnum(event["visibility"])
+            )
+        recommendation_cache.invalidate_user(
+            user_id, interest_index.encode(event["interest_ids"])
+        )
+    elif kind == "hide":
+        hidden_index.add(user_id, event["target_user_ids"])
+        recommendation_cache.invalidate(user_id)
+    elif kind == "match":
+        # Мэтч открывает партнёрам профили с visibility=matched.
+        recommendation_cache.invalidate(user_id)
+        recommendation_cache.invalidate(event["partner_id"])
+    else:
+        logger.error(f"Unknown recommendation event: {kind}")
+
+
+def emit(event: dict):
+    """Применяет уже закоммиченное изменение и рассылает его воркерам."""
+    apply(event)
+    if settings.CHAT_BACKPLANE != "postgres":
+        return
+    message = json.dumps({KEY: {**event, "worker": manager.worker_id}})
+    try:
+        with db_conn() as db:
+            notify(db, KEY, message)
+    except Exception as e:
+        logger.error(f"Failed to publish recommendation event {event['kind']}: {e}")
+
+
+def handle(event: dict):
+    """Событие из backplane; свои события уже применены в emit."""
+    if event.get("worker") != manager.worker_id:
+        apply(event)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, select, func, literal, union_all, and_, or_
+from sqlalchemy.orm import aliased
+
+from .config import settings
+from ..data.db import db_conn
+from ..data.models.chat import Chat
+from ..data.models.chat_read import ChatRead
+from ..data.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+_RECONCILE_CHUNK = 500
+# Нижняя граница для чатов, которые участник ещё не открывал.
+_NEVER_READ = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def count_unread(user_ids: list[str]) -> dict[str, dict[str, int]]:
+    """
+    Считает в БД непрочитанные сообщения: {user_id: {chat_id: count}}.
+    Свои и удалённые сообщения не учитываются, чаты без непрочитанных
+    в результат не попадают.
+    """
+    participants = union_all(
+        select(Chat.id.label("chat_id"), Chat.direct_a.label("user_id")).where(
+            Chat.direct_a.in_(user_ids)
+        ),
+        select(Chat.id.label("chat_id"), Chat.direct_b.label("user_id")).where(
+            Chat.direct_b.in_(user_ids)
+        ),
+    ).subquery()
+    last_read = aliased(Message)
+    # Прочитанное сообщение могло быть удалено из БД: тогда остаётся только
+    # время. Граница - диапазон по ix_messages_chat_created, id разбирает
+    # только сообщения с тем же created_at.
+    read_at = func.coalesce(
+        last_read.created_at,
+        ChatRead.last_read_at,
+        literal(_NEVER_READ, DateTime(timezone=True)),
+    )
+
+    statement = (
+        select(participants.c.user_id, participants.c.chat_id, func.count())
+        .select_from(participants)
+        .join(Message, Message.chat_id == participants.c.chat_id)
+        .outerjoin(
+            ChatRead,
+            and_(
+                ChatRead.chat_id == participants.c.chat_id,
+                ChatRead.user_id == participants.c.user_id,
+            ),
+        )
+        .outerjoin(last_read, last_read.id == ChatRead.last_read_message_id)
+        .where(
+            Message.author_id != participants.c.user_id,
+            Message.deleted_at.is_(None),
+            Message.created_at >= read_at,
+            or_(Message.created_at > read_at, Message.id > last_read.id),
+        )
+        .group_by(participants.c.user_id, participants.c.chat_id)
+    )
+
+    result: dict[str, dict[str, int]] = {}
+    with db_conn() as db:
+        for user_id, chat_id, count in db.execute(statement):
+            result.setdefault(user_id, {})[chat_id] = count
+    return result
+
+
+class UnreadCounters:
+    """
+    Счётчики непрочитанных сообщений по участникам чатов.
+
+    Счётчики пользователя читаются из БД при первом обращении, дальше
+    меняются в create_message, mark_read и delete_message, а события чатов
+    с других воркеров приходят через backplane в apply. Изменения, пришедшие
+    во время чтения из БД, применяются к прочитанному, но запрос мог уже
+    их учесть, поэтому такие пользователи фоново перечитываются (reconcile).
+    Число пользователей ограничено, вытесняются давно не использованные.
+    """
+
+    def __init__(self, max_users: int, reconcile_interval: float):
+        self.max_users = max_users
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        # {user_id: {chat_id: count}}
+        self._counts: OrderedDict[str, dict[str, int]] = OrderedDict()
+        # {user_id: [changes since the start of each load in flight]},
+        # a change is (chat_id, +1) or (chat_id, None) for a reset;
+        # (None, None) drops everything loaded
+        self._loading: dict[str, list[list[tuple[str | None, int | None]]]] = {}
+        # users whose counters may have raced a load
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def get(self, user_id: str) -> dict[str, int]:
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is not None:
+                self._counts.move_to_end(user_id)
+                return dict(counts)
+
+        result = {}
+
+        def store(user_id: str, loaded: dict[str, int], valid: bool):
+            if valid:
+                loaded = self._counts.setdefault(user_id, loaded)
+                while len(self._counts) > self.max_users:
+                    self._counts.popitem(last=False)
+            result.update(loaded)
+
+        self._load([user_id], store)
+        return result
+
+    def _load(
+        self,
+        user_ids: list[str],
+        store: Callable[[str, dict[str, int], bool], None],
+    ):
+        """
+        Читает счётчики из БД и применяет изменения, пришедшие за это время.
+        store(user_id, counts, valid) вызывается под блокировкой, поэтому
+        между ним и учётом изменений ничего не теряется; valid=False, если
+        счётчики пользователя сбросили целиком и прочитанное кэшировать нельзя.
+        """
+        changes = {user_id: [] for user_id in user_ids}
+        with self._lock:
+            for user_id, user_changes in changes.items():
+                self._loading.setdefault(user_id, []).append(user_changes)
+        try:
+            fresh = count_unread(user_ids)
+        except Exception:
+            with self._lock:
+                self._finish_load(changes)
+            raise
+
+        with self._lock:
+            self._finish_load(changes)
+            for user_id, user_changes in changes.items():
+                counts = fresh.get(user_id, {})
+                valid = True
+                for chat_id, delta in user_changes:
+                    if chat_id is None:
+                        valid = False
+                    elif delta is None:
+                        counts.pop(chat_id, None)
+                    else:
+                        counts[chat_id] = counts.get(chat_id, 0) + delta
+                if user_changes:
+                    self._dirty.add(user_id)
+                store(user_id, counts, valid)
+
+    def _finish_load(self, changes: dict[str, list]):
+        for user_id, user_changes in changes.items():
+            loads = self._loading[user_id]
+            loads.remove(user_changes)
+            if not loads:
+                del self._loading[user_id]
+
+    def _record(self, user_id: str, chat_id: str | None, delta: int | None):
+        for user_changes in self._loading.get(user_id, ()):
+            user_changes.append((chat_id, delta))
+
+    def increment(self, chat_id: str, user_id: str):
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is not None:
+                counts[chat_id] = counts.get(chat_id, 0) + 1
+            self._record(user_id, chat_id, 1)
+
+    def reset(self, chat_id: str, user_id: str):
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is not None:
+                counts.pop(chat_id, None)
+            self._record(user_id, chat_id, None)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._counts.pop(user_id, None)
+            self._record(user_id, None, None)
+
+    def apply(self, chat_id: str, participants: list[str], frame: dict):
+        """Событие чата, опубликованное другим воркером (см. ConnectionManager)."""
+        frame_type = frame.get("type")
+        if frame_type == "message":
+            for user_id in participants:
+                if user_id != frame["message"]["author_id"]:
+                    self.increment(chat_id, user_id)
+        elif frame_type == "message_deleted":
+            for user_id in participants:
+                self.invalidate(user_id)
+        elif frame_type == "read":
+            self.invalidate(frame["user_id"])
+
+    def reconcile(self) -> int:
+        """
+        Перечитывает из БД счётчики закэшированных пользователей, чьё чтение
+        пересеклось с изменениями. Возвращает число пользователей
+        с исправленными счётчиками.
+        """
+        with self._lock:
+            user_ids = [user_id for user_id in self._dirty if user_id in self._counts]
+            self._dirty.clear()
+
+        corrected = 0
+
+        def store(user_id: str, actual: dict[str, int], valid: bool):
+            nonlocal corrected
+            counts = self._counts.get(user_id)
+            if counts is None:
+                return
+            if not valid:
+                del self._counts[user_id]
+            elif counts != actual:
+                corrected += 1
+                self._counts[user_id] = actual
+
+        for start in range(0, len(user_ids), _RECONCILE_CHUNK):
+            try:
+                self._load(user_ids[start : start + _RECONCILE_CHUNK], store)
+            except Exception:
+                with self._lock:
+                    self._dirty.update(user_ids[start:])
+                raise
+        return corrected
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                corrected = await asyncio.to_thread(self.reconcile)
+                if corrected:
+                    logger.info(f"Reconciled unread counters for {corrected} users.")
+            except Exception as e:
+                logger.error(f"Failed to reconcile unread counters: {e}")
+
+
+unread_counters = UnreadCounters(
+    max_users=settings.UNREAD_CACHE_SIZE,
+    reconcile_interval=settings.UNREAD_RECONCILE_INTERVAL,
+)
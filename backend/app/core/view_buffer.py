@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+
+from .config import settings
+from ..data.db import db_conn
+from ..data.models.user import User
+from ..data.models.user_interaction import UserInteraction, InteractionActionEnum
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+    """
+    Буфер отложенной записи показов карточек (InteractionActionEnum.view).
+
+    События копятся в памяти, повторы пары (user, target) в пределах окна
+    отбрасываются, а накопленное пишется одним multi-row INSERT по размеру
+    пачки или по таймеру. При переполнении новые события не принимаются
+    и учитываются в счётчике dropped.
+
+    Окно дедупликации хранит не больше dedup_size пар: при переполнении
+    забываются самые старые, и их повтор будет записан ещё раз.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        flush_size: int,
+        flush_interval: float,
+        dedup_window: float,
+        dedup_size: int,
+    ):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self.dedup_size = dedup_size
+        # {(user_id, target_user_id): created_at}
+        self._pending: dict[tuple[str, str], datetime] = {}
+        # {(user_id, target_user_id): monotonic time of the last accepted event},
+        # oldest first
+        self._recent: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.accepted = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.rejected = 0
+
+    def record(self, user_id: str, target_user_ids: list[str]):
+        now = time.monotonic()
+        self._expire(now)
+        for target_user_id in target_user_ids:
+            key = (user_id, target_user_id)
+            seen_at = self._recent.get(key)
+            if seen_at is not None and now - seen_at < self.dedup_window:
+                self.deduplicated += 1
+                continue
+            if len(self._pending) >= self.max_size:
+                self.dropped += 1
+                continue
+
+            self._pending[key] = datetime.now(timezone.utc)
+            self._recent[key] = now
+            self._recent.move_to_end(key)
+            if len(self._recent) > self.dedup_size:
+                self._recent.popitem(last=False)
+            self.accepted += 1
+
+        if len(self._pending) >= self.flush_size:
+            self._wake.set()
+
+    def _expire(self, now: float):
+        while self._recent:
+            key, seen_at = next(iter(self._recent.items()))
+            if now - seen_at < self.dedup_window:
+                return
+            del self._recent[key]
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"View buffer stopped: {self.stats()}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        self._expire(time.monotonic())
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        try:
+            written = await asyncio.to_thread(self._write, batch)
+            self.flushed += written
+            self.rejected += len(batch) - written
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Failed to flush {len(batch)} view events: {e}")
+
+    @staticmethod
+    def _write(batch: dict[tuple[str, str], datetime]) -> int:
+        user_ids = {user_id for key in batch for user_id in key}
+        with db_conn() as db:
+            # Events for unknown or deleted users would fail the foreign
+            # key and take the whole batch down with them.
+            existing = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+            batch = {
+                key: created_at
+                for key, created_at in batch.items()
+                if key[0] in existing and key[1] in existing
+            }
+            if not batch:
+                return 0
+            db.execute(
+                insert(UserInteraction),
+                [
+                    {
+                        "user_id": user_id,
+                        "target_user_id": target_user_id,
+                        "action": InteractionActionEnum.view,
+                        "created_at": created_at,
+                    }
+                    for (user_id, target_user_id), created_at in batch.items()
+                ],
+            )
+        return len(batch)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "accepted": self.accepted,
+            "deduplicated": self.deduplicated,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+        }
+
+
+view_buffer = ViewBuffer(
+    max_size=settings.VIEW_BUFFER_SIZE,
+    flush_size=settings.VIEW_FLUSH_SIZE,
+    flush_interval=settings.VIEW_FLUSH_INTERVAL,
+    dedup_window=settings.VIEW_DEDUP_WINDOW,
+    dedup_size=settings.VIEW_DEDUP_SIZE,
+)
@@ -1,35 +1,446 @@
-from fastapi import WebSocket
+import asyncio
+import json
 import logging
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable
+
+from fastapi import WebSocket, status
+
+from .backplane import InProcessBackplane, create_backplane
+from .config import settings
+from .presence import Presence, presence
 
 logger = logging.getLogger(__name__)
 
+# Ключ маршрутизации событий присутствия в backplane.
+_PRESENCE = "presence"
+
+
+class Replay:
+    """
+    Догрузка пропущенных сообщений чата перед переходом к живой рассылке.
+
+    Пока история читается из БД, живые сообщения чата копятся в buffer.
+    После чтения буфер отправляется без сообщений, уже попавших в историю,
+    и подключение переходит к живой рассылке. Отправленные id ещё какое-то
+    время отсекают запоздавшие живые копии тех же сообщений.
+    """
 
-class ConnectionManager:
     def __init__(self):
-        # {chat_id: {user_id: WebSocket}}
-        self.active_connections: dict[str, dict[str, WebSocket]] = {}
+        self.buffer: list[tuple[str, str]] | None = []
+        self.sent: set[str] = set()
+        # monotonic time of the switch to live delivery
+        self.finished_at: float | None = None
+
+
+class ClientConnection:
+    """
+    Подключение клиента с собственной очередью исходящих сообщений.
+
+    Сообщения отправляет отдельная задача, поэтому медленный клиент
+    задерживает только свою очередь. Если очередь переполнена дольше
+    slow_consumer_timeout, клиент отключается.
+
+    chats - чаты, на которые подписано подключение, с их участниками.
+    legacy-подключения (/ws/chats/{chat_id}) подписаны на один чат
+    и получают сообщения в прежнем формате, без обёртки с type.
+    """
+
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        user_id: str,
+        websocket: WebSocket,
+        chats: dict[str, list[str]] | None = None,
+        legacy: bool = False,
+    ):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.chats: dict[str, list[str]] = dict(chats or {})
+        self.legacy = legacy
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=manager.queue_size)
+        # monotonic time of the first drop since the queue was last drained
+        self.overflow_since: float | None = None
+        # monotonic time of the last frame received from the client
+        self.last_received = time.monotonic()
+        # {chat_id: Replay}
+        self.replays: dict[str, Replay] = {}
+        self.task = asyncio.create_task(self._send_loop())
+
+    def touch(self):
+        self.last_received = time.monotonic()
+
+    def message_text(self, chat_id: str, message: dict) -> str:
+        if self.legacy:
+            return json.dumps(message)
+        return json.dumps({"type": "message", "chat_id": chat_id, "message": message})
+
+    def begin_replay(self, chat_id: str):
+        """Вызывается до подписки на чат, чтобы не потерять живые сообщения."""
+        self.replays[chat_id] = Replay()
+
+    async def replay(self, chat_id: str, message: dict) -> bool:
+        """
+        Ставит сообщение истории в очередь, дожидаясь места в ней.
+        Возвращает False, если клиент не разгребает очередь.
+        """
+        try:
+            await asyncio.wait_for(
+                self.queue.put(self.message_text(chat_id, message)),
+                timeout=self.manager.send_timeout,
+            )
+        except TimeoutError:
+            return False
+        self.replays[chat_id].sent.add(message["id"])
+        return True
+
+    def finish_replay(self, chat_id: str):
+        replay = self.replays[chat_id]
+        for message_id, text in replay.buffer:
+            if message_id not in replay.sent and not self.enqueue(text):
+                self.manager.dropped += 1
+        replay.buffer = None
+        replay.finished_at = time.monotonic()
+
+    def enqueue(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            now = time.monotonic()
+            if self.overflow_since is None:
+                self.overflow_since = now
+            elif now - self.overflow_since > self.manager.slow_consumer_timeout:
+                self.manager.evict(self, "send queue stayed full")
+            return False
+        return True
+
+    async def _send_loop(self):
+        while True:
+            message = await self.queue.get()
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(message),
+                    timeout=self.manager.send_timeout,
+                )
+            except TimeoutError:
+                self.manager.evict(self, "send timed out")
+                return
+            except Exception as e:
+                logger.error(f"Failed to send message to user {self.user_id}: {e}")
+                self.manager.evict(self, "send failed")
+                return
+
+            self.manager.record_send(time.monotonic() - started)
+            if self.queue.empty():
+                self.overflow_since = None
+
+
+class ConnectionManager:
+    """
+    Локальные WebSocket-подключения воркера, сгруппированные по пользователям.
+
+    broadcast публикует событие чата вместе со списком участников
+    в backplane, а deliver получает его оттуда и раскладывает по очередям
+    подключений этих участников, подписанных на чат. События чатов
+    с других воркеров передаются также обработчикам из add_listener,
+    а события вида {key: payload} - обработчику key из add_handler.
 
-    async def connect(self, chat_id: str, user_id: str, websocket: WebSocket):
+    Фоновый sweeper раз в ping_interval пингует подключения, отключает
+    молчавшие дольше idle_timeout и повторяет объявление присутствия
+    локальных пользователей.
+    """
+
+    def __init__(
+        self,
+        queue_size: int,
+        send_timeout: float,
+        slow_consumer_timeout: float,
+        ping_interval: float,
+        idle_timeout: float,
+        typing_interval: float,
+        presence: Presence,
+    ):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.slow_consumer_timeout = slow_consumer_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.typing_interval = typing_interval
+        self.presence = presence
+        self.worker_id = uuid.uuid4().hex
+        # {user_id: {ClientConnection}}
+        self.user_connections: dict[str, set[ClientConnection]] = {}
+        # {(user_id, chat_id): monotonic time of the last forwarded typing frame}
+        self._typing: dict[tuple[str, str], float] = {}
+        self._sweeper: asyncio.Task | None = None
+        # called with (chat_id, participants, frame) for other workers' events
+        self._listeners: list[Callable[[str, list[str], dict], None]] = []
+        # {routing key: handler of the event payload}
+        self._handlers: dict[str, Callable[[dict], None]] = {}
+
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.idle_evicted = 0
+        self.typing_coalesced = 0
+        self._send_latencies: deque[float] = deque(maxlen=1000)
+        self.backplane = InProcessBackplane(self.deliver)
+
+    def add_listener(self, listener: Callable[[str, list[str], dict], None]):
+        self._listeners.append(listener)
+
+    def add_handler(self, key: str, handler: Callable[[dict], None]):
+        self._handlers[key] = handler
+
+    async def start(self, backplane: str, dsn: str):
+        self.backplane = create_backplane(backplane, dsn, self.deliver)
+        await self.backplane.start()
+        self._sweeper = asyncio.create_task(self._run_sweeper())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        if self.user_connections:
+            await self._announce(
+                list(self.user_connections), time.time(), stopping=True
+            )
+        await self.backplane.stop()
+
+    async def connect(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        chats: dict[str, list[str]] | None = None,
+        legacy: bool = False,
+        replay: bool = False,
+    ) -> ClientConnection:
+        """replay=True начинает Replay для всех chats до регистрации."""
         await websocket.accept()
-        if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = {}
-        self.active_connections[chat_id][user_id] = websocket
-        logger.info(f"User {user_id} connected to chat {chat_id}.")
-
-    def disconnect(self, chat_id: str, user_id: str):
-        if chat_id in self.active_connections and user_id in self.active_connections[chat_id]:
-            del self.active_connections[chat_id][user_id]
-            if not self.active_connections[chat_id]:
-                del self.active_connections[chat_id]
-        logger.info(f"User {user_id} disconnected from chat {chat_id}.")
-
-    async def broadcast(self, chat_id: str, message: str):
-        if chat_id in self.active_connections:
-            for user_id, connection in self.active_connections[chat_id].items():
+        connection = ClientConnection(self, user_id, websocket, chats, legacy)
+        if replay:
+            for chat_id in connection.chats:
+                connection.begin_replay(chat_id)
+        connections = self.user_connections.setdefault(user_id, set())
+        connections.add(connection)
+        if len(connections) == 1:
+            await self._announce([user_id], time.time())
+        logger.info(f"User {user_id} connected.")
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        if self._remove(connection):
+            logger.info(f"User {connection.user_id} disconnected.")
+
+    def _remove(self, connection: ClientConnection) -> bool:
+        connections = self.user_connections.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return False
+        connections.discard(connection)
+        if not connections:
+            del self.user_connections[connection.user_id]
+            asyncio.create_task(self._announce([connection.user_id], time.time()))
+        if connection.task is not asyncio.current_task():
+            connection.task.cancel()
+        return True
+
+    def evict(
+        self,
+        connection: ClientConnection,
+        reason: str,
+        code: int = status.WS_1013_TRY_AGAIN_LATER,
+    ):
+        if not self._remove(connection):
+            return
+        self.evicted += 1
+        logger.warning(f"Evicted user {connection.user_id}: {reason}.")
+        asyncio.create_task(self._close(connection.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    async def broadcast(self, chat_id: str, participants: list[str], frame: dict):
+        """
+        Рассылает событие чата его участникам на всех воркерах. frame -
+        JSON-объект с полем type; для type="message" само сообщение лежит
+        в поле message.
+        """
+        await self.backplane.publish(
+            chat_id,
+            json.dumps(
+                {"worker": self.worker_id, "participants": participants, "frame": frame}
+            ),
+        )
+
+    async def typing(self, connection: ClientConnection, chat_id: str) -> bool:
+        """
+        Рассылает собеседникам, что пользователь печатает. Кадры чаще
+        typing_interval для одного пользователя и чата отбрасываются:
+        клиенты показывают индикатор ещё несколько секунд после кадра.
+        """
+        key = (connection.user_id, chat_id)
+        now = time.monotonic()
+        last = self._typing.get(key)
+        if last is not None and now - last < self.typing_interval:
+            self.typing_coalesced += 1
+            return False
+        self._typing[key] = now
+        await self.broadcast(
+            chat_id,
+            [u for u in connection.chats[chat_id] if u != connection.user_id],
+            {"type": "typing", "chat_id": chat_id, "user_id": connection.user_id},
+        )
+        return True
+
+    async def _announce(self, user_ids: list[str], at: float, stopping: bool = False):
+        """
+        Публикует, подключены ли пользователи к этому воркеру на момент at.
+        Состояние берётся на момент публикации, а устаревшие объявления
+        Presence отбрасывает по at.
+        """
+        online = [] if stopping else [u for u in user_ids if u in self.user_connections]
+        offline = [u for u in user_ids if u not in online]
+        event = {
+            "presence": {
+                "worker": self.worker_id,
+                "online": online,
+                "offline": offline,
+                "at": at,
+            }
+        }
+        try:
+            await self.backplane.publish(_PRESENCE, json.dumps(event))
+        except Exception as e:
+            logger.error(f"Failed to publish presence: {e}")
+
+    async def deliver(self, chat_id: str, event: str):
+        event = json.loads(event)
+        if "presence" in event:
+            update = event["presence"]
+            self.presence.apply(
+                update["worker"], update["online"], update["offline"], update["at"]
+            )
+            return
+        handler = self._handlers.get(chat_id)
+        if handler is not None and chat_id in event:
+            try:
+                handler(event[chat_id])
+            except Exception as e:
+                logger.error(f"Handler of {chat_id} events failed: {e}")
+            return
+
+        frame = event["frame"]
+        if event.get("worker") != self.worker_id:
+            for listener in self._listeners:
                 try:
-                    await connection.send_text(message)
+                    listener(chat_id, event["participants"], frame)
                 except Exception as e:
-                    logger.error(f"Failed to send message to user {user_id} in chat {chat_id}: {e}")
+                    logger.error(f"Chat event listener failed: {e}")
+
+        message = frame["message"] if frame.get("type") == "message" else None
+        text = json.dumps(frame)
+        legacy_text = json.dumps(message) if message is not None else text
+
+        for user_id in event["participants"]:
+            for connection in list(self.user_connections.get(user_id, ())):
+                if chat_id not in connection.chats:
+                    continue
+                connection_text = legacy_text if connection.legacy else text
+                replay = connection.replays.get(chat_id)
+                if replay is not None and message is not None:
+                    if message["id"] in replay.sent:
+                        continue
+                    if replay.buffer is not None:
+                        replay.buffer.append((message["id"], connection_text))
+                        continue
+                if not connection.enqueue(connection_text):
+                    self.dropped += 1
+
+    async def _run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"WebSocket sweep failed: {e}")
+
+    async def sweep(self):
+        now = time.monotonic()
+        ping = json.dumps({"type": "ping"})
+        for connections in list(self.user_connections.values()):
+            for connection in list(connections):
+                connection.replays = {
+                    chat_id: replay
+                    for chat_id, replay in connection.replays.items()
+                    if replay.finished_at is None
+                    or now - replay.finished_at < self.ping_interval
+                }
+                if now - connection.last_received > self.idle_timeout:
+                    self.idle_evicted += 1
+                    self.evict(connection, "idle", status.WS_1001_GOING_AWAY)
+                elif not connection.enqueue(ping):
+                    self.dropped += 1
+
+        self._typing = {
+            key: sent_at
+            for key, sent_at in self._typing.items()
+            if now - sent_at < self.typing_interval
+        }
+        self.presence.expire()
+        if self.user_connections:
+            await self._announce(list(self.user_connections), time.time())
+
+    def record_send(self, latency: float):
+        self.sent += 1
+        self._send_latencies.append(latency)
+
+    def stats(self) -> dict:
+        connections = [
+            connection
+            for user_connections in self.user_connections.values()
+            for connection in user_connections
+        ]
+        depths = [connection.queue.qsize() for connection in connections]
+        latencies = sorted(self._send_latencies)
+        return {
+            "users": len(self.user_connections),
+            "connections": len(connections),
+            "online_users": self.presence.online_count(),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "idle_evicted": self.idle_evicted,
+            "typing_coalesced": self.typing_coalesced,
+            "send_latency_p50_ms": (
+                round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None
+            ),
+            "send_latency_p99_ms": (
+                round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+                if latencies
+                else None
+            ),
+        }
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    send_timeout=settings.WS_SEND_TIMEOUT,
+    slow_consumer_timeout=settings.WS_SLOW_CONSUMER_TIMEOUT,
+    ping_interval=settings.WS_PING_INTERVAL,
+    idle_timeout=settings.WS_IDLE_TIMEOUT,
+    typing_interval=settings.WS_TYPING_INTERVAL,
+    presence=presence,
+)
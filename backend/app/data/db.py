@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
 
 from ..core.config import settings
@@ -26,6 +27,16 @@ class Base(DeclarativeBase):
     pass
 
 
+def dialect_insert(model):
+    """
+    INSERT текущего диалекта БД, поддерживающий on_conflict_do_nothing /
+    on_conflict_do_update (PostgreSQL и SQLite).
+    """
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 @contextmanager
 def db_conn():
     db = SessionLocal()
@@ -3,8 +3,12 @@ from .profile import Profile
 from .interest import Interest
 from .user_interest import UserInterest
 from .chat import Chat
-from .message import Message
+from .message import Message, MessageVersion
+from .chat_read import ChatRead
 from .user_interaction import UserInteraction
+from .user_recommendation import UserRecommendation
+from .recommendation_run import RecommendationRun
+from .match import Match
 
 __all__ = [
     "User",
@@ -13,5 +17,10 @@ __all__ = [
     "UserInterest",
     "Chat",
     "Message",
+    "MessageVersion",
+    "ChatRead",
     "UserInteraction",
+    "UserRecommendation",
+    "RecommendationRun",
+    "Match",
 ]
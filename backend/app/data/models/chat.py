@@ -4,10 +4,13 @@ from enum import Enum
 from sqlalchemy import (
     Column,
     String,
+    Text,
+    DateTime,
     Index,
     Enum as SQLEnum,
     CheckConstraint,
     ForeignKey,
+    func,
 )
 from sqlalchemy.orm import relationship
 from ..db import Base
@@ -33,9 +36,21 @@ class Chat(Base):
         default=ChatType.direct,
     )
 
+    # Последнее сообщение, копируется в create_message. Без внешнего ключа,
+    # чтобы не создавать цикл chats <-> messages.
+    last_message_id = Column(String(36))
+    last_message_text = Column(Text)
+    last_message_author_id = Column(String(36))
+    last_message_at = Column(DateTime(timezone=True))
+    last_activity_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
     __table_args__ = (
         Index("uq_chats_direct_pair", "direct_a", "direct_b", unique=True),
         Index("ix_chats_type", "type"),
+        Index("ix_chats_direct_a_activity", "direct_a", "last_activity_at"),
+        Index("ix_chats_direct_b_activity", "direct_b", "last_activity_at"),
         CheckConstraint("direct_a <> direct_b", name="chk_chat_not_self"),
     )
 
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
+from ..db import Base
+
+
+class ChatRead(Base):
+    """
+    Курсор прочтения: последнее сообщение чата, прочитанное участником.
+    """
+
+    __tablename__ = "chat_reads"
+
+    chat_id = Column(
+        String(36), ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = Column(
+        String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_read_message_id = Column(
+        String(36), ForeignKey("messages.id", ondelete="SET NULL")
+    )
+    last_read_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (Index("ix_chat_reads_user", "user_id"),)
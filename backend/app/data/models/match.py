@@ -0,0 +1,34 @@
+import uuid
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    ForeignKey,
+    Index,
+    CheckConstraint,
+    func,
+)
+from ..db import Base
+
+
+class Match(Base):
+    __tablename__ = "matches"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # user_a < user_b, как в Chat.direct_a / direct_b
+    user_a = Column(
+        String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    user_b = Column(
+        String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    chat_id = Column(String(36), ForeignKey("chats.id", ondelete="SET NULL"))
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        Index("uq_matches_pair", "user_a", "user_b", unique=True),
+        Index("ix_matches_user_b", "user_b"),
+        CheckConstraint("user_a <> user_b", name="chk_match_not_self"),
+    )
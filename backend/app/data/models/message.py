@@ -1,5 +1,16 @@
 import uuid
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+)
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -16,6 +27,18 @@ class Message(Base):
     )
     edited_at = Column(DateTime(timezone=True))
     deleted_at = Column(DateTime(timezone=True))
+    # Время последнего изменения (создание, правка, удаление).
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    # Транзакция последнего изменения (message_writer.allocate_versions),
+    # по ней chat_service.get_changes строит ленту синхронизации.
+    version = Column(BigInteger, nullable=False)
+    # Идентификатор, сгенерированный клиентом, для подтверждения и дедупликации.
+    client_id = Column(String(64))
 
     chat_id = Column(
         String(36), ForeignKey("chats.id", ondelete="CASCADE"), nullable=False
@@ -26,7 +49,66 @@ class Message(Base):
 
     __table_args__ = (
         Index("ix_messages_chat_created", "chat_id", "created_at"),
+        Index("ix_messages_chat_version", "chat_id", "version"),
         Index("ix_messages_author", "author_id"),
+        Index("uq_messages_author_client", "author_id", "client_id", unique=True),
     )
 
     chat = relationship("Chat", back_populates="messages")
+
+
+class MessageVersion(Base):
+    """
+    Счётчик версий сообщений в SQLite, единственная строка с id=1.
+
+    SQLite пишет по одной транзакции за раз, поэтому номера из счётчика
+    растут в порядке коммитов. В PostgreSQL версией служит id транзакции,
+    и счётчик не используется.
+    """
+
+    __tablename__ = "message_versions"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False)
+
+
+event.listen(
+    MessageVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO message_versions (id, value) VALUES (1, 0)"),
+)
+
+
+# Полнотекстовый поиск (chat_service.search_messages). Индекс обновляет сама
+# БД при вставке и правке сообщений, поэтому в модели его нет:
+# - PostgreSQL: генерируемый столбец search_vector с GIN-индексом
+#   (миграция d2a8f5c1e374);
+# - SQLite: таблица FTS5 с rowid сообщений, её поддерживают триггеры.
+SEARCH_CONFIG = "russian"
+
+for statement in (
+    f"ALTER TABLE messages ADD COLUMN search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', text)) STORED",
+    "CREATE INDEX ix_messages_search ON messages USING gin (search_vector) "
+    "WHERE deleted_at IS NULL",
+):
+    event.listen(
+        Message.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="postgresql"),
+    )
+
+for statement in (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(text)",
+    "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, text) VALUES (new.rowid, new.text); END",
+    "CREATE TRIGGER messages_fts_update AFTER UPDATE OF text ON messages BEGIN "
+    "UPDATE messages_fts SET text = new.text WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "DELETE FROM messages_fts WHERE rowid = old.rowid; END",
+):
+    event.listen(
+        Message.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
@@ -1,6 +1,6 @@
 from enum import Enum
 
-from sqlalchemy import ForeignKey, Column, Text, String, Index, Enum as SQLEnum
+from sqlalchemy import ForeignKey, Column, Text, String, DateTime, Index, Enum as SQLEnum, func
 from sqlalchemy.orm import relationship
 from ..db import Base
 
@@ -29,6 +29,12 @@ class Profile(Base):
         nullable=False,
         default=VisibilityEnum.all,
     )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
 
     __table_args__ = (
         Index("ix_profiles_city", "city"),
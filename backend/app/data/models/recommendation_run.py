@@ -0,0 +1,18 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer
+from ..db import Base
+
+
+class RecommendationRun(Base):
+    """
+    Завершённый запуск app.jobs.materialize_recommendations. started_at
+    последнего запуска - водяной знак: изменения после него попадут
+    в следующий инкрементальный расчёт.
+    """
+
+    __tablename__ = "recommendation_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=False)
+    full = Column(Boolean, nullable=False)
+    dirty_users = Column(Integer, nullable=False)
@@ -23,8 +23,12 @@ class User(Base):
     role = Column(
         SQLEnum(RoleEnum, name="role_enum"), nullable=False, default=RoleEnum.user
     )
+    interests_updated_at = Column(DateTime(timezone=True))
 
-    __table_args__ = (Index("ix_users_role", "role"),)
+    __table_args__ = (
+        Index("ix_users_role", "role"),
+        Index("ix_users_interests_updated", "interests_updated_at"),
+    )
 
     profile = relationship(
         "Profile", back_populates="user", uselist=False, cascade="all, delete-orphan"
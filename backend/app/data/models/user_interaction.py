@@ -1,6 +1,6 @@
 import uuid
 from enum import Enum
-from sqlalchemy import Column, String, DateTime, ForeignKey, Index, Enum as SQLEnum, func
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, Enum as SQLEnum, func, text
 from sqlalchemy.orm import relationship
 from ..db import Base
 
@@ -21,6 +21,17 @@ class UserInteraction(Base):
     __table_args__ = (
         Index("ix_interactions_user_target", "user_id", "target_user_id"),
         Index("ix_interactions_user_action", "user_id", "action"),
+        Index("ix_interactions_target_action", "target_user_id", "action"),
+        # view - это показы карточки, они повторяются
+        Index(
+            "uq_interactions_user_target_action",
+            "user_id",
+            "target_user_id",
+            "action",
+            unique=True,
+            postgresql_where=text("action <> 'view'"),
+            sqlite_where=text("action <> 'view'"),
+        ),
     )
 
     user = relationship("User", foreign_keys=[user_id], backref="actions_performed")
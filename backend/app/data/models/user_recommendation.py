@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
+from ..db import Base
+
+
+class UserRecommendation(Base):
+    __tablename__ = "user_recommendations"
+
+    user_id = Column(
+        String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    target_user_id = Column(
+        String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    compatibility = Column(Integer, nullable=False)
+    rank = Column(Integer, nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_user_recommendations_user_rank", "user_id", "rank"),
+        Index("ix_user_recommendations_target", "target_user_id"),
+        Index("ix_user_recommendations_computed", "computed_at"),
+    )
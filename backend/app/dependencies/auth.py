@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.data.db import get_db
-from app.data.models.user import User
+from app.data.models.user import RoleEnum, User
 from app.services import user_service
 
 bearer_scheme = HTTPBearer()
@@ -42,6 +42,14 @@ def get_current_user(
         )
 
 
+def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    if user.role != RoleEnum.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin role required"
+        )
+    return user
+
+
 async def get_current_user_from_websocket(
     token: str | None = Query(None), db: Session = Depends(get_db)
 ) -> User | None:
@@ -0,0 +1,54 @@
+"""
+Сборщик общей матрицы интересов для воркеров API.
+
+Запуск:
+    python -m app.jobs.build_interest_matrix --dir /var/lib/tinterest/matrix [--watch]
+
+В режиме --watch новое поколение собирается, как только меняется число
+пользователей, users.interests_updated_at или profile.updated_at.
+"""
+
+import argparse
+import logging
+import time
+
+from sqlalchemy import func
+
+from ..core.config import settings
+from ..core.interest_matrix import build_snapshot
+from ..core.logging_config import setup_logging
+from ..data.db import db_conn
+from ..data.models.profile import Profile
+from ..data.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def _state():
+    with db_conn() as db:
+        users = db.query(func.count(User.id), func.max(User.interests_updated_at)).one()
+        profiles = db.query(func.max(Profile.updated_at)).scalar()
+        return tuple(users), profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared interest matrix.")
+    parser.add_argument("--dir", default=settings.INTEREST_MATRIX_DIR, required=not settings.INTEREST_MATRIX_DIR)
+    parser.add_argument("--watch", action="store_true")
+    parser.add_argument("--interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    setup_logging()
+    state = _state()
+    build_snapshot(args.dir)
+
+    while args.watch:
+        time.sleep(args.interval)
+        current = _state()
+        if current != state:
+            state = current
+            build_snapshot(args.dir)
+
+
+if __name__ == "__main__":
+    main()
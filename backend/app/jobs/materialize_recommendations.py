@@ -0,0 +1,226 @@
+"""
+Фоновый расчёт матрицы совместимости пользователей.
+
+Для каждого пользователя считается топ-N соседей по той же формуле Жаккара,
+что и в recommendation_service, и записывается в user_recommendations.
+Расчёт распараллелен по процессам, пользователи делятся на шарды
+по диапазонам id. Запуск записывается в recommendation_runs только после
+записи всех шардов, поэтому после сбоя следующий запуск пересчитывает
+те же изменения заново. Списки общие для всех, поэтому пользователи
+с visibility=matched и none в них не попадают.
+
+Запуск:
+    python -m app.jobs.materialize_recommendations [--workers 4] [--top-n 50] [--full]
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert
+
+from ..core.compatibility import jaccard_percent
+from ..core.interest_index import InterestIndex
+from ..core.logging_config import setup_logging
+from ..data.db import db_conn
+from ..data.models.profile import Profile, VisibilityEnum
+from ..data.models.recommendation_run import RecommendationRun
+from ..data.models.user import User
+from ..data.models.user_recommendation import UserRecommendation
+
+logger = logging.getLogger(__name__)
+
+_worker_index: InterestIndex | None = None
+
+
+def _init_worker(
+    user_ids: list[str], masks: list[int], visibility: list[VisibilityEnum]
+):
+    global _worker_index
+    _worker_index = InterestIndex.from_snapshot(user_ids, masks, visibility)
+
+
+def _compute_shard(
+    shard_no: int, owner_ids: list[str], top_n: int
+) -> tuple[int, list[tuple[str, list[tuple[int, str]]]], float]:
+    started = time.perf_counter()
+    results = []
+    for owner_id in owner_ids:
+        scored = _worker_index.score(owner_id)
+        top = heapq.nsmallest(top_n, scored, key=lambda s: (-s[0], s[1]))
+        results.append((owner_id, top))
+    return shard_no, results, time.perf_counter() - started
+
+
+def _find_dirty_users(
+    user_ids: list[str], masks: list[int], top_n: int, full: bool
+) -> list[str]:
+    """
+    Пользователи, чьи списки нужно пересчитать: сменившие интересы или профиль
+    с начала последнего завершённого запуска, те, у кого они уже есть в списке, и те, в чей топ они
+    теперь попадают.
+    """
+    with db_conn() as db:
+        last_run = db.query(func.max(RecommendationRun.started_at)).scalar()
+        if full or last_run is None:
+            return list(user_ids)
+
+        changed = {
+            row.id
+            for row in db.query(User.id).filter(User.interests_updated_at > last_run)
+        }
+        changed.update(
+            row.user_id
+            for row in db.query(Profile.user_id).filter(Profile.updated_at > last_run)
+        )
+        if not changed:
+            return []
+
+        dirty = set(changed)
+        dirty.update(
+            row.user_id
+            for row in db.query(UserRecommendation.user_id)
+            .filter(UserRecommendation.target_user_id.in_(changed))
+            .distinct()
+        )
+        # {owner_id: (rows, lowest compatibility)}
+        stored = {
+            row.user_id: (row.rows, row.lowest)
+            for row in db.query(
+                UserRecommendation.user_id,
+                func.count().label("rows"),
+                func.min(UserRecommendation.compatibility).label("lowest"),
+            ).group_by(UserRecommendation.user_id)
+        }
+
+    rows = {user_id: row for row, user_id in enumerate(user_ids)}
+    changed_masks = [masks[rows[user_id]] for user_id in changed if user_id in rows]
+    for owner_id, owner_mask in zip(user_ids, masks):
+        if owner_id in dirty or not owner_mask:
+            continue
+        count, lowest = stored.get(owner_id, (0, 0))
+        for mask in changed_masks:
+            compatibility = jaccard_percent(
+                (owner_mask & mask).bit_count(), (owner_mask | mask).bit_count()
+            )
+            if compatibility > 0 and (count < top_n or compatibility >= lowest):
+                dirty.add(owner_id)
+                break
+
+    return sorted(dirty)
+
+
+def _write_shard(
+    results: list[tuple[str, list[tuple[int, str]]]], computed_at: datetime
+) -> int:
+    rows = [
+        {
+            "user_id": owner_id,
+            "target_user_id": target_id,
+            "compatibility": compatibility,
+            "rank": rank,
+            "computed_at": computed_at,
+        }
+        for owner_id, top in results
+        for rank, (compatibility, target_id) in enumerate(top)
+    ]
+    with db_conn() as db:
+        db.query(UserRecommendation).filter(
+            UserRecommendation.user_id.in_([owner_id for owner_id, _ in results])
+        ).delete(synchronize_session=False)
+        if rows:
+            db.execute(insert(UserRecommendation), rows)
+    return len(rows)
+
+
+def _record_run(started_at: datetime, full: bool, dirty_users: int):
+    with db_conn() as db:
+        db.add(
+            RecommendationRun(
+                started_at=started_at,
+                finished_at=datetime.now(timezone.utc),
+                full=full,
+                dirty_users=dirty_users,
+            )
+        )
+
+
+def run(workers: int, top_n: int, full: bool = False) -> dict:
+    computed_at = datetime.now(timezone.utc)
+    user_ids, masks, visibility = InterestIndex().snapshot()
+
+    dirty = _find_dirty_users(user_ids, masks, top_n, full)
+    report = {
+        "computed_at": computed_at.isoformat(),
+        "users": len(user_ids),
+        "dirty_users": len(dirty),
+        "shards": [],
+    }
+    if not dirty:
+        logger.info("Recommendations are up to date, nothing to materialize.")
+        _record_run(computed_at, full, 0)
+        return report
+
+    shard_size = -(-len(dirty) // workers)
+    shards = [dirty[i : i + shard_size] for i in range(0, len(dirty), shard_size)]
+
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        initializer=_init_worker,
+        initargs=(user_ids, masks, visibility),
+    ) as pool:
+        futures = [
+            pool.submit(_compute_shard, shard_no, owner_ids, top_n)
+            for shard_no, owner_ids in enumerate(shards)
+        ]
+        for future in as_completed(futures):
+            shard_no, results, compute_seconds = future.result()
+
+            write_started = time.perf_counter()
+            rows_written = _write_shard(results, computed_at)
+            write_seconds = time.perf_counter() - write_started
+
+            shard = shards[shard_no]
+            report["shards"].append(
+                {
+                    "shard": shard_no,
+                    "first_user_id": shard[0],
+                    "last_user_id": shard[-1],
+                    "users": len(shard),
+                    "rows": rows_written,
+                    "compute_seconds": round(compute_seconds, 3),
+                    "write_seconds": round(write_seconds, 3),
+                }
+            )
+            logger.info(
+                f"Shard {shard_no}: {len(shard)} users, {rows_written} rows, "
+                f"compute {compute_seconds:.3f}s, write {write_seconds:.3f}s."
+            )
+
+    # A failed shard raises above and leaves the watermark where it was.
+    _record_run(computed_at, full, len(dirty))
+    report["shards"].sort(key=lambda s: s["shard"])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize user recommendations.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument(
+        "--full", action="store_true", help="Recompute all users, not only changed."
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    report = run(workers=args.workers, top_n=args.top_n, full=args.full)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import datetime
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -7,6 +9,11 @@ class MessageBase(BaseModel):
 
 
 class MessageCreate(MessageBase):
+    # Повторная отправка с тем же client_id не создаёт второе сообщение.
+    client_id: str | None = Field(None, min_length=1, max_length=64)
+
+
+class MessageUpdate(MessageBase):
     pass
 
 
@@ -14,16 +21,51 @@ class MessageResponse(MessageBase):
     id: str
     created_at: datetime.datetime
     author_id: str
+    client_id: str | None = None
+    edited_at: datetime.datetime | None = None
 
     class Config:
         from_attributes = True
 
 
+class MessageSearchResult(MessageResponse):
+    """Сообщение, найденное полнотекстовым поиском."""
+
+    chat_id: str
+
+
+class MessageChange(BaseModel):
+    """Новое, изменённое или удалённое сообщение в ленте синхронизации."""
+
+    id: str
+    chat_id: str
+    author_id: str
+    # У удалённых сообщений текст не отдаётся.
+    text: str | None
+    client_id: str | None = None
+    created_at: datetime.datetime
+    edited_at: datetime.datetime | None
+    deleted_at: datetime.datetime | None
+    updated_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SyncResponse(BaseModel):
+    changes: list[MessageChange]
+    # Курсор для следующего запроса; has_more - есть ли изменения за ним.
+    cursor: str
+    has_more: bool
+
+
 class ChatParticipant(BaseModel):
     id: str
     first_name: str | None
     last_name: str | None
     avatar_url: str | None
+    online: bool = False
+    last_seen_at: datetime.datetime | None = None
 
     class Config:
         from_attributes = True
@@ -33,6 +75,20 @@ class ChatListItem(BaseModel):
     id: str
     participant: ChatParticipant
     last_message: MessageResponse | None
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
+
+
+class MarkReadRequest(BaseModel):
+    # По умолчанию - последнее сообщение чата.
+    message_id: str | None = None
+
+
+class ReadReceipt(BaseModel):
+    type: Literal["read"] = "read"
+    chat_id: str
+    user_id: str
+    message_id: str | None
+    read_at: datetime.datetime
@@ -0,0 +1,15 @@
+import datetime
+from pydantic import BaseModel
+from .user_schemas import UserResponse
+
+
+class LikeResponse(BaseModel):
+    matched: bool
+    chat_id: str | None = None
+
+
+class MatchResponse(BaseModel):
+    id: str
+    user: UserResponse
+    chat_id: str | None
+    created_at: datetime.datetime
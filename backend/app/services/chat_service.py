@@ -1,47 +1,124 @@
+import re
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import joinedload
-from sqlalchemy import or_
+from sqlalchemy import (
+    and_,
+    column,
+    func,
+    literal_column,
+    or_,
+    select,
+    table,
+    tuple_,
+)
+from ..core.cursors import encode_cursor, decode_cursor
+from ..core.message_writer import (
+    Snapshot,
+    allocate_versions,
+    message_writer,
+    version_snapshot,
+    write_messages,
+)
+from ..core.unread_counters import unread_counters
 from ..core.websockets import manager
-from ..data.db import db_conn
+from ..data.db import db_conn, dialect_insert
 from ..data.models.user import User
 from ..data.models.chat import Chat, ChatType
-from ..data.models.message import Message
-from ..schemas.chat_schemas import MessageCreate, MessageResponse
+from ..data.models.chat_read import ChatRead
+from ..data.models.message import SEARCH_CONFIG, Message
+from ..schemas.chat_schemas import (
+    MessageCreate,
+    MessageResponse,
+    MessageUpdate,
+    ReadReceipt,
+)
 
 
-def get_user_chats(user_id: str):
-    with db_conn() as db:
-        chats = (
-            db.query(Chat)
-            .filter(or_(Chat.direct_a == user_id, Chat.direct_b == user_id))
-            .options(
-                joinedload(Chat.messages),
-                joinedload(Chat.direct_a_user).joinedload(User.profile),
-                joinedload(Chat.direct_b_user).joinedload(User.profile),
-            )
-            .all()
+def get_user_chats(
+    user_id: str, limit: int | None = None, cursor: str | None = None
+) -> tuple[list[Chat], str | None]:
+    """
+    Чаты пользователя по убыванию last_activity_at и курсор следующей
+    страницы. Последнее сообщение берётся из полей Chat.last_message_*,
+    сами сообщения не загружаются. Без limit возвращаются все чаты.
+    """
+    query = (
+        select(Chat)
+        .where(or_(Chat.direct_a == user_id, Chat.direct_b == user_id))
+        .options(
+            joinedload(Chat.direct_a_user).joinedload(User.profile),
+            joinedload(Chat.direct_b_user).joinedload(User.profile),
+        )
+        .order_by(Chat.last_activity_at.desc(), Chat.id.desc())
+    )
+    if cursor is not None:
+        (anchor_id,) = decode_cursor(cursor, 1)
+        if not isinstance(anchor_id, str):
+            raise ValueError("Invalid cursor")
+        anchor = (
+            select(Chat.last_activity_at).where(Chat.id == anchor_id).scalar_subquery()
         )
-        return chats
+        query = query.where(
+            Chat.last_activity_at <= anchor,
+            or_(Chat.last_activity_at < anchor, Chat.id < anchor_id),
+        )
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    with db_conn() as db:
+        chats = db.scalars(query).all()
+
+    next_cursor = None
+    if limit is not None and len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1].id)
+    return chats, next_cursor
 
 
 def get_or_create_direct_chat(user_a_id: str, user_b_id: str) -> Chat:
+    """
+    Возвращает личный чат пары пользователей, создавая его при первом
+    обращении, вместе с участниками и их профилями. Чат создаётся
+    INSERT ... ON CONFLICT DO NOTHING по uq_chats_direct_pair, поэтому
+    одновременные вызовы для одной пары не падают на уникальном индексе.
+    """
     if user_a_id == user_b_id:
         raise ValueError("Cannot create a direct chat with oneself.")
 
+    u1, u2 = sorted([user_a_id, user_b_id])
     with db_conn() as db:
-        u1, u2 = sorted([user_a_id, user_b_id])
-
-        chat = (
-            db.query(Chat)
-            .filter(Chat.direct_a == u1, Chat.direct_b == u2)
-            .first()
+        db.execute(
+            dialect_insert(Chat)
+            .values(
+                id=str(uuid.uuid4()), direct_a=u1, direct_b=u2, type=ChatType.direct
+            )
+            .on_conflict_do_nothing(index_elements=["direct_a", "direct_b"])
         )
+        return db.scalars(
+            select(Chat)
+            .where(Chat.direct_a == u1, Chat.direct_b == u2)
+            .options(
+                joinedload(Chat.direct_a_user).joinedload(User.profile),
+                joinedload(Chat.direct_b_user).joinedload(User.profile),
+            )
+        ).one()
 
-        if not chat:
-            chat = Chat(direct_a=u1, direct_b=u2, type=ChatType.direct)
-            db.add(chat)
-            db.commit()
-            db.refresh(chat)
-        return chat
+
+def get_member_chats(user_id: str, chat_ids: list[str]) -> dict[str, list[str]]:
+    """
+    Возвращает те из chat_ids, участником которых является пользователь,
+    вместе с участниками: {chat_id: [user_id]}.
+    """
+    with db_conn() as db:
+        rows = db.execute(
+            select(Chat.id, Chat.direct_a, Chat.direct_b).where(
+                Chat.id.in_(chat_ids),
+                or_(Chat.direct_a == user_id, Chat.direct_b == user_id),
+            )
+        )
+        return {chat_id: [direct_a, direct_b] for chat_id, direct_a, direct_b in rows}
 
 
 def get_chat_by_id(chat_id: str) -> Chat | None:
@@ -49,28 +126,471 @@ def get_chat_by_id(chat_id: str) -> Chat | None:
         return db.get(Chat, chat_id)
 
 
-def get_chat_messages(chat_id: str) -> list[Message]:
+def get_chat_message(chat_id: str, message_id: str) -> Message | None:
     with db_conn() as db:
         return (
             db.query(Message)
-            .filter(Message.chat_id == chat_id)
-            .order_by(Message.created_at.asc())
-            .all()
+            .filter(Message.id == message_id, Message.chat_id == chat_id)
+            .first()
+        )
+
+
+def _decode_message_cursor(cursor: str) -> str:
+    (message_id,) = decode_cursor(cursor, 1)
+    if not isinstance(message_id, str):
+        raise ValueError("Invalid cursor")
+    return message_id
+
+
+def get_chat_messages(
+    chat_id: str,
+    limit: int = 50,
+    before: str | None = None,
+    after: str | None = None,
+) -> tuple[list[Message], str | None]:
+    """
+    Страница истории чата по возрастанию (created_at, id) и курсор следующей.
+    Удалённые сообщения не возвращаются.
+
+    Без курсоров возвращаются последние limit сообщений, с before - более
+    старые, с after - более новые. Следующий курсор указывает в ту же
+    сторону. Позиция курсора берётся из самого сообщения в БД, поэтому
+    страницы читаются диапазоном по ix_messages_chat_created, без OFFSET.
+    """
+    if before is not None and after is not None:
+        raise ValueError("Only one of before/after is allowed")
+    cursor = before or after
+    older = after is None
+
+    query = (
+        select(Message)
+        .where(Message.chat_id == chat_id, Message.deleted_at.is_(None))
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        anchor_id = _decode_message_cursor(cursor)
+        anchor = (
+            select(Message.created_at)
+            .where(Message.id == anchor_id, Message.chat_id == chat_id)
+            .scalar_subquery()
         )
+        if older:
+            query = query.where(
+                Message.created_at <= anchor,
+                or_(Message.created_at < anchor, Message.id < anchor_id),
+            )
+        else:
+            query = query.where(
+                Message.created_at >= anchor,
+                or_(Message.created_at > anchor, Message.id > anchor_id),
+            )
+
+    if older:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+
+    with db_conn() as db:
+        messages = db.scalars(query).all()
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].id)
+    if older:
+        messages.reverse()
+    return messages, next_cursor
 
 
 async def create_message(
     chat_id: str, author_id: str, msg_data: MessageCreate
 ) -> Message:
-    with db_conn() as db:
-        new_message = Message(
-            chat_id=chat_id, author_id=author_id, text=msg_data.text
+    """
+    Сохраняет сообщение и рассылает его участникам чата. Если у автора уже
+    есть сообщение с тем же client_id, возвращает его без повторной рассылки.
+    Бросает ValueError, если этот client_id использован в другом чате.
+
+    При включённом CHAT_GROUP_COMMIT сообщение пишется общей пачкой
+    через message_writer.
+    """
+    if message_writer.enabled:
+        new_message, participants, created = await message_writer.submit(
+            chat_id, author_id, msg_data
+        )
+    else:
+        [result] = await run_in_threadpool(
+            write_messages, [(chat_id, author_id, msg_data)]
         )
-        db.add(new_message)
-        db.commit()
-        db.refresh(new_message)
+        if isinstance(result, ValueError):
+            raise result
+        new_message, participants, created = result
+    if not created:
+        return new_message
+
+    direct_a, direct_b = participants
+    recipient_id = direct_b if direct_a == author_id else direct_a
+    unread_counters.increment(chat_id, recipient_id)
 
     message_schema = MessageResponse.model_validate(new_message)
-    await manager.broadcast(chat_id, message_schema.model_dump_json())
+    await manager.broadcast(
+        chat_id,
+        participants,
+        {
+            "type": "message",
+            "chat_id": chat_id,
+            "message": message_schema.model_dump(mode="json"),
+        },
+    )
 
     return new_message
+
+
+def _message_of_author(db, chat_id: str, message_id: str, author_id: str):
+    return (
+        db.query(Message)
+        .filter(
+            Message.id == message_id,
+            Message.chat_id == chat_id,
+            Message.author_id == author_id,
+            Message.deleted_at.is_(None),
+        )
+        .first()
+    )
+
+
+def _edit(chat_id: str, message_id: str, author_id: str, text: str):
+    with db_conn() as db:
+        [version] = allocate_versions(db)
+        message = _message_of_author(db, chat_id, message_id, author_id)
+        if message is None:
+            return None
+        message.text = text
+        message.edited_at = func.now()
+        message.version = version
+        db.flush()
+        db.refresh(message)
+
+        chat = db.get(Chat, chat_id)
+        if chat.last_message_id == message.id:
+            chat.last_message_text = message.text
+        return message, [chat.direct_a, chat.direct_b]
+
+
+async def edit_message(
+    chat_id: str, message_id: str, author_id: str, msg_data: MessageUpdate
+) -> Message | None:
+    """
+    Меняет текст сообщения автора и рассылает участникам событие
+    message_edited. Возвращает None, если сообщения нет, оно удалено
+    или принадлежит другому автору.
+    """
+    edited = await run_in_threadpool(
+        _edit, chat_id, message_id, author_id, msg_data.text
+    )
+    if edited is None:
+        return None
+    message, participants = edited
+
+    await manager.broadcast(
+        chat_id,
+        participants,
+        {
+            "type": "message_edited",
+            "chat_id": chat_id,
+            "message": MessageResponse.model_validate(message).model_dump(mode="json"),
+        },
+    )
+    return message
+
+
+def _delete(chat_id: str, message_id: str, author_id: str):
+    with db_conn() as db:
+        [version] = allocate_versions(db)
+        message = _message_of_author(db, chat_id, message_id, author_id)
+        if message is None:
+            return None
+        message.deleted_at = func.now()
+        message.version = version
+        db.flush()
+
+        chat = db.get(Chat, chat_id)
+        if chat.last_message_id == message.id:
+            previous = (
+                db.query(Message)
+                .filter(Message.chat_id == chat_id, Message.deleted_at.is_(None))
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .first()
+            )
+            chat.last_message_id = previous.id if previous else None
+            chat.last_message_text = previous.text if previous else None
+            chat.last_message_author_id = previous.author_id if previous else None
+            chat.last_message_at = previous.created_at if previous else None
+        return [chat.direct_a, chat.direct_b]
+
+
+async def delete_message(chat_id: str, message_id: str, author_id: str) -> bool:
+    """
+    Помечает сообщение автора удалённым и рассылает участникам событие
+    message_deleted. Если это было последнее сообщение чата, последним
+    становится предыдущее неудалённое. Возвращает False, если удалять нечего.
+    """
+    participants = await run_in_threadpool(_delete, chat_id, message_id, author_id)
+    if participants is None:
+        return False
+
+    # Удалённое сообщение могло быть непрочитанным.
+    for user_id in participants:
+        if user_id != author_id:
+            unread_counters.invalidate(user_id)
+    await manager.broadcast(
+        chat_id,
+        participants,
+        {"type": "message_deleted", "chat_id": chat_id, "message_id": message_id},
+    )
+    return True
+
+
+def _is_version(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_snapshot(value) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and _is_version(value[0])
+        and isinstance(value[1], list)
+        and all(_is_version(v) for v in value[1])
+    )
+
+
+def _decode_sync_cursor(cursor: str) -> tuple[Snapshot, Snapshot | None, list | None]:
+    """
+    Курсор ленты: [снимок, null, null] после полного обхода или
+    [снимок, снимок обхода, [version, id] последнего изменения] между страницами.
+    """
+    base, upto, after = decode_cursor(cursor, 3)
+    if not _is_snapshot(base):
+        raise ValueError("Invalid cursor")
+    if upto is None and after is None:
+        return tuple(base), None, None
+    if not (
+        _is_snapshot(upto)
+        and isinstance(after, list)
+        and len(after) == 2
+        and _is_version(after[0])
+        and isinstance(after[1], str)
+    ):
+        raise ValueError("Invalid cursor")
+    return tuple(base), tuple(upto), after
+
+
+def get_changes(
+    user_id: str, since: str | None = None, limit: int = 200
+) -> tuple[list[Message], str, bool]:
+    """
+    Новые, изменённые и удалённые сообщения во всех чатах пользователя,
+    закоммиченные после курсора since (без него - с начала).
+
+    Курсор хранит снимок транзакций (version_snapshot) предыдущего запроса.
+    Изменение попадает в ответ, если транзакция из Message.version не видна
+    в нём, но видна в текущем снимке. Транзакция, незавершённая в момент
+    снимка, остаётся в его списке xip и будет выдана после коммита, поэтому
+    изменения не теряются, а писатели не ждут друг друга. Для каждого чата
+    читается диапазон ix_messages_chat_version.
+
+    Возвращает изменения по возрастанию (version, id), курсор для
+    следующего запроса и признак того, что за ним есть ещё изменения.
+    Страницы одного обхода читаются по снимку первой страницы.
+    """
+    base, upto, after = (0, []), None, None
+    if since is not None:
+        base, upto, after = _decode_sync_cursor(since)
+    base_xmax, base_xip = base
+
+    chat_ids = select(Chat.id).where(
+        or_(Chat.direct_a == user_id, Chat.direct_b == user_id)
+    )
+    with db_conn() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        if upto is None:
+            upto = version_snapshot(db)
+        upto_xmax, upto_xip = upto
+
+        query = (
+            select(Message)
+            .where(
+                Message.chat_id.in_(chat_ids),
+                Message.version >= min([base_xmax, *base_xip]),
+                or_(Message.version >= base_xmax, Message.version.in_(base_xip)),
+                Message.version < upto_xmax,
+                Message.version.not_in(upto_xip),
+            )
+            .order_by(Message.version, Message.id)
+            .limit(limit + 1)
+        )
+        if after is not None:
+            query = query.where(tuple_(Message.version, Message.id) > tuple(after))
+        changes = db.scalars(query).all()
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        last = changes[-1]
+        cursor = encode_cursor(base, upto, [last.version, last.id])
+    else:
+        cursor = encode_cursor(upto, None, None)
+    return changes, cursor, has_more
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, str]:
+    rank, message_id = decode_cursor(cursor, 2)
+    if not isinstance(rank, (int, float)) or not isinstance(message_id, str):
+        raise ValueError("Invalid cursor")
+    return rank, message_id
+
+
+def _search_terms(db, q: str):
+    """
+    Условие совпадения и релевантность для запроса q в диалекте сессии.
+    В PostgreSQL - search_vector и websearch_to_tsquery, в SQLite - FTS5
+    (слова запроса берутся в кавычки, чтобы не разбирать синтаксис MATCH).
+    Возвращает None, если в запросе нет слов.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+
+    if db.get_bind().dialect.name == "postgresql":
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        vector = literal_column("messages.search_vector")
+        return None, vector.op("@@")(query), func.ts_rank(vector, query)
+
+    fts = table("messages_fts", column("rowid"))
+    match = literal_column("messages_fts").op("MATCH")(
+        " ".join(f'"{word}"' for word in words)
+    )
+    # bm25 меньше у более релевантных строк.
+    rank = -func.bm25(literal_column("messages_fts"))
+    return (fts, fts.c.rowid == literal_column("messages.rowid")), match, rank
+
+
+def search_messages(
+    user_id: str,
+    q: str,
+    limit: int = 20,
+    cursor: str | None = None,
+    chat_id: str | None = None,
+) -> tuple[list[Message], str | None]:
+    """
+    Полнотекстовый поиск по сообщениям в чатах пользователя (или в одном
+    чате chat_id) по убыванию релевантности, при равной - по id. Удалённые
+    сообщения не ищутся. Возвращает страницу и курсор следующей; курсор
+    хранит релевантность и id последнего сообщения.
+    """
+    chat_ids = select(Chat.id).where(
+        or_(Chat.direct_a == user_id, Chat.direct_b == user_id)
+    )
+    if chat_id is not None:
+        chat_ids = chat_ids.where(Chat.id == chat_id)
+    anchor = _decode_search_cursor(cursor) if cursor is not None else None
+
+    with db_conn() as db:
+        terms = _search_terms(db, q)
+        if terms is None:
+            return [], None
+        join, match, rank = terms
+
+        ranked = select(Message.id.label("id"), rank.label("rank"))
+        if join is not None:
+            ranked = ranked.join_from(Message, *join)
+        ranked = ranked.where(
+            match, Message.chat_id.in_(chat_ids), Message.deleted_at.is_(None)
+        ).subquery()
+
+        query = (
+            select(Message, ranked.c.rank)
+            .join(ranked, ranked.c.id == Message.id)
+            .order_by(ranked.c.rank.desc(), Message.id)
+            .limit(limit + 1)
+        )
+        if anchor is not None:
+            anchor_rank, anchor_id = anchor
+            query = query.where(
+                or_(
+                    ranked.c.rank < anchor_rank,
+                    and_(ranked.c.rank == anchor_rank, Message.id > anchor_id),
+                )
+            )
+        rows = db.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(float(rows[-1].rank), rows[-1].Message.id)
+    return [row.Message for row in rows], next_cursor
+
+
+async def mark_read(
+    chat_id: str, user_id: str, message_id: str | None = None
+) -> ReadReceipt | None:
+    """
+    Сдвигает курсор прочтения пользователя до message_id (по умолчанию до
+    последнего сообщения чата) и рассылает участникам уведомление о прочтении.
+    Курсор не сдвигается назад. Возвращает None, если в чате нет сообщений.
+    Бросает ValueError, если сообщения нет в этом чате.
+    """
+    with db_conn() as db:
+        chat = db.get(Chat, chat_id)
+        participants = [chat.direct_a, chat.direct_b]
+        target_id = message_id or chat.last_message_id
+        if target_id is None:
+            return None
+
+        target = (
+            db.query(Message)
+            .filter(Message.id == target_id, Message.chat_id == chat_id)
+            .first()
+        )
+        if target is None:
+            raise ValueError("Message not found in chat.")
+
+        current = db.get(ChatRead, (chat_id, user_id))
+        current_message = (
+            db.get(Message, current.last_read_message_id)
+            if current is not None and current.last_read_message_id
+            else None
+        )
+        if current_message is not None and (
+            current_message.created_at,
+            current_message.id,
+        ) >= (target.created_at, target.id):
+            return ReadReceipt(
+                chat_id=chat_id,
+                user_id=user_id,
+                message_id=current_message.id,
+                read_at=current.last_read_at,
+            )
+
+        values = {"last_read_message_id": target.id, "last_read_at": target.created_at}
+        db.execute(
+            dialect_insert(ChatRead)
+            .values(chat_id=chat_id, user_id=user_id, **values)
+            .on_conflict_do_update(index_elements=["chat_id", "user_id"], set_=values)
+        )
+        is_latest = target.id == chat.last_message_id
+
+    if is_latest:
+        unread_counters.reset(chat_id, user_id)
+    else:
+        unread_counters.invalidate(user_id)
+
+    receipt = ReadReceipt(
+        chat_id=chat_id,
+        user_id=user_id,
+        message_id=target.id,
+        read_at=target.created_at,
+    )
+    await manager.broadcast(chat_id, participants, receipt.model_dump(mode="json"))
+    return receipt
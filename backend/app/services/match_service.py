@@ -0,0 +1,118 @@
+from sqlalchemy import or_, exists
+from sqlalchemy.orm import joinedload
+
+from ..core import recommendation_events
+from ..data.db import db_conn, dialect_insert
+from ..data.models.match import Match
+from ..data.models.user import User
+from ..data.models.user_interaction import UserInteraction, InteractionActionEnum
+from . import chat_service
+
+
+def like_user(user_id: str, target_user_id: str) -> Match | None:
+    """
+    Ставит лайк и, если он взаимный, создаёт мэтч и открывает чат.
+
+    Встречный лайк проверяется после коммита своего, поэтому при
+    одновременных лайках хотя бы одна из сторон его увидит.
+    """
+    if user_id == target_user_id:
+        raise ValueError("Cannot like oneself.")
+
+    with db_conn() as db:
+        db.execute(
+            dialect_insert(UserInteraction)
+            .values(
+                user_id=user_id,
+                target_user_id=target_user_id,
+                action=InteractionActionEnum.like,
+            )
+            .on_conflict_do_nothing()
+        )
+
+    with db_conn() as db:
+        is_mutual = db.query(
+            exists().where(
+                UserInteraction.user_id == target_user_id,
+                UserInteraction.target_user_id == user_id,
+                UserInteraction.action == InteractionActionEnum.like,
+            )
+        ).scalar()
+        if not is_mutual:
+            return None
+
+        user_a, user_b = sorted([user_id, target_user_id])
+        db.execute(
+            dialect_insert(Match)
+            .values(user_a=user_a, user_b=user_b)
+            .on_conflict_do_nothing()
+        )
+        db.flush()
+        match = (
+            db.query(Match).filter(Match.user_a == user_a, Match.user_b == user_b).one()
+        )
+
+    recommendation_events.emit(
+        {"kind": "match", "user_id": user_a, "partner_id": user_b}
+    )
+
+    if match.chat_id is None:
+        chat = chat_service.get_or_create_direct_chat(
+            user_a_id=user_a, user_b_id=user_b
+        )
+        with db_conn() as db:
+            db.query(Match).filter(Match.id == match.id).update(
+                {Match.chat_id: chat.id}, synchronize_session=False
+            )
+        match.chat_id = chat.id
+
+    return match
+
+
+def get_matches(user_id: str) -> list[tuple[Match, User]]:
+    with db_conn() as db:
+        matches = (
+            db.query(Match)
+            .filter(or_(Match.user_a == user_id, Match.user_b == user_id))
+            .order_by(Match.created_at.desc())
+            .all()
+        )
+        partner_ids = [m.user_b if m.user_a == user_id else m.user_a for m in matches]
+        partners = {
+            user.id: user
+            for user in db.query(User)
+            .options(joinedload(User.profile), joinedload(User.interests))
+            .filter(User.id.in_(partner_ids))
+        }
+        return [
+            (match, partners[partner_id])
+            for match, partner_id in zip(matches, partner_ids)
+            if partner_id in partners
+        ]
+
+
+def get_likes_received(user_id: str) -> list[User]:
+    """
+    Пользователи, лайкнувшие user_id, на которых он ещё не ответил.
+    """
+    with db_conn() as db:
+        answered = exists().where(
+            UserInteraction.user_id == user_id,
+            UserInteraction.target_user_id == User.id,
+            UserInteraction.action.in_(
+                [InteractionActionEnum.like, InteractionActionEnum.pass_]
+            ),
+        )
+        likers = (
+            db.query(UserInteraction.user_id)
+            .filter(
+                UserInteraction.target_user_id == user_id,
+                UserInteraction.action == InteractionActionEnum.like,
+            )
+        )
+        return (
+            db.query(User)
+            .options(joinedload(User.profile), joinedload(User.interests))
+            .filter(User.id.in_(likers), ~answered)
+            .all()
+        )
@@ -1,67 +1,295 @@
-from ..data.db import db_conn
+import heapq
+
+from ..core.compatibility import jaccard_percent
+from ..core import recommendation_events
+from ..core.config import settings
+from ..core.cursors import encode_cursor, decode_cursor
+from ..core.hidden_index import hidden_index
+from ..core.interest_index import interest_index
+from ..core.recommendation_cache import recommendation_cache
+from ..data.db import db_conn, dialect_insert
+from ..data.models.match import Match
+from ..data.models.profile import Profile, VisibilityEnum
 from ..data.models.user import User
+from ..data.models.user_interest import UserInterest
 from ..data.models.user_interaction import UserInteraction, InteractionActionEnum
-from sqlalchemy.orm import joinedload
-from sqlalchemy import not_
+from ..data.models.user_recommendation import UserRecommendation
+from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy import select, func, exists, or_, and_
 
-def get_recommendations(user_id: str) -> list[User]:
-    with db_conn() as db:
-        current_user = db.get(User, user_id)
-        if not current_user:
-            return []
-        
-        my_interests = {i.id for i in current_user.interests}
-
-        passed_subquery = (
-            db.query(UserInteraction.target_user_id)
-            .filter(
-                UserInteraction.user_id == user_id,
-                UserInteraction.action == InteractionActionEnum.pass_
+
+def _partner_ids(db, user_id: str) -> set[str]:
+    """
+    Мэтчи пользователя: по uq_matches_pair для user_a и ix_matches_user_b
+    для user_b.
+    """
+    rows = (
+        db.query(Match.user_b)
+        .filter(Match.user_a == user_id)
+        .union_all(db.query(Match.user_a).filter(Match.user_b == user_id))
+    )
+    return {row[0] for row in rows}
+
+
+def _visible(user_id_column, partners: set[str]):
+    return or_(
+        Profile.visibility.is_(None),
+        Profile.visibility == VisibilityEnum.all,
+        and_(
+            Profile.visibility == VisibilityEnum.matched,
+            user_id_column.in_(partners),
+        ),
+    )
+
+
+def _score_sql(
+    db, user_id: str, city: str | None = None, partners: set[str] = frozenset()
+) -> list[tuple[int, str]]:
+    """
+    Считает совместимость в БД, начиная с интересов пользователя.
+
+    Пересечения находятся через ix_user_interests_interest_user, поэтому
+    пользователи без общих интересов не читаются вовсе. Размер объединения
+    берётся из числа интересов кандидата, passed отсекаются в том же запросе.
+    Если указан city, кандидаты ограничиваются этим городом.
+    Невидимые пользователи отсекаются по Profile.visibility.
+    """
+    theirs = aliased(UserInterest)
+    my_interest_ids = select(UserInterest.interest_id).where(
+        UserInterest.user_id == user_id
+    )
+    my_count = (
+        select(func.count())
+        .select_from(UserInterest)
+        .where(UserInterest.user_id == user_id)
+        .scalar_subquery()
+    )
+    passed = exists().where(
+        UserInteraction.user_id == user_id,
+        UserInteraction.target_user_id == theirs.user_id,
+        UserInteraction.action == InteractionActionEnum.pass_,
+    )
+
+    overlap = (
+        select(theirs.user_id.label("user_id"), func.count().label("common"))
+        .outerjoin(Profile, Profile.user_id == theirs.user_id)
+        .where(
+            theirs.interest_id.in_(my_interest_ids),
+            theirs.user_id != user_id,
+            ~passed,
+            _visible(theirs.user_id, partners),
+        )
+    )
+    if city is not None:
+        overlap = overlap.where(Profile.city == city)
+    overlap = overlap.group_by(theirs.user_id).subquery()
+    statement = (
+        select(
+            overlap.c.user_id,
+            overlap.c.common,
+            func.count().label("total"),
+            my_count.label("my_count"),
+        )
+        .join(UserInterest, UserInterest.user_id == overlap.c.user_id)
+        .group_by(overlap.c.user_id, overlap.c.common)
+    )
+
+    scored = []
+    for row in db.execute(statement):
+        compatibility = jaccard_percent(
+            row.common, row.my_count + row.total - row.common
+        )
+        if compatibility > 0:
+            scored.append((compatibility, row.user_id))
+    return scored
+
+
+def _score_candidates(db, user_id: str, city: str | None = None) -> list[tuple[int, str]]:
+    partners = _partner_ids(db, user_id)
+    if settings.RECOMMENDATION_ENGINE == "sql":
+        return _score_sql(db, user_id, city, partners)
+    return interest_index.score(
+        user_id, exclude=hidden_index.get(user_id), city=city, partners=partners
+    )
+
+
+def _resolve_city(db, user_id: str) -> str | None:
+    """
+    Город для поиска в пределах города или None, если город не указан
+    или в его пуле меньше RECOMMENDATION_MIN_CITY_POOL кандидатов.
+    """
+    if settings.RECOMMENDATION_ENGINE == "sql":
+        city = db.query(Profile.city).filter(Profile.user_id == user_id).scalar()
+        if city is None:
+            return None
+        pool_size = db.query(func.count()).filter(Profile.city == city).scalar()
+    else:
+        city = interest_index.city_of(user_id)
+        if city is None:
+            return None
+        pool_size = interest_index.city_pool_size(city)
+
+    if pool_size - 1 < settings.RECOMMENDATION_MIN_CITY_POOL:
+        return None
+    return city
+
+
+def _owner_mask(db, user_id: str) -> int:
+    if settings.RECOMMENDATION_ENGINE == "sql":
+        return interest_index.encode(
+            row.interest_id
+            for row in db.query(UserInterest.interest_id).filter(
+                UserInterest.user_id == user_id
             )
         )
-        candidates = (
-            db.query(User)
-            .options(joinedload(User.profile), joinedload(User.interests))
+    return interest_index.mask_of(user_id)
+
+
+def _hydrate(db, scored: list[tuple[int, str]]) -> list[User]:
+    if not scored:
+        return []
+
+    users = (
+        db.query(User)
+        .options(joinedload(User.profile), joinedload(User.interests))
+        .filter(User.id.in_([user_id for _, user_id in scored]))
+        .all()
+    )
+    by_id = {user.id: user for user in users}
+
+    result = []
+    for compatibility, user_id in scored:
+        user = by_id.get(user_id)
+        if user:
+            user.compatibility = compatibility
+            result.append(user)
+    return result
+
+
+def _rank_key(item: tuple[int, str]) -> tuple[int, str]:
+    compatibility, user_id = item
+    return -compatibility, user_id
+
+
+def _decode_position(cursor: str | None) -> tuple[int, str] | None:
+    if cursor is None:
+        return None
+    compatibility, user_id = decode_cursor(cursor, 2)
+    if not isinstance(compatibility, int) or not isinstance(user_id, str):
+        raise ValueError("Invalid cursor")
+    return compatibility, user_id
+
+
+def get_recommendations(
+    user_id: str, limit: int = 50, cursor: str | None = None, scope: str = "all"
+) -> tuple[list[User], str | None]:
+    """
+    Возвращает страницу рекомендаций и курсор следующей страницы.
+
+    Порядок стабилен между запросами: по убыванию совместимости, затем по id.
+    Курсор хранит позицию (совместимость, id) последнего элемента страницы.
+    При scope="city" кандидаты берутся из города пользователя, а если пул
+    города слишком мал - из всех городов.
+    """
+    position = _decode_position(cursor)
+
+    with db_conn() as db:
+        city = _resolve_city(db, user_id) if scope == "city" else None
+        cache_key = (user_id, city)
+        top = recommendation_cache.get(cache_key)
+
+        if top is None:
+            epoch = recommendation_cache.epoch
+
+            scored = _score_candidates(db, user_id, city)
+            top = heapq.nsmallest(recommendation_cache.top_k, scored, key=_rank_key)
+
+            recommendation_cache.put(cache_key, _owner_mask(db, user_id), top, epoch)
+
+        window = top
+        if position is not None:
+            window = [s for s in top if _rank_key(s) > _rank_key(position)]
+
+        if len(window) > limit or len(top) < recommendation_cache.top_k:
+            page = window[: limit + 1]
+        else:
+            # Страница выходит за пределы закэшированного топа.
+            scored = _score_candidates(db, user_id, city)
+            if position is not None:
+                scored = (s for s in scored if _rank_key(s) > _rank_key(position))
+            page = heapq.nsmallest(limit + 1, scored, key=_rank_key)
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(*page[-1])
+
+        return _hydrate(db, page), next_cursor
+
+
+def get_similar_users(user_id: str, limit: int = 20) -> list[User]:
+    """
+    Соседи пользователя из user_recommendations, рассчитанные фоновой задачей
+    app.jobs.materialize_recommendations. Пользователи, скрывшие профиль
+    после расчёта, отсекаются при чтении.
+    """
+    hidden = hidden_index.get(user_id)
+
+    with db_conn() as db:
+        rows = (
+            db.query(UserRecommendation.compatibility, UserRecommendation.target_user_id)
+            .outerjoin(Profile, Profile.user_id == UserRecommendation.target_user_id)
             .filter(
-                User.id != user_id,
-                not_(User.id.in_(passed_subquery))
+                UserRecommendation.user_id == user_id,
+                or_(
+                    Profile.visibility.is_(None),
+                    Profile.visibility == VisibilityEnum.all,
+                ),
             )
+            .order_by(UserRecommendation.rank)
+            .limit(limit + len(hidden))
             .all()
         )
-        scored_users = []
-        for candidate in candidates:
-            their_interests = {i.id for i in candidate.interests}
-            
-            intersection = len(my_interests & their_interests)
-            union = len(my_interests | their_interests)
-            
-            compatibility = int((intersection / union) * 100) if union > 0 else 0
-            
-            if compatibility > 0:
-                candidate.compatibility = compatibility
-                scored_users.append(candidate)
+        scored = [
+            (row.compatibility, row.target_user_id)
+            for row in rows
+            if row.target_user_id not in hidden
+        ]
+        return _hydrate(db, scored[:limit])
 
-        scored_users.sort(key=lambda x: x.compatibility, reverse=True)
 
-        return scored_users
+def hide_user(user_id: str, target_user_id: str):
+    hide_users(user_id=user_id, target_user_ids=[target_user_id])
 
 
-def hide_user(user_id: str, target_user_id: str):
-    
-    with db_conn() as db:
-        existing = db.query(UserInteraction).filter(
-            UserInteraction.user_id == user_id,
-            UserInteraction.target_user_id == target_user_id,
-            UserInteraction.action == InteractionActionEnum.pass_
-        ).first()
+def hide_users(user_id: str, target_user_ids: list[str]):
+    hidden = hidden_index.get(user_id)
+    new_ids = [
+        target_id
+        for target_id in dict.fromkeys(target_user_ids)
+        if target_id != user_id and target_id not in hidden
+    ]
+    if not new_ids:
+        return
 
-        if existing:
+    with db_conn() as db:
+        # Unknown ids are skipped: they would fail the foreign key.
+        existing = set(db.scalars(select(User.id).where(User.id.in_(new_ids))))
+        new_ids = [target_id for target_id in new_ids if target_id in existing]
+        if not new_ids:
             return
-
-        interaction = UserInteraction(
-            user_id=user_id,
-            target_user_id=target_user_id,
-            action=InteractionActionEnum.pass_
+        db.execute(
+            dialect_insert(UserInteraction).on_conflict_do_nothing(),
+            [
+                {
+                    "user_id": user_id,
+                    "target_user_id": target_id,
+                    "action": InteractionActionEnum.pass_,
+                }
+                for target_id in new_ids
+            ],
         )
-        db.add(interaction)
-        db.commit()
+
+    recommendation_events.emit(
+        {"kind": "hide", "user_id": user_id, "target_user_ids": new_ids}
+    )
@@ -1,5 +1,9 @@
+from datetime import datetime, timezone
+
+from ..core import recommendation_events
 from ..data.db import db_conn
 from ..data.models.interest import Interest
+from ..data.models.user import User
 from ..data.models.user_interest import UserInterest
 
 
@@ -30,12 +34,25 @@ def replace_user_interests(user_id: str, interests_ids: list[str]) -> list[Inter
                 user_interest = UserInterest(user_id=user_id, interest_id=interest_id)
                 db.add(user_interest)
 
+        db.query(User).filter(User.id == user_id).update(
+            {User.interests_updated_at: datetime.now(timezone.utc)},
+            synchronize_session=False,
+        )
         db.flush()
 
-        return (
+        interests = (
             db.query(Interest)
             .join(UserInterest)
             .filter(UserInterest.user_id == user_id)
             .order_by(Interest.name)
             .all()
         )
+
+    recommendation_events.emit(
+        {
+            "kind": "interests",
+            "user_id": user_id,
+            "interest_ids": [i.id for i in interests],
+        }
+    )
+    return interests
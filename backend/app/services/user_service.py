@@ -1,7 +1,11 @@
+from ..core import recommendation_events
 from ..data.db import db_conn
 from ..data.models.user import User
-from ..data.models.profile import Profile
+from ..data.models.match import Match
+from ..data.models.profile import Profile, VisibilityEnum
+from ..data.models.user_interest import UserInterest
 from ..schemas.user_schemas import UserLogin, ProfileUpdate
+from sqlalchemy import select, or_, and_
 from sqlalchemy.orm import joinedload
 
 
@@ -15,7 +19,8 @@ def create_user(user_data: UserLogin) -> User:
         new_profile = Profile(user_id=new_user.id)
         db.add(new_profile)
 
-        return new_user
+    recommendation_events.emit({"kind": "user", "user_id": new_user.id})
+    return new_user
 
 
 def get_user_by_login(login: str) -> User | None:
@@ -29,11 +34,25 @@ def get_user_by_id(user_id: str) -> User | None:
 
 
 def get_users(current_user_id: str) -> list[User]:
+    partner_ids = select(Match.user_b).where(Match.user_a == current_user_id).union_all(
+        select(Match.user_a).where(Match.user_b == current_user_id)
+    )
     with db_conn() as db:
         return (
             db.query(User)
             .options(joinedload(User.profile), joinedload(User.interests))
-            .filter(User.id != current_user_id)
+            .outerjoin(Profile, Profile.user_id == User.id)
+            .filter(
+                User.id != current_user_id,
+                or_(
+                    Profile.visibility.is_(None),
+                    Profile.visibility == VisibilityEnum.all,
+                    and_(
+                        Profile.visibility == VisibilityEnum.matched,
+                        User.id.in_(partner_ids),
+                    ),
+                ),
+            )
             .all()
         )
 
@@ -59,4 +78,21 @@ def update_profile(user_id: str, profile_data: ProfileUpdate) -> Profile | None:
             setattr(profile, key, value)
 
         db.add(profile)
-        return profile
+
+        reindexed = update_data.keys() & {"city", "visibility"}
+        if reindexed:
+            interest_ids = [
+                row.interest_id
+                for row in db.query(UserInterest.interest_id).filter(
+                    UserInterest.user_id == user_id
+                )
+            ]
+
+    if reindexed:
+        event = {"kind": "profile", "user_id": user_id, "interest_ids": interest_ids}
+        if "city" in reindexed:
+            event["city"] = profile.city
+        if "visibility" in reindexed:
+            event["visibility"] = VisibilityEnum(profile.visibility).value
+        recommendation_events.emit(event)
+    return profile
@@ -0,0 +1,279 @@
+"""
+Бенчмарк recommendation_service.get_recommendations.
+
+Для каждого размера популяции БД пересоздаётся и заполняется генератором
+benchmarks.population, после чего для выборки пользователей замеряются:
+    cold - первая страница при пустом кэше рекомендаций (полный расчёт),
+    warm - та же страница из кэша,
+    deep - страница за пределами закэшированного топа.
+Для каждой фазы сохраняются p50/p99 задержки, среднее число SQL-запросов
+на вызов и пиковый RSS процесса.
+
+Запуск из папки backend (нужен .env, как для приложения):
+    python -m benchmarks.bench_recommendations [--sizes 1000 10000 100000]
+        [--engines index sql] [--database-url sqlite:///bench.db]
+        [--output benchmarks/results/recommendations.json]
+
+По умолчанию используется временная SQLite-база. Для PostgreSQL передайте
+URL отдельной пустой базы: таблицы в ней пересоздаются.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event
+
+from app.core.config import settings
+from app.core.cursors import encode_cursor
+from app.core.hidden_index import HiddenIndex
+from app.core.interest_index import InterestIndex
+from app.core.logging_config import setup_logging
+from app.core.recommendation_cache import RecommendationCache
+from app.data import db as db_module
+from app.data.models import *  # noqa: F401,F403 - регистрирует все таблицы
+from app.services import recommendation_service
+from .population import PopulationSpec, generate
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _bind_database(url: str):
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+    )
+    db_module.engine = engine
+    db_module.SessionLocal.configure(bind=engine)
+    return engine
+
+
+def _reset_state():
+    # Индексы и кэш - синглтоны процесса, для новой популяции они пересоздаются.
+    recommendation_service.interest_index = InterestIndex()
+    recommendation_service.recommendation_cache = RecommendationCache(
+        max_entries=settings.RECOMMENDATION_CACHE_SIZE,
+        top_k=settings.RECOMMENDATION_TOP_K,
+    )
+    recommendation_service.hidden_index = HiddenIndex(
+        max_users=settings.HIDDEN_INDEX_SIZE
+    )
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в КБ на Linux и в байтах на macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _measure(counter: QueryCounter, calls) -> dict:
+    latencies = []
+    queries = 0
+    for call in calls:
+        before = counter.count
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries += counter.count - before
+
+    return {
+        "calls": len(latencies),
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries_per_call": round(queries / len(latencies), 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _bench_engine(
+    counter: QueryCounter, engine_name: str, sample: list[str], limit: int, scope: str
+) -> dict:
+    settings.RECOMMENDATION_ENGINE = engine_name
+    _reset_state()
+    cache = recommendation_service.recommendation_cache
+
+    started = time.perf_counter()
+    recommendation_service.interest_index.snapshot()
+    load_seconds = time.perf_counter() - started
+
+    def first_page(user_id: str, cold: bool):
+        def call():
+            if cold:
+                cache.invalidate(user_id)
+            recommendation_service.get_recommendations(
+                user_id=user_id, limit=limit, scope=scope
+            )
+
+        return call
+
+    cursors = {}
+
+    def deep_page(user_id: str):
+        def call():
+            recommendation_service.get_recommendations(
+                user_id=user_id, limit=limit, cursor=cursors[user_id], scope=scope
+            )
+
+        return call
+
+    cold = _measure(counter, [first_page(user_id, True) for user_id in sample])
+    warm = _measure(counter, [first_page(user_id, False) for user_id in sample])
+
+    # Курсор на последний элемент закэшированного топа.
+    for user_id in sample:
+        top = cache.get((user_id, None)) if scope == "all" else None
+        if top and len(top) == cache.top_k:
+            cursors[user_id] = encode_cursor(*top[-1])
+    deep = (
+        _measure(counter, [deep_page(user_id) for user_id in cursors])
+        if cursors
+        else None
+    )
+
+    return {
+        "engine": engine_name,
+        "index_load_seconds": round(load_seconds, 3),
+        "cold": cold,
+        "warm": warm,
+        "deep": deep,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: list[int],
+    engines: list[str],
+    database_url: str,
+    samples: int,
+    limit: int,
+    scope: str,
+    seed: int,
+) -> dict:
+    engine = _bind_database(database_url)
+    counter = QueryCounter(engine)
+
+    report = {
+        "benchmark": "recommendations",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": engine.dialect.name,
+        "params": {"samples": samples, "limit": limit, "scope": scope, "seed": seed},
+        "results": [],
+    }
+
+    for size in sizes:
+        db_module.Base.metadata.drop_all(engine)
+        db_module.Base.metadata.create_all(engine)
+
+        started = time.perf_counter()
+        with db_module.db_conn() as db:
+            population = generate(db, PopulationSpec(users=size, seed=seed))
+        generate_seconds = time.perf_counter() - started
+        logger.info(
+            f"Generated {size} users, {population.user_interests} user interests, "
+            f"{population.passes} passes in {generate_seconds:.1f}s."
+        )
+
+        sample = random.Random(seed).sample(
+            population.user_ids, min(samples, len(population.user_ids))
+        )
+        for engine_name in engines:
+            result = _bench_engine(counter, engine_name, sample, limit, scope)
+            result.update(
+                {
+                    "users": size,
+                    "user_interests": population.user_interests,
+                    "passes": population.passes,
+                    "generate_seconds": round(generate_seconds, 1),
+                }
+            )
+            report["results"].append(result)
+            logger.info(
+                f"{size} users, engine={engine_name}: "
+                f"cold p50 {result['cold']['p50_ms']}ms p99 {result['cold']['p99_ms']}ms, "
+                f"warm p50 {result['warm']['p50_ms']}ms, "
+                f"{result['cold']['queries_per_call']} queries/call, "
+                f"peak RSS {result['cold']['peak_rss_mb']}MB."
+            )
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommendations.")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=["index", "sql"], default=["index", "sql"]
+    )
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file.")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--scope", choices=["all", "city"], default="all")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--output",
+        default=os.path.join("benchmarks", "results", "recommendations.json"),
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite:///{tmp_dir}/bench.db"
+        report = run(
+            sizes=args.sizes,
+            engines=args.engines,
+            database_url=database_url,
+            samples=args.samples,
+            limit=args.limit,
+            scope=args.scope,
+            seed=args.seed,
+        )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Генератор синтетической популяции для бенчмарков.
+
+Популяция полностью определяется seed: одинаковые параметры дают одинаковые
+id, интересы, города и pass-взаимодействия, поэтому результаты разных
+запусков и движков сравнимы между собой.
+"""
+
+import random
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import insert
+
+from app.core.initial_data import INITIAL_INTERESTS
+from app.data.models.interest import Interest
+from app.data.models.profile import Profile, VisibilityEnum
+from app.data.models.user import User
+from app.data.models.user_interaction import UserInteraction, InteractionActionEnum
+from app.data.models.user_interest import UserInterest
+
+CITIES = [
+    "Москва",
+    "Санкт-Петербург",
+    "Новосибирск",
+    "Екатеринбург",
+    "Казань",
+    "Нижний Новгород",
+    "Челябинск",
+    "Самара",
+    "Омск",
+    "Ростов-на-Дону",
+    "Уфа",
+    "Красноярск",
+    "Воронеж",
+    "Пермь",
+    "Волгоград",
+    "Томск",
+]
+
+_CHUNK_SIZE = 5000
+
+
+@dataclass
+class PopulationSpec:
+    users: int
+    seed: int = 42
+    # Показатель распределения Ципфа для популярности интересов и городов.
+    zipf_s: float = 1.1
+    min_interests: int = 3
+    max_interests: int = 10
+    # Среднее число pass на пользователя.
+    passes_per_user: float = 5.0
+    # Доли visibility=matched и visibility=none.
+    matched_share: float = 0.05
+    hidden_share: float = 0.02
+    cities: list[str] = field(default_factory=lambda: list(CITIES))
+
+
+@dataclass
+class Population:
+    spec: PopulationSpec
+    user_ids: list[str]
+    interest_ids: list[str]
+    user_interests: int
+    passes: int
+
+
+def _zipf_weights(n: int, s: float) -> list[float]:
+    return [1 / (rank**s) for rank in range(1, n + 1)]
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _pick_distinct(rng: random.Random, items: list, weights: list[float], k: int) -> list:
+    picked = {}
+    while len(picked) < k:
+        for item in rng.choices(items, weights=weights, k=k - len(picked)):
+            picked[item] = None
+    return list(picked)
+
+
+def _insert_chunked(db, model, rows: list[dict]):
+    for start in range(0, len(rows), _CHUNK_SIZE):
+        db.execute(insert(model), rows[start : start + _CHUNK_SIZE])
+
+
+def generate(db, spec: PopulationSpec) -> Population:
+    """
+    Заполняет пустую БД: каталог INITIAL_INTERESTS, пользователи с профилями,
+    интересы с распределением Ципфа и pass-взаимодействия.
+    """
+    rng = random.Random(spec.seed)
+
+    interest_ids = [_uuid(rng) for _ in INITIAL_INTERESTS]
+    _insert_chunked(
+        db,
+        Interest,
+        [
+            {"id": interest_id, "name": data["name"], "group": data["group"]}
+            for interest_id, data in zip(interest_ids, INITIAL_INTERESTS)
+        ],
+    )
+
+    # Популярность интересов не совпадает с порядком каталога.
+    by_popularity = rng.sample(interest_ids, len(interest_ids))
+    interest_weights = _zipf_weights(len(by_popularity), spec.zipf_s)
+    city_weights = _zipf_weights(len(spec.cities), spec.zipf_s)
+
+    user_ids = sorted(_uuid(rng) for _ in range(spec.users))
+    users, profiles, user_interests = [], [], []
+    for number, user_id in enumerate(user_ids):
+        users.append(
+            {"id": user_id, "email": f"bench-{number}@example.com", "pass_hash": "none"}
+        )
+
+        roll = rng.random()
+        if roll < spec.hidden_share:
+            visibility = VisibilityEnum.none
+        elif roll < spec.hidden_share + spec.matched_share:
+            visibility = VisibilityEnum.matched
+        else:
+            visibility = VisibilityEnum.all
+        profiles.append(
+            {
+                "user_id": user_id,
+                "first_name": f"User {number}",
+                "city": rng.choices(spec.cities, weights=city_weights)[0],
+                "visibility": visibility,
+            }
+        )
+
+        k = rng.randint(spec.min_interests, spec.max_interests)
+        for interest_id in _pick_distinct(rng, by_popularity, interest_weights, k):
+            user_interests.append({"user_id": user_id, "interest_id": interest_id})
+
+    passes = []
+    for user_id in user_ids:
+        count = min(int(rng.expovariate(1 / spec.passes_per_user)), spec.users - 1)
+        targets = {rng.choice(user_ids) for _ in range(count)} - {user_id}
+        passes.extend(
+            {
+                "id": _uuid(rng),
+                "user_id": user_id,
+                "target_user_id": target_id,
+                "action": InteractionActionEnum.pass_,
+            }
+            for target_id in sorted(targets)
+        )
+
+    _insert_chunked(db, User, users)
+    _insert_chunked(db, Profile, profiles)
+    _insert_chunked(db, UserInterest, user_interests)
+    _insert_chunked(db, UserInteraction, passes)
+
+    return Population(
+        spec=spec,
+        user_ids=user_ids,
+        interest_ids=interest_ids,
+        user_interests=len(user_interests),
+        passes=len(passes),
+    )
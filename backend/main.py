@@ -1,14 +1,17 @@
 import logging
 from contextlib import asynccontextmanager
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, status
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.router import api_router
+from app.api.routers.ws import ws_router
+from app.core.config import settings
 from app.core.websockets import manager
-from app.dependencies.auth import get_current_user_from_websocket
-from app.services import chat_service
-from app.data.models.user import User
+from app.core.view_buffer import view_buffer
+from app.core.message_writer import message_writer
+from app.core import recommendation_events
+from app.core.unread_counters import unread_counters
 from app.core.initial_data import seed_interests
 from app.core.logging_config import setup_logging
 
@@ -20,8 +23,18 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Application startup")
     seed_interests()
+    manager.add_listener(unread_counters.apply)
+    manager.add_handler(recommendation_events.KEY, recommendation_events.handle)
+    await manager.start(settings.CHAT_BACKPLANE, settings.DATABASE_URL)
+    view_buffer.start()
+    unread_counters.start()
+    message_writer.start()
     yield
     logger.info("Application shutdown")
+    await message_writer.stop()
+    await unread_counters.stop()
+    await view_buffer.stop()
+    await manager.stop()
 
 
 app = FastAPI(title="Tinterest API v0.1", lifespan=lifespan)
@@ -39,32 +52,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix="/api")
-
-
-@app.websocket("/ws/chats/{chat_id}")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    chat_id: str,
-    user: User = Depends(get_current_user_from_websocket),
-):
-    if user is None:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
-
-    chat = chat_service.get_chat_by_id(chat_id)
-    if not chat or (user.id not in [chat.direct_a, chat.direct_b]):
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
-
-    await manager.connect(chat_id, user.id, websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        manager.disconnect(chat_id, user.id)
+app.include_router(ws_router)
 
 
 @app.get("/")
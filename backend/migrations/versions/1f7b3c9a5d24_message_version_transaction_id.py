@@ -0,0 +1,38 @@
+"""message version transaction id
+
+Revision ID: 1f7b3c9a5d24
+Revises: e8f1a6c3b502
+Create Date: 2026-03-02 11:42:17.905316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f7b3c9a5d24'
+down_revision: Union[str, Sequence[str], None] = 'e8f1a6c3b502'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Versions are transaction ids from now on. Existing messages get 0,
+    # which every snapshot sees as committed.
+    op.execute("UPDATE messages SET version = 0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        "UPDATE messages SET version = numbered.version "
+        "FROM (SELECT id, row_number() OVER (ORDER BY updated_at, id) AS version "
+        "FROM messages) AS numbered WHERE messages.id = numbered.id"
+    )
+    op.execute(
+        "UPDATE message_versions SET value = "
+        "(SELECT COALESCE(MAX(version), 0) FROM messages) WHERE id = 1"
+    )
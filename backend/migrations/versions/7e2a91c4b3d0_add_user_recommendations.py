@@ -0,0 +1,47 @@
+"""add user_recommendations
+
+Revision ID: 7e2a91c4b3d0
+Revises: d9cc1a54998c
+Create Date: 2026-01-20 12:14:05.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2a91c4b3d0'
+down_revision: Union[str, Sequence[str], None] = 'd9cc1a54998c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('target_user_id', sa.String(length=36), nullable=False),
+    sa.Column('compatibility', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['target_user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'target_user_id')
+    )
+    op.create_index('ix_user_recommendations_computed', 'user_recommendations', ['computed_at'], unique=False)
+    op.create_index('ix_user_recommendations_target', 'user_recommendations', ['target_user_id'], unique=False)
+    op.create_index('ix_user_recommendations_user_rank', 'user_recommendations', ['user_id', 'rank'], unique=False)
+    op.add_column('users', sa.Column('interests_updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_users_interests_updated', 'users', ['interests_updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_interests_updated', table_name='users')
+    op.drop_column('users', 'interests_updated_at')
+    op.drop_index('ix_user_recommendations_user_rank', table_name='user_recommendations')
+    op.drop_index('ix_user_recommendations_target', table_name='user_recommendations')
+    op.drop_index('ix_user_recommendations_computed', table_name='user_recommendations')
+    op.drop_table('user_recommendations')
@@ -0,0 +1,61 @@
+"""add likes and matches
+
+Revision ID: a4f6c2d81e57
+Revises: 7e2a91c4b3d0
+Create Date: 2026-01-27 16:42:11.905417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f6c2d81e57'
+down_revision: Union[str, Sequence[str], None] = '7e2a91c4b3d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('matches',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_a', sa.String(length=36), nullable=False),
+    sa.Column('user_b', sa.String(length=36), nullable=False),
+    sa.Column('chat_id', sa.String(length=36), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.CheckConstraint('user_a <> user_b', name='chk_match_not_self'),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_a'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_b'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_matches_user_b', 'matches', ['user_b'], unique=False)
+    op.create_index('uq_matches_pair', 'matches', ['user_a', 'user_b'], unique=True)
+
+    # Дубликаты pass/like, накопленные до появления уникального индекса.
+    op.execute(
+        "DELETE FROM user_interactions WHERE action <> 'view' AND id NOT IN ("
+        "SELECT MIN(id) FROM user_interactions WHERE action <> 'view' "
+        "GROUP BY user_id, target_user_id, action)"
+    )
+    op.create_index('ix_interactions_target_action', 'user_interactions', ['target_user_id', 'action'], unique=False)
+    op.create_index(
+        'uq_interactions_user_target_action',
+        'user_interactions',
+        ['user_id', 'target_user_id', 'action'],
+        unique=True,
+        postgresql_where=sa.text("action <> 'view'"),
+        sqlite_where=sa.text("action <> 'view'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_interactions_user_target_action', table_name='user_interactions')
+    op.drop_index('ix_interactions_target_action', table_name='user_interactions')
+    op.drop_index('uq_matches_pair', table_name='matches')
+    op.drop_index('ix_matches_user_b', table_name='matches')
+    op.drop_table('matches')
@@ -0,0 +1,30 @@
+"""add message client id
+
+Revision ID: a9d4c2e7b058
+Revises: f5c0a8e2b913
+Create Date: 2026-02-12 14:06:51.402317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4c2e7b058'
+down_revision: Union[str, Sequence[str], None] = 'f5c0a8e2b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('client_id', sa.String(length=64), nullable=True))
+    op.create_index('uq_messages_author_client', 'messages', ['author_id', 'client_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_messages_author_client', table_name='messages')
+    op.drop_column('messages', 'client_id')
@@ -0,0 +1,33 @@
+"""add message updated at
+
+Revision ID: b4e1f7a3c926
+Revises: a9d4c2e7b058
+Create Date: 2026-02-16 11:48:22.730164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e1f7a3c926'
+down_revision: Union[str, Sequence[str], None] = 'a9d4c2e7b058'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+    op.execute(
+        "UPDATE messages SET updated_at = COALESCE(deleted_at, edited_at, created_at)"
+    )
+    op.create_index('ix_messages_chat_updated', 'messages', ['chat_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_chat_updated', table_name='messages')
+    op.drop_column('messages', 'updated_at')
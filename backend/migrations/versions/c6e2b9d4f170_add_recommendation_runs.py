@@ -0,0 +1,36 @@
+"""add recommendation_runs
+
+Revision ID: c6e2b9d4f170
+Revises: d2a8f5c1e374
+Create Date: 2026-02-23 10:41:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e2b9d4f170'
+down_revision: Union[str, Sequence[str], None] = 'd2a8f5c1e374'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No backfill: the first run after the upgrade recomputes every user.
+    op.create_table('recommendation_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('full', sa.Boolean(), nullable=False),
+    sa.Column('dirty_users', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recommendation_runs')
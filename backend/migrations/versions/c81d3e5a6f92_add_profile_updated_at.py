@@ -0,0 +1,28 @@
+"""add profile updated_at
+
+Revision ID: c81d3e5a6f92
+Revises: a4f6c2d81e57
+Create Date: 2026-02-03 10:05:48.227613
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d3e5a6f92'
+down_revision: Union[str, Sequence[str], None] = 'a4f6c2d81e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('profile', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('profile', 'updated_at')
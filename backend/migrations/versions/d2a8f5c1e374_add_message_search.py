@@ -0,0 +1,34 @@
+"""add message search
+
+Revision ID: d2a8f5c1e374
+Revises: b4e1f7a3c926
+Create Date: 2026-02-19 16:03:47.215896
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8f5c1e374'
+down_revision: Union[str, Sequence[str], None] = 'b4e1f7a3c926'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Генерируемый столбец заполняется для существующих строк при добавлении.
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('russian', text)) STORED"
+    )
+    op.create_index('ix_messages_search', 'messages', ['search_vector'], unique=False, postgresql_using='gin', postgresql_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_search', table_name='messages', postgresql_using='gin', postgresql_where=sa.text('deleted_at IS NULL'))
+    op.drop_column('messages', 'search_vector')
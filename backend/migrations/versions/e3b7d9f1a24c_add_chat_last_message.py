@@ -0,0 +1,59 @@
+"""add chat last message
+
+Revision ID: e3b7d9f1a24c
+Revises: c81d3e5a6f92
+Create Date: 2026-02-06 12:31:09.544218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7d9f1a24c'
+down_revision: Union[str, Sequence[str], None] = 'c81d3e5a6f92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chats', sa.Column('last_message_id', sa.String(length=36), nullable=True))
+    op.add_column('chats', sa.Column('last_message_text', sa.Text(), nullable=True))
+    op.add_column('chats', sa.Column('last_message_author_id', sa.String(length=36), nullable=True))
+    op.add_column('chats', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('chats', sa.Column('last_activity_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+    # Заполняем последнее сообщение для существующих чатов.
+    op.execute(
+        "UPDATE chats SET last_message_id = ("
+        "SELECT m.id FROM messages m WHERE m.chat_id = chats.id "
+        "ORDER BY m.created_at DESC, m.id DESC LIMIT 1)"
+    )
+    op.execute(
+        "UPDATE chats SET "
+        "last_message_text = (SELECT m.text FROM messages m WHERE m.id = chats.last_message_id), "
+        "last_message_author_id = (SELECT m.author_id FROM messages m WHERE m.id = chats.last_message_id), "
+        "last_message_at = (SELECT m.created_at FROM messages m WHERE m.id = chats.last_message_id) "
+        "WHERE last_message_id IS NOT NULL"
+    )
+    op.execute(
+        "UPDATE chats SET last_activity_at = last_message_at "
+        "WHERE last_message_at IS NOT NULL"
+    )
+
+    op.create_index('ix_chats_direct_a_activity', 'chats', ['direct_a', 'last_activity_at'], unique=False)
+    op.create_index('ix_chats_direct_b_activity', 'chats', ['direct_b', 'last_activity_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chats_direct_b_activity', table_name='chats')
+    op.drop_index('ix_chats_direct_a_activity', table_name='chats')
+    op.drop_column('chats', 'last_activity_at')
+    op.drop_column('chats', 'last_message_at')
+    op.drop_column('chats', 'last_message_author_id')
+    op.drop_column('chats', 'last_message_text')
+    op.drop_column('chats', 'last_message_id')
@@ -0,0 +1,49 @@
+"""add message version
+
+Revision ID: e8f1a6c3b502
+Revises: c6e2b9d4f170
+Create Date: 2026-02-24 15:06:39.481207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f1a6c3b502'
+down_revision: Union[str, Sequence[str], None] = 'c6e2b9d4f170'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('message_versions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('messages', sa.Column('version', sa.BigInteger(), nullable=True))
+    # Existing messages are numbered in the order of the previous sync cursor.
+    op.execute(
+        "UPDATE messages SET version = numbered.version "
+        "FROM (SELECT id, row_number() OVER (ORDER BY updated_at, id) AS version "
+        "FROM messages) AS numbered WHERE messages.id = numbered.id"
+    )
+    op.execute(
+        "INSERT INTO message_versions (id, value) "
+        "SELECT 1, COALESCE(MAX(version), 0) FROM messages"
+    )
+    op.alter_column('messages', 'version', nullable=False)
+    op.create_index('ix_messages_chat_version', 'messages', ['chat_id', 'version'], unique=False)
+    op.drop_index('ix_messages_chat_updated', table_name='messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_messages_chat_updated', 'messages', ['chat_id', 'updated_at'], unique=False)
+    op.drop_index('ix_messages_chat_version', table_name='messages')
+    op.drop_column('messages', 'version')
+    op.drop_table('message_versions')
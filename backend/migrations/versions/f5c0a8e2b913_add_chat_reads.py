@@ -0,0 +1,39 @@
+"""add chat reads
+
+Revision ID: f5c0a8e2b913
+Revises: e3b7d9f1a24c
+Create Date: 2026-02-09 18:20:37.118904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c0a8e2b913'
+down_revision: Union[str, Sequence[str], None] = 'e3b7d9f1a24c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_reads',
+    sa.Column('chat_id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('last_read_message_id', sa.String(length=36), nullable=True),
+    sa.Column('last_read_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['last_read_message_id'], ['messages.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('chat_id', 'user_id')
+    )
+    op.create_index('ix_chat_reads_user', 'chat_reads', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_reads_user', table_name='chat_reads')
+    op.drop_table('chat_reads')
@@ -0,0 +1,153 @@
+"""
+Проверка доставки сообщений чата между несколькими воркерами.
+
+Поднимает несколько процессов uvicorn на соседних портах против одной БД
+(из .env, миграции должны быть применены), подключает получателя по
+WebSocket к каждому воркеру, отправляет сообщение через каждый воркер
+и проверяет, что его получили все подключения.
+
+Запуск из папки backend:
+    python scripts/backplane_harness.py [--workers 3] [--backplane postgres]
+
+С --backplane local сообщения доходят только до сокетов того воркера,
+через который они отправлены.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from websockets.asyncio.client import connect
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _request(port: int, method: str, path: str, token: str | None = None, body=None):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}",
+        method=method,
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={"Content-Type": "application/json"},
+    )
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read() or "null")
+
+
+def _start_worker(port: int, backplane: str) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "CHAT_BACKPLANE": backplane},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    # Воркеры стартуют по очереди: seed_interests не рассчитан на гонку.
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Worker on port {port} exited with {process.returncode}")
+        try:
+            _request(port, "GET", "/")
+            return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Worker on port {port} did not start")
+
+
+def _register(port: int) -> tuple[str, str]:
+    login = f"harness-{uuid.uuid4().hex[:12]}@example.com"
+    token = _request(port, "POST", "/api/auth/register", body={"login": login})[
+        "access_token"
+    ]
+    user_id = _request(port, "GET", "/api/users/me", token=token)["id"]
+    return user_id, token
+
+
+async def _check(ports: list[int], timeout: float) -> dict:
+    sender_id, sender_token = _register(ports[0])
+    receiver_id, receiver_token = _register(ports[0])
+    chat_id = _request(ports[0], "GET", f"/api/chats/{receiver_id}", token=sender_token)[
+        "id"
+    ]
+
+    sockets = [
+        await connect(f"ws://127.0.0.1:{port}/ws/chats/{chat_id}?token={receiver_token}")
+        for port in ports
+    ]
+    deliveries = []
+    try:
+        for sender_port in ports:
+            text = f"harness {uuid.uuid4().hex}"
+            sent_at = time.monotonic()
+            await asyncio.to_thread(
+                _request,
+                sender_port,
+                "POST",
+                f"/api/chats/{chat_id}/messages",
+                sender_token,
+                {"text": text},
+            )
+            for receiver_port, socket in zip(ports, sockets):
+                latency_ms = None
+                try:
+                    while latency_ms is None:
+                        frame = json.loads(await asyncio.wait_for(socket.recv(), timeout))
+                        if frame.get("text") == text:
+                            latency_ms = round((time.monotonic() - sent_at) * 1000, 1)
+                except TimeoutError:
+                    pass
+                deliveries.append(
+                    {
+                        "sent_via": sender_port,
+                        "received_via": receiver_port,
+                        "latency_ms": latency_ms,
+                    }
+                )
+    finally:
+        for socket in sockets:
+            await socket.close()
+
+    return {
+        "workers": ports,
+        "delivered": sum(1 for d in deliveries if d["latency_ms"] is not None),
+        "expected": len(deliveries),
+        "deliveries": deliveries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker chat fan-out check.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument("--backplane", choices=["local", "postgres"], default="postgres")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    ports = [args.base_port + i for i in range(args.workers)]
+    workers = []
+    try:
+        for port in ports:
+            workers.append(_start_worker(port, args.backplane))
+        report = asyncio.run(_check(ports, args.timeout))
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["delivered"] == report["expected"] else 1)
+
+
+if __name__ == "__main__":
+    main()
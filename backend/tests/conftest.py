@@ -0,0 +1,64 @@
+import os
+import uuid
+
+# Settings are read at import time; the tests run against SQLite.
+for name, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "SECRET_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.data import db as db_module
+from app.data.models import *  # noqa: F401,F403 - регистрирует все таблицы
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    # One application per session: the background workers are process-wide
+    # singletons bound to the event loop of the first lifespan.
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
+    )
+    db_module.engine = engine
+    db_module.SessionLocal.configure(bind=engine)
+    db_module.Base.metadata.create_all(engine)
+
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+    engine.dispose()
+
+
+@pytest.fixture
+def register(client):
+    """Регистрирует нового пользователя, возвращает (user_id, token, headers)."""
+
+    def register() -> tuple[str, str, dict[str, str]]:
+        login = f"{uuid.uuid4().hex}@example.com"
+        token = client.post("/api/auth/register", json={"login": login}).json()[
+            "access_token"
+        ]
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = client.get("/api/users/me", headers=headers).json()["id"]
+        return user_id, token, headers
+
+    return register
+
+
+@pytest.fixture
+def direct_chat(client, register):
+    """Личный чат двух пользователей: (chat_id, alice, bob)."""
+    alice = register()
+    bob = register()
+    chat_id = client.get(f"/api/chats/{bob[0]}", headers=alice[2]).json()["id"]
+    return chat_id, alice, bob
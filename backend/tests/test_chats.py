@@ -0,0 +1,169 @@
+import uuid
+
+from app.data.db import db_conn
+from app.data.models import Message
+from app.services import chat_service
+
+
+def _post(client, chat_id, headers, text):
+    response = client.post(
+        f"/api/chats/{chat_id}/messages", json={"text": text}, headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _sync(client, headers, since=None):
+    params = {"since": since} if since is not None else {}
+    response = client.get("/api/chats/sync", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sync_returns_every_message_posted_between_calls(client, direct_chat):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    cursor = _sync(client, bob)["cursor"]
+
+    # Many messages land in the same second and in random id order.
+    for number in range(20):
+        message_id = _post(client, chat_id, alice, f"message {number}")
+        page = _sync(client, bob, cursor)
+        assert [change["id"] for change in page["changes"]] == [message_id]
+        cursor = page["cursor"]
+
+    assert _sync(client, bob, cursor)["changes"] == []
+
+
+def test_sync_returns_edits_deletes_and_inserts_between_calls(client, direct_chat):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    edited = _post(client, chat_id, alice, "first")
+    deleted = _post(client, chat_id, alice, "second")
+    untouched = _post(client, chat_id, alice, "third")
+    cursor = _sync(client, bob)["cursor"]
+
+    response = client.patch(
+        f"/api/chats/{chat_id}/messages/{edited}", json={"text": "edited"}, headers=alice
+    )
+    assert response.status_code == 200
+    inserted = _post(client, chat_id, alice, "fourth")
+    response = client.delete(f"/api/chats/{chat_id}/messages/{deleted}", headers=alice)
+    assert response.status_code == 204
+
+    page = _sync(client, bob, cursor)
+    changes = {change["id"]: change for change in page["changes"]}
+    assert [change["id"] for change in page["changes"]] == [edited, inserted, deleted]
+    assert untouched not in changes
+    assert changes[edited]["text"] == "edited"
+    assert changes[edited]["edited_at"] is not None
+    assert changes[inserted]["text"] == "fourth"
+    assert changes[deleted]["text"] is None
+    assert changes[deleted]["deleted_at"] is not None
+    assert not page["has_more"]
+
+    assert _sync(client, bob, page["cursor"])["changes"] == []
+
+
+def test_sync_pages_and_rejects_bad_cursor(client, direct_chat):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    posted = [_post(client, chat_id, alice, f"message {number}") for number in range(5)]
+
+    received, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"since": cursor} if cursor else {})
+        page = client.get("/api/chats/sync", params=params, headers=bob).json()
+        received += [change["id"] for change in page["changes"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert received == posted
+
+    response = client.get("/api/chats/sync", params={"since": "garbage"}, headers=bob)
+    assert response.status_code == 400
+
+
+def test_sync_returns_transactions_in_flight_at_the_previous_call(
+    client, direct_chat, monkeypatch
+):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    cursor = _sync(client, bob)["cursor"]
+    slow = _post(client, chat_id, alice, "committed last")
+    fast = _post(client, chat_id, alice, "committed first")
+    with db_conn() as db:
+        slow_version = db.get(Message, slow).version
+    snapshot = chat_service.version_snapshot
+
+    # The first call sees "slow" still in flight, as a concurrent writer
+    # in PostgreSQL would be.
+    def snapshot_with_slow_in_flight(db):
+        xmax, xip = snapshot(db)
+        return xmax, sorted([*xip, slow_version])
+
+    monkeypatch.setattr(chat_service, "version_snapshot", snapshot_with_slow_in_flight)
+    page = _sync(client, bob, cursor)
+    assert [change["id"] for change in page["changes"]] == [fast]
+
+    monkeypatch.setattr(chat_service, "version_snapshot", snapshot)
+    page = _sync(client, bob, page["cursor"])
+    assert [change["id"] for change in page["changes"]] == [slow]
+    assert _sync(client, bob, page["cursor"])["changes"] == []
+
+
+def _search(client, headers, q, **params):
+    response = client.get(
+        "/api/chats/search", params={"q": q} | params, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json(), response.headers.get("X-Next-Cursor")
+
+
+def test_search_finds_messages_in_own_chats_only(client, register, direct_chat):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    # A word no other test has posted.
+    word = f"w{uuid.uuid4().hex}"
+    found = _post(client, chat_id, alice, f"hello {word}")
+    _post(client, chat_id, alice, "hello without it")
+    deleted = _post(client, chat_id, bob, f"{word} to delete")
+    response = client.delete(f"/api/chats/{chat_id}/messages/{deleted}", headers=bob)
+    assert response.status_code == 204
+
+    _, _, carol = register()
+    other_chat = client.get(f"/api/chats/{register()[0]}", headers=carol).json()["id"]
+    foreign = _post(client, other_chat, carol, f"{word} elsewhere")
+
+    for headers in (alice, bob):
+        results, next_cursor = _search(client, headers, word)
+        assert [(m["id"], m["chat_id"]) for m in results] == [(found, chat_id)]
+        assert next_cursor is None
+    results, _ = _search(client, carol, word)
+    assert [m["id"] for m in results] == [foreign]
+    results, _ = _search(client, alice, word, chat_id=other_chat)
+    assert results == []
+
+
+def test_search_pages_by_rank_and_id(client, direct_chat):
+    chat_id, (_, _, alice), (_, _, bob) = direct_chat
+    word = f"w{uuid.uuid4().hex}"
+    # Equal texts share a rank, so their order comes from the id.
+    texts = [word] * 3 + [f"{word} {word}"] * 2 + [f"{word} and more words"] * 3
+    posted = {_post(client, chat_id, alice, text): text for text in texts}
+
+    everything, next_cursor = _search(client, bob, word, limit=50)
+    assert next_cursor is None
+    assert sorted(m["id"] for m in everything) == sorted(posted)
+    for text in set(texts):
+        ties = [m["id"] for m in everything if m["text"] == text]
+        assert ties == sorted(ties)
+
+    received, cursor = [], None
+    while True:
+        params = {"limit": 3} | ({"cursor": cursor} if cursor else {})
+        results, cursor = _search(client, bob, word, **params)
+        received += [m["id"] for m in results]
+        if cursor is None:
+            break
+    assert received == [m["id"] for m in everything]
+
+    response = client.get(
+        "/api/chats/search", params={"q": word, "cursor": "garbage"}, headers=bob
+    )
+    assert response.status_code == 400
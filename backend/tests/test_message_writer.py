@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.core import message_writer as message_writer_module
+from app.core.message_writer import message_writer
+from app.data.db import db_conn
+from app.data.models import Message
+from app.schemas.chat_schemas import MessageCreate
+from app.services import chat_service
+
+
+@pytest.fixture
+def group_commit(client, monkeypatch):
+    """CHAT_GROUP_COMMIT на время теста: пачки до 8 сообщений за 50 мс."""
+    monkeypatch.setattr(message_writer, "enabled", True)
+    monkeypatch.setattr(message_writer, "max_batch", 8)
+    monkeypatch.setattr(message_writer, "interval", 0.05)
+
+    async def start():
+        message_writer.start()
+
+    client.portal.call(start)
+    yield message_writer
+    client.portal.call(message_writer.stop)
+
+
+def _send_concurrently(client, drafts):
+    """drafts - [(chat_id, author_id, MessageCreate)]; исключения возвращаются."""
+
+    async def burst():
+        return await asyncio.gather(
+            *(
+                chat_service.create_message(
+                    chat_id=chat_id, author_id=author_id, msg_data=msg_data
+                )
+                for chat_id, author_id, msg_data in drafts
+            ),
+            return_exceptions=True,
+        )
+
+    return client.portal.call(burst)
+
+
+def test_concurrent_messages_are_written_in_batches(client, direct_chat, group_commit):
+    chat_id, (alice_id, _, _), (bob_id, _, _) = direct_chat
+    drafts = [
+        (chat_id, (alice_id, bob_id)[number % 2], MessageCreate(text=f"message {number}"))
+        for number in range(12)
+    ]
+    batches = group_commit.batches
+
+    results = _send_concurrently(client, drafts)
+
+    assert group_commit.batches - batches == 2
+    assert [(m.author_id, m.text) for m in results] == [
+        (author_id, msg_data.text) for _, author_id, msg_data in drafts
+    ]
+    with db_conn() as db:
+        stored = db.query(Message).filter(Message.chat_id == chat_id).count()
+    assert stored == 12
+
+
+def test_repeated_client_id_in_one_batch_is_stored_once(
+    client, direct_chat, group_commit
+):
+    chat_id, (alice_id, _, _), _ = direct_chat
+    msg_data = MessageCreate(text="hello", client_id="retry-1")
+    batches = group_commit.batches
+
+    first, second = _send_concurrently(
+        client, [(chat_id, alice_id, msg_data), (chat_id, alice_id, msg_data)]
+    )
+
+    assert group_commit.batches - batches == 1
+    assert first.id == second.id
+    with db_conn() as db:
+        assert db.query(Message).filter(Message.client_id == "retry-1").count() == 1
+
+
+def test_errors_reach_only_their_callers(client, register, group_commit, monkeypatch):
+    alice_id, _, alice = register()
+    chats = [
+        client.get(f"/api/chats/{register()[0]}", headers=alice).json()["id"]
+        for _ in range(2)
+    ]
+    [used] = _send_concurrently(
+        client, [(chats[0], alice_id, MessageCreate(text="first", client_id="used"))]
+    )
+
+    # client_id "used" is taken in the first chat.
+    ok, reused, retried = _send_concurrently(
+        client,
+        [
+            (chats[1], alice_id, MessageCreate(text="fine")),
+            (chats[1], alice_id, MessageCreate(text="reused", client_id="used")),
+            (chats[0], alice_id, MessageCreate(text="first", client_id="used")),
+        ],
+    )
+    assert ok.text == "fine" and ok.chat_id == chats[1]
+    assert isinstance(reused, ValueError)
+    assert retried.id == used.id
+
+    # A failed batch fails every caller in it, and the writer keeps going.
+    def fail(drafts):
+        raise RuntimeError("database is down")
+
+    write_messages = message_writer_module.write_messages
+    monkeypatch.setattr(message_writer_module, "write_messages", fail)
+    results = _send_concurrently(
+        client, [(chats[0], alice_id, MessageCreate(text="lost")) for _ in range(3)]
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    monkeypatch.setattr(message_writer_module, "write_messages", write_messages)
+    [after] = _send_concurrently(
+        client, [(chats[0], alice_id, MessageCreate(text="after"))]
+    )
+    assert after.text == "after"
@@ -0,0 +1,260 @@
+import json
+import random
+import uuid
+
+from app.core import recommendation_events
+from app.core.hidden_index import hidden_index
+from app.core.interest_matrix import SharedInterestIndex, build_snapshot
+from app.core.recommendation_cache import recommendation_cache
+from app.core.websockets import manager
+from app.data.db import db_conn
+from app.data.models.user_interaction import InteractionActionEnum, UserInteraction
+from app.services import recommendation_service
+
+
+def _interest_ids(client, count):
+    interests = client.get("/api/survey/interests").json()
+    return random.sample([interest["id"] for interest in interests], count)
+
+
+def _set_interests(client, headers, interest_ids):
+    response = client.put("/api/survey/me/interests", json=interest_ids, headers=headers)
+    assert response.status_code == 200
+
+
+def _recommended(client, headers, **params):
+    response = client.get("/api/recommendations", params=params, headers=headers)
+    assert response.status_code == 200
+    return [user["id"] for user in response.json()]
+
+
+def _from_other_worker(client, event):
+    message = json.dumps({recommendation_events.KEY: {**event, "worker": "other"}})
+    client.portal.call(manager.deliver, recommendation_events.KEY, message)
+
+
+def test_changes_from_other_workers_reach_this_worker(client, register):
+    shared = _interest_ids(client, 3)
+    (owner_id, _, owner), (target_id, _, target) = register(), register()
+    _set_interests(client, owner, shared)
+    _set_interests(client, target, shared)
+    assert target_id in _recommended(client, owner)
+
+    # Another worker changed the target's interests: the cached list here
+    # must not keep showing the target.
+    other = [i for i in _interest_ids(client, 10) if i not in shared][:3]
+    _from_other_worker(
+        client, {"kind": "interests", "user_id": target_id, "interest_ids": other}
+    )
+    assert target_id not in _recommended(client, owner)
+
+    _from_other_worker(
+        client, {"kind": "interests", "user_id": target_id, "interest_ids": shared}
+    )
+    assert target_id in _recommended(client, owner)
+
+    _from_other_worker(
+        client, {"kind": "hide", "user_id": owner_id, "target_user_ids": [target_id]}
+    )
+    assert target_id in hidden_index.get(owner_id)
+    assert target_id not in _recommended(client, owner)
+
+
+def test_new_matrix_generation_clears_the_recommendation_cache(client, tmp_path):
+    build_snapshot(str(tmp_path))
+    index = SharedInterestIndex(str(tmp_path), check_interval=0)
+    index.mask_of("unknown")
+
+    key = ("owner", None)
+    recommendation_cache.put(key, 0, [(50, "target")], recommendation_cache.epoch)
+    assert recommendation_cache.get(key) is not None
+
+    # Same bit layout, but the lists were scored against the old generation.
+    build_snapshot(str(tmp_path))
+    index.mask_of("unknown")
+    assert recommendation_cache.get(key) is None
+
+
+def test_interest_change_drops_lists_the_user_joins_or_leaves(client, register):
+    shared = _interest_ids(client, 3)
+    (owner_id, _, owner), (target_id, _, target) = register(), register()
+    _set_interests(client, owner, shared)
+    assert target_id not in _recommended(client, owner)
+    assert recommendation_cache.get((owner_id, None)) is not None
+
+    # The target now qualifies for the cached list of the owner.
+    _set_interests(client, target, shared)
+    assert recommendation_cache.get((owner_id, None)) is None
+    assert target_id in _recommended(client, owner)
+
+    # The target leaves the list it appears in.
+    other = [i for i in _interest_ids(client, 10) if i not in shared][:3]
+    _set_interests(client, target, other)
+    assert recommendation_cache.get((owner_id, None)) is None
+    assert target_id not in _recommended(client, owner)
+
+
+def test_list_scored_before_an_invalidation_is_not_cached(
+    client, register, monkeypatch
+):
+    shared = _interest_ids(client, 3)
+    (owner_id, _, owner), (target_id, _, _) = register(), register()
+    _set_interests(client, owner, shared)
+    score_candidates = recommendation_service._score_candidates
+
+    def score_racing_a_change(*args):
+        scored = score_candidates(*args)
+        recommendation_cache.invalidate_user(target_id, 0)
+        return scored
+
+    monkeypatch.setattr(
+        recommendation_service, "_score_candidates", score_racing_a_change
+    )
+    _recommended(client, owner)
+    assert recommendation_cache.get((owner_id, None)) is None
+
+    monkeypatch.undo()
+    _recommended(client, owner)
+    assert recommendation_cache.get((owner_id, None)) is not None
+
+
+def test_least_recently_used_lists_are_evicted(client, register, monkeypatch):
+    shared = _interest_ids(client, 3)
+    owners = [register() for _ in range(3)]
+    for _, _, headers in owners:
+        _set_interests(client, headers, shared)
+    monkeypatch.setattr(recommendation_cache, "max_entries", 2)
+    (first_id, _, first), (second_id, _, second), (third_id, _, third) = owners
+
+    _recommended(client, first)
+    _recommended(client, second)
+    _recommended(client, first)
+    _recommended(client, third)
+
+    assert recommendation_cache.get((first_id, None)) is not None
+    assert recommendation_cache.get((second_id, None)) is None
+    assert recommendation_cache.get((third_id, None)) is not None
+
+
+def test_pages_follow_the_next_cursor_without_gaps_or_duplicates(client, register):
+    interests = _interest_ids(client, 4)
+    owner_id, _, owner = register()
+    _set_interests(client, owner, interests)
+    # Compatibility 100, 75, 50 and 25 percent, two users each.
+    for count in (4, 3, 2, 1):
+        for _ in range(2):
+            _set_interests(client, register()[2], interests[:count])
+
+    response = client.get("/api/recommendations", params={"limit": 100}, headers=owner)
+    expected = [(user["compatibility"], user["id"]) for user in response.json()]
+    assert expected == sorted(expected, key=lambda item: (-item[0], item[1]))
+    assert len(expected) >= 8
+
+    received, cursor = [], None
+    while True:
+        params = {"limit": 3} | ({"cursor": cursor} if cursor else {})
+        response = client.get("/api/recommendations", params=params, headers=owner)
+        assert response.status_code == 200
+        received += [(user["compatibility"], user["id"]) for user in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert received == expected
+
+
+def test_bad_recommendation_cursor_is_rejected(client, register):
+    _, _, owner = register()
+    response = client.get(
+        "/api/recommendations", params={"cursor": "garbage"}, headers=owner
+    )
+    assert response.status_code == 400
+
+
+def _passes(user_id):
+    with db_conn() as db:
+        return sorted(
+            row.target_user_id
+            for row in db.query(UserInteraction.target_user_id).filter(
+                UserInteraction.user_id == user_id,
+                UserInteraction.action == InteractionActionEnum.pass_,
+            )
+        )
+
+
+def test_hidden_users_drop_out_of_recommendations(client, register):
+    interests = _interest_ids(client, 3)
+    owner_id, _, owner = register()
+    targets = [register() for _ in range(3)]
+    for _, _, headers in [(owner_id, None, owner), *targets]:
+        _set_interests(client, headers, interests)
+    (first, _, _), (second, _, _), (third, _, _) = targets
+    assert {first, second, third} <= set(_recommended(client, owner))
+
+    for _ in range(2):
+        response = client.post(f"/api/recommendations/{first}/hide", headers=owner)
+        assert response.status_code == 204
+    assert _passes(owner_id) == [first]
+
+    response = client.post(
+        "/api/recommendations/hide",
+        json=[second, str(uuid.uuid4()), second, first, owner_id],
+        headers=owner,
+    )
+    assert response.status_code == 204
+    assert _passes(owner_id) == sorted([first, second])
+
+    recommended = _recommended(client, owner)
+    assert first not in recommended and second not in recommended
+    assert third in recommended
+
+
+def test_hiding_an_unknown_user_is_not_found(client, register):
+    _, _, owner = register()
+    response = client.post(f"/api/recommendations/{uuid.uuid4()}/hide", headers=owner)
+    assert response.status_code == 404
+
+
+def _like(client, headers, target_id):
+    return client.post(f"/api/recommendations/{target_id}/like", headers=headers)
+
+
+def test_reciprocal_like_opens_a_chat(client, register):
+    (alice_id, _, alice), (bob_id, _, bob) = register(), register()
+
+    for _ in range(2):
+        response = _like(client, alice, bob_id)
+        assert response.status_code == 200
+        assert response.json() == {"matched": False, "chat_id": None}
+    with db_conn() as db:
+        assert (
+            db.query(UserInteraction)
+            .filter(
+                UserInteraction.user_id == alice_id,
+                UserInteraction.target_user_id == bob_id,
+                UserInteraction.action == InteractionActionEnum.like,
+            )
+            .count()
+            == 1
+        )
+    liked_by = client.get("/api/matches/likes", headers=bob).json()
+    assert [user["id"] for user in liked_by] == [alice_id]
+
+    response = _like(client, bob, alice_id)
+    assert response.status_code == 200
+    assert response.json()["matched"] is True
+    chat_id = response.json()["chat_id"]
+    assert chat_id is not None
+
+    # Liking again after the match returns the same chat.
+    assert _like(client, alice, bob_id).json() == {"matched": True, "chat_id": chat_id}
+    for headers, partner_id in ((alice, bob_id), (bob, alice_id)):
+        [match] = client.get("/api/matches", headers=headers).json()
+        assert match["chat_id"] == chat_id and match["user"]["id"] == partner_id
+        chats = client.get("/api/chats", headers=headers).json()
+        assert chat_id in [chat["id"] for chat in chats]
+
+
+def test_like_rejects_unknown_and_own_profile(client, register):
+    user_id, _, headers = register()
+    assert _like(client, headers, str(uuid.uuid4())).status_code == 404
+    assert _like(client, headers, user_id).status_code == 400
@@ -0,0 +1,101 @@
+import json
+import time
+
+from app.core import unread_counters as unread_module
+from app.core.unread_counters import UnreadCounters, unread_counters
+from app.core.websockets import manager
+
+
+def _post(client, chat_id, headers, text):
+    response = client.post(
+        f"/api/chats/{chat_id}/messages", json={"text": text}, headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _unread(client, headers, chat_id):
+    response = client.get("/api/chats", headers=headers)
+    assert response.status_code == 200
+    [chat] = [chat for chat in response.json() if chat["id"] == chat_id]
+    return chat["unread_count"]
+
+
+def test_unread_counts_messages_after_the_read_one(client, direct_chat):
+    chat_id, (_, _, alice), (bob_id, _, bob) = direct_chat
+    first = _post(client, chat_id, alice, "first")
+    # SQLite stores created_at with one-second precision.
+    time.sleep(1.05)
+    _post(client, chat_id, alice, "second")
+    time.sleep(1.05)
+    _post(client, chat_id, bob, "own messages do not count")
+    assert _unread(client, bob, chat_id) == 2
+
+    response = client.post(
+        f"/api/chats/{chat_id}/read", json={"message_id": first}, headers=bob
+    )
+    assert response.status_code == 200
+    # Reading an older message drops the cache and recounts in the database.
+    unread_counters.invalidate(bob_id)
+    assert _unread(client, bob, chat_id) == 1
+
+    assert client.post(f"/api/chats/{chat_id}/read", headers=bob).status_code == 200
+    assert _unread(client, bob, chat_id) == 0
+    unread_counters.invalidate(bob_id)
+    assert _unread(client, bob, chat_id) == 0
+
+
+def test_unread_follows_messages_from_other_workers(client, direct_chat):
+    chat_id, (alice_id, _, alice), (bob_id, _, bob) = direct_chat
+    _post(client, chat_id, alice, "local")
+    assert _unread(client, bob, chat_id) == 1
+
+    event = {
+        "worker": "other",
+        "participants": [alice_id, bob_id],
+        "frame": {
+            "type": "message",
+            "chat_id": chat_id,
+            "message": {"id": "remote", "author_id": alice_id},
+        },
+    }
+    client.portal.call(manager.deliver, chat_id, json.dumps(event))
+    assert _unread(client, bob, chat_id) == 2
+
+
+def test_changes_during_a_load_are_applied_and_reconciled(monkeypatch):
+    counters = UnreadCounters(max_users=10, reconcile_interval=60.0)
+    database = {"u": {"a": 1}}
+
+    def count_unread(user_ids):
+        counts = {user_id: dict(database[user_id]) for user_id in user_ids}
+        # Committed after the query read its snapshot.
+        counters.increment("b", "u")
+        database["u"]["b"] = 1
+        return counts
+
+    monkeypatch.setattr(unread_module, "count_unread", count_unread)
+    assert counters.get("u") == {"a": 1, "b": 1}
+
+    # The user is reconciled once, and the increments racing that load
+    # keep the user dirty for the next round.
+    monkeypatch.setattr(
+        unread_module,
+        "count_unread",
+        lambda user_ids: {user_id: dict(database[user_id]) for user_id in user_ids},
+    )
+    database["u"]["a"] = 0
+    assert counters.reconcile() == 1
+    assert counters.get("u") == {"a": 0, "b": 1}
+    assert counters.reconcile() == 0
+
+
+def test_reset_during_a_load_is_not_lost(monkeypatch):
+    counters = UnreadCounters(max_users=10, reconcile_interval=60.0)
+
+    def count_unread(user_ids):
+        counters.reset("a", "u")
+        return {"u": {"a": 3, "b": 1}}
+
+    monkeypatch.setattr(unread_module, "count_unread", count_unread)
+    assert counters.get("u") == {"b": 1}
@@ -0,0 +1,44 @@
+from app.core import view_buffer as view_buffer_module
+from app.core.view_buffer import ViewBuffer
+
+
+def _buffer(**kwargs) -> ViewBuffer:
+    options = dict(
+        max_size=100, flush_size=100, flush_interval=60.0, dedup_window=10.0, dedup_size=3
+    )
+    options.update(kwargs)
+    return ViewBuffer(**options)
+
+
+def test_repeats_inside_the_window_are_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(view_buffer_module.time, "monotonic", lambda: now[0])
+    buffer = _buffer()
+
+    buffer.record("u", ["a", "b"])
+    buffer.record("u", ["a"])
+    assert buffer.deduplicated == 1
+
+    buffer._pending.clear()
+    now[0] += 10.0
+    buffer.record("u", ["b"])
+    assert buffer.deduplicated == 1
+    assert list(buffer._pending) == [("u", "b")]
+    # "a" expired from the front; "b" was accepted again and moved to the end.
+    assert list(buffer._recent) == [("u", "b")]
+
+
+def test_dedup_window_is_capped_oldest_first(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(view_buffer_module.time, "monotonic", lambda: now[0])
+    buffer = _buffer()
+
+    for target in "abcd":
+        now[0] += 1.0
+        buffer.record("u", [target])
+
+    assert list(buffer._recent) == [("u", "b"), ("u", "c"), ("u", "d")]
+    buffer._pending.clear()
+    buffer.record("u", ["c", "a"])
+    assert buffer.deduplicated == 1
+    assert list(buffer._pending) == [("u", "a")]
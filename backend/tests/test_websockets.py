@@ -0,0 +1,136 @@
+import time
+
+import pytest
+from anyio import from_thread
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.websockets import ClientConnection, manager
+from app.schemas.chat_schemas import MessageCreate
+from app.services import chat_service
+
+
+def _post(client, chat_id, headers, text):
+    response = client.post(
+        f"/api/chats/{chat_id}/messages", json={"text": text}, headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _receive_until_replayed(ws) -> tuple[list[str], dict]:
+    message_ids = []
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == "message":
+            message_ids.append(frame["message"]["id"])
+        elif frame["type"] == "replayed":
+            return message_ids, frame
+
+
+def test_replay_has_no_gap_or_duplicates(client, direct_chat, monkeypatch):
+    chat_id, (alice_id, _, alice), (_, bob_token, _) = direct_chat
+    since = _post(client, chat_id, alice, "before disconnect")
+    # SQLite stores created_at with one-second precision.
+    time.sleep(1.05)
+    missed = _post(client, chat_id, alice, "missed")
+
+    async def post_live(text):
+        message = await chat_service.create_message(
+            chat_id=chat_id, author_id=alice_id, msg_data=MessageCreate(text=text)
+        )
+        return message.id
+
+    # Live messages published while the history is read: one committed
+    # before the read (in the history and live), one after it (live only).
+    live = []
+    get_chat_messages = chat_service.get_chat_messages
+
+    def get_chat_messages_with_live(*args, **kwargs):
+        first = not live
+        if first:
+            live.append(from_thread.run(post_live, "live, also in history"))
+        result = get_chat_messages(*args, **kwargs)
+        if first:
+            live.append(from_thread.run(post_live, "live only"))
+        return result
+
+    monkeypatch.setattr(chat_service, "get_chat_messages", get_chat_messages_with_live)
+
+    with client.websocket_connect(f"/ws?token={bob_token}") as ws:
+        ws.send_json(
+            {"type": "subscribe", "chat_ids": [chat_id], "since": {chat_id: since}}
+        )
+        assert ws.receive_json() == {"type": "subscribed", "chat_ids": [chat_id]}
+        message_ids, replayed = _receive_until_replayed(ws)
+
+        assert sorted(message_ids[:2]) == sorted([missed, live[0]])
+        assert message_ids[2:] == [live[1]]
+        assert replayed == {
+            "type": "replayed",
+            "chat_id": chat_id,
+            "count": 2,
+            "complete": True,
+        }
+
+        after = _post(client, chat_id, alice, "after replay")
+        frame = ws.receive_json()
+        assert frame["type"] == "message" and frame["message"]["id"] == after
+
+
+def test_replay_timeout_disconnects_without_live_messages(
+    client, direct_chat, monkeypatch
+):
+    chat_id, (alice_id, _, alice), (_, bob_token, _) = direct_chat
+    since = _post(client, chat_id, alice, "before disconnect")
+    time.sleep(1.05)
+    _post(client, chat_id, alice, "missed")
+
+    async def replay_timed_out(self, chat_id, message):
+        # The live message must not reach the client after the gap.
+        await chat_service.create_message(
+            chat_id=chat_id, author_id=alice_id, msg_data=MessageCreate(text="live")
+        )
+        return False
+
+    monkeypatch.setattr(ClientConnection, "replay", replay_timed_out)
+
+    with client.websocket_connect(f"/ws?token={bob_token}") as ws:
+        ws.send_json(
+            {"type": "subscribe", "chat_ids": [chat_id], "since": {chat_id: since}}
+        )
+        assert ws.receive_json()["type"] == "subscribed"
+        with pytest.raises(WebSocketDisconnect) as disconnect:
+            ws.receive_json()
+        assert disconnect.value.code == 1013
+
+
+def test_connection_is_removed_when_the_handler_fails(client, register, monkeypatch):
+    user_id, token, _ = register()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(chat_service, "get_member_chats", fail)
+
+    with pytest.raises(RuntimeError):
+        with client.websocket_connect(f"/ws?token={token}") as ws:
+            ws.send_json({"type": "subscribe", "chat_ids": []})
+            ws.receive_json()
+    assert user_id not in manager.user_connections
+
+
+def test_legacy_connection_is_removed_when_the_handler_fails(
+    client, direct_chat, monkeypatch
+):
+    chat_id, _, (bob_id, bob_token, _) = direct_chat
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(chat_service, "create_message", fail)
+
+    with pytest.raises(RuntimeError):
+        with client.websocket_connect(f"/ws/chats/{chat_id}?token={bob_token}") as ws:
+            ws.send_json({"type": "send", "text": "hello"})
+            ws.receive_json()
+    assert bob_id not in manager.user_connections
@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo, useRef } from 'react';
+import { useState, useEffect, useLayoutEffect, useMemo, useRef } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
 import {
   Layout, Avatar, Input, Button, List, Typography, Space, Spin,
@@ -128,16 +128,39 @@ const ChatList = ({ chatList, selectedChat, onSelectChat, searchQuery, onSearchC
   );
 };
 
-const ChatWindow = ({ chat, messages, currentUserId, onSendMessage, onBack }) => {
+const ChatWindow = ({
+  chat, messages, currentUserId, onSendMessage, onBack, hasOlder, loadingOlder, onLoadOlder,
+}) => {
   const [messageText, setMessageText] = useState('');
   const messagesEndRef = useRef(null);
+  const contentRef = useRef(null);
+  const lastMessageIdRef = useRef(null);
+  const prevScrollHeightRef = useRef(null);
   const navigate = useNavigate();
   const isMobile = useMediaQuery({ query: '(max-width: 767px)' });
 
-  useEffect(() => {
-    messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
+  useLayoutEffect(() => {
+    const lastId = messages.length ? messages[messages.length - 1].id : null;
+    const el = contentRef.current;
+    if (prevScrollHeightRef.current !== null && el) {
+      // Сверху подгружена старая история: сохраняем видимое место.
+      el.scrollTop += el.scrollHeight - prevScrollHeightRef.current;
+      prevScrollHeightRef.current = null;
+    } else if (lastId !== lastMessageIdRef.current) {
+      messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
+    }
+    lastMessageIdRef.current = lastId;
   }, [messages]);
 
+  const handleScroll = (e) => {
+    const el = e.currentTarget;
+    if (el.scrollTop > 40 || !hasOlder || loadingOlder) return;
+    prevScrollHeightRef.current = el.scrollHeight;
+    onLoadOlder().then((added) => {
+      if (!added) prevScrollHeightRef.current = null;
+    });
+  };
+
   const handleSend = () => {
     if (!messageText.trim()) return;
 
@@ -183,7 +206,16 @@ const ChatWindow = ({ chat, messages, currentUserId, onSendMessage, onBack }) =>
         </div>
       </Header>
       
-      <Content style={{ padding: '16px', overflowY: 'auto', background: '#fafafa' }}>
+      <Content
+        ref={contentRef}
+        onScroll={handleScroll}
+        style={{ padding: '16px', overflowY: 'auto', background: '#fafafa' }}
+      >
+        {loadingOlder && (
+          <div style={{ textAlign: 'center', marginBottom: 12 }}>
+            <Spin size="small" />
+          </div>
+        )}
         {messages.length === 0 ? (
           <div style={{ 
             textAlign: 'center', 
@@ -272,7 +304,11 @@ export default function Chats() {
   const [loading, setLoading] = useState(true);
   const [chatList, setChatList] = useState([]);
   const [messages, setMessages] = useState([]);
+  // Курсор более старой истории (before) из X-Next-Cursor.
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [selectedChat, setSelectedChat] = useState(null);
+  const selectedChatIdRef = useRef(null);
   
   const currentUserId = useMemo(() => getAuthUserId(), []);
   const chatIdFromState = location.state?.chatId || null;
@@ -312,11 +348,14 @@ export default function Chats() {
     if (!selectedChat) return;
     
     let alive = true;
+    selectedChatIdRef.current = selectedChat.id;
+    setOlderCursor(null);
     async function loadMessages() {
       try {
-        const { data } = await http.get(Endpoints.CHATS.MESSAGES(selectedChat.id));
+        const { data, headers } = await http.get(Endpoints.CHATS.MESSAGES(selectedChat.id));
         if (alive) {
           setMessages(Array.isArray(data) ? data : []);
+          setOlderCursor(headers['x-next-cursor'] || null);
         }
       } catch (err) {
         console.error(err);
@@ -344,6 +383,13 @@ export default function Chats() {
     ws.current.onmessage = (event) => {
       try {
         const newMessage = JSON.parse(event.data);
+        // Без ответа на ping сервер закрывает сокет как неактивный.
+        if (newMessage.type === 'ping') {
+          ws.current.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+        // Служебные события (например, read) приходят с полем type.
+        if (newMessage.type) return;
         setMessages(prev => [...prev, newMessage]);
       } catch (error) {
         console.error('Ошибка парсинга сообщения WebSocket:', error);
@@ -355,6 +401,32 @@ export default function Chats() {
     return () => ws.current?.close();
   }, [selectedChat, message]);
 
+  const loadOlderMessages = async () => {
+    if (!selectedChat || !olderCursor || loadingOlder) return 0;
+    const chatId = selectedChat.id;
+    setLoadingOlder(true);
+    try {
+      const { data, headers } = await http.get(Endpoints.CHATS.MESSAGES(chatId), {
+        params: { before: olderCursor },
+      });
+      // Пока грузилось, пользователь мог открыть другой чат.
+      if (selectedChatIdRef.current !== chatId) return 0;
+      const page = Array.isArray(data) ? data : [];
+      setMessages(prev => {
+        const known = new Set(prev.map(m => m.id));
+        return [...page.filter(m => !known.has(m.id)), ...prev];
+      });
+      setOlderCursor(headers['x-next-cursor'] || null);
+      return page.length;
+    } catch (err) {
+      console.error(err);
+      message.error('Не удалось загрузить историю');
+      return 0;
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleSendMessage = async (text) => {
     if (!text || !selectedChat) return;
     try {
@@ -393,6 +465,9 @@ export default function Chats() {
             currentUserId={currentUserId} 
             onSendMessage={handleSendMessage} 
             onBack={() => setSelectedChat(null)} 
+            hasOlder={Boolean(olderCursor)}
+            loadingOlder={loadingOlder}
+            onLoadOlder={loadOlderMessages}
           />
         ) : (
           <ChatList 
@@ -425,6 +500,9 @@ export default function Chats() {
             messages={messages} 
             currentUserId={currentUserId} 
             onSendMessage={handleSendMessage} 
+            hasOlder={Boolean(olderCursor)}
+            loadingOlder={loadingOlder}
+            onLoadOlder={loadOlderMessages}
           />
         ) : (
           <div style={{ 
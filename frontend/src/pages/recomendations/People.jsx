@@ -31,6 +31,8 @@ export default function People() {
   const [mode, setMode] = useState('matches');
 
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [others, setOthers] = useState([]);
   const [loadingOthers, setLoadingOthers] = useState(false);
 
@@ -42,8 +44,11 @@ export default function People() {
     async function loadRecommendations() {
       setLoading(true);
       try {
-        const { data } = await http.get(Endpoints.RECOMMENDATIONS.LIST);
-        if (alive) setUsers(Array.isArray(data) ? data : []);
+        const { data, headers } = await http.get(Endpoints.RECOMMENDATIONS.LIST);
+        if (alive) {
+          setUsers(Array.isArray(data) ? data : []);
+          setNextCursor(headers['x-next-cursor'] || null);
+        }
       } catch (e) {
         message.error('Не удалось загрузить рекомендации');
         console.error(e);
@@ -56,6 +61,27 @@ export default function People() {
     return () => { alive = false; };
   }, [message]);
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const { data, headers } = await http.get(Endpoints.RECOMMENDATIONS.LIST, {
+        params: { cursor: nextCursor },
+      });
+      const page = Array.isArray(data) ? data : [];
+      setUsers(prev => {
+        const seen = new Set(prev.map(u => String(u.id)));
+        return [...prev, ...page.filter(u => !seen.has(String(u.id)))];
+      });
+      setNextCursor(headers['x-next-cursor'] || null);
+    } catch (e) {
+      message.error('Не удалось загрузить рекомендации');
+      console.error(e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const loadOthers = async () => {
     setLoadingOthers(true);
     try {
@@ -368,6 +394,14 @@ export default function People() {
         })}
       </Row>
 
+      {mode === 'matches' && nextCursor && (
+        <div style={{ display: 'flex', justifyContent: 'center', marginTop: 24 }}>
+          <Button onClick={loadMore} loading={loadingMore} style={{ borderRadius: 20 }}>
+            Показать ещё
+          </Button>
+        </div>
+      )}
+
       {!filteredUsers.length && !loading && (
         <div style={{
           padding: 48,